@@ -1,5 +1,13 @@
+import threading
+import numpy as np
 import pygame as pg
+from collections.abc import Mapping
 from settings import *
+from startup_profiler import startup_profiler
+
+# Sentinel texture ids: a wall part without a texture ('-') and the sky flat, which is not drawn from the atlas
+NO_TEXTURE = -1
+SKY_TEXTURE = -2
 
 # Class representing a flat texture
 class Flat:
@@ -36,6 +44,7 @@ class Patch:
     self.height = self.header.height
 
     self.image = self.get_image()  # Generated image from patch data
+    self.unscaled_image = self.image  # Image at its original resolution, used for map things
 
     # Scale the image if it is a sprite
     if is_sprite:
@@ -103,6 +112,80 @@ class Texture:
 
     return image
 
+# Class packing wall textures and flats into one contiguous texel array.
+# Each texture is stored column-major (texel (u, v) at offset + u * height + v), so a wall column is a
+# contiguous run. The info table holds the offset, width and height of every texture id.
+# Textures can be added later (e.g. for another map); the ids of the textures already packed stay valid.
+class TextureAtlas:
+  def __init__(self, textures):
+    self.names = []  # Texture names by id
+    self.ids = {}  # Texture ids by name
+    self.info = np.zeros((0, 3), dtype=np.int32)  # Offset, width and height per id
+    self.texels = np.empty((0, 3), dtype=np.uint8)  # RGB texels of all textures
+    self.heights = []  # Texture heights by id, for per-seg lookups
+    self.add(textures)
+
+  # Append the textures not packed yet
+  def add(self, textures):
+    names = [name for name in textures if name not in self.ids]
+    if not names:
+      return None
+
+    info = np.zeros((len(names), 3), dtype=np.int32)
+    offset = len(self.texels)
+    for i, name in enumerate(names):
+      width, height = textures[name].shape[:2]
+      info[i] = offset, width, height
+      offset += width * height
+
+    texels = np.empty((offset, 3), dtype=np.uint8)
+    texels[:len(self.texels)] = self.texels
+    for i, name in enumerate(names):
+      offset, width, height = info[i]
+      texels[offset: offset + width * height] = textures[name].reshape(width * height, 3)
+
+    self.ids.update((name, len(self.names) + i) for i, name in enumerate(names))
+    self.names += names
+    self.info = np.concatenate([self.info, info])
+    self.texels = texels
+    self.heights = self.info[:, 2].tolist()
+
+# Mapping of assets decoded on first lookup. The names are known up front; the loader decodes an asset
+# the first time it is looked up and the result is kept for the later lookups. Lookups can come from the
+# map preload thread as well as the main thread; an asset is decoded once, under the lock
+class LazyAssets(Mapping):
+  def __init__(self, names, loader):
+    self.names = dict.fromkeys(names)  # Asset names, in directory order
+    self.loader = loader  # Function decoding the asset of a name
+    self.loaded = {}  # Decoded assets by name
+    self.lock = threading.RLock()  # Held while decoding
+
+  def __getitem__(self, name):
+    if name not in self.loaded:
+      if name not in self.names:
+        raise KeyError(name)
+      with self.lock:
+        if name not in self.loaded:
+          self.loaded[name] = self.loader(name)
+    return self.loaded[name]
+
+  def __contains__(self, name):
+    return name in self.names
+
+  def __iter__(self):
+    return iter(self.names)
+
+  def __len__(self):
+    return len(self.names)
+
+  def count_loaded(self):
+    return len(self.loaded)
+
+  # Decode all the assets not decoded yet
+  def load_all(self):
+    for name in self.names:
+      self[name]
+
 # Class representing the game's asset data
 class AssetData:
   def __init__(self, wad_data):
@@ -130,46 +213,91 @@ class AssetData:
       header_length=4
     )
 
-    # Load texture patches
-    self.texture_patches = [
-      Patch(self, p_name, is_sprite=False) for p_name in self.p_names
-    ]
+    # Texture patches by PNAMES index
+    self.texture_patches = LazyAssets(
+      range(len(self.p_names)), lambda i: Patch(self, self.p_names[i], is_sprite=False)
+    )
 
     # Load texture maps
     texture_maps = self.load_texture_maps(texture_lump_name='TEXTURE1')
     if self.get_lump_index('TEXTURE2'):
       texture_maps += self.load_texture_maps(texture_lump_name='TEXTURE2')
+    self.texture_maps = {tex_map.name: tex_map for tex_map in texture_maps}
 
-    # Load textures
-    self.textures = {
-      tex_map.name: Texture(self, tex_map).image for tex_map in texture_maps
-    }
+    # Textures and flat images by name, flats taking precedence over textures of the same name
+    self.flat_lumps = self.get_flat_lumps()
+    self.textures = LazyAssets([*self.texture_maps, *self.flat_lumps], self.load_texture)
 
-    # Load flat images
-    self.textures = {**self.textures, **self.get_flats()}
-
-    self.sky_id = 'F_SKY1'
+    self.sky_flat_name = 'F_SKY1'
+    self.sky_id = SKY_TEXTURE
     self.sky_tex_name = 'SKY1'
     self.sky_tex = self.textures[self.sky_tex_name]  # Load sky texture
 
-  # Load flat images
-  def get_flats(self, start_marker='F_START', end_marker='F_END'):
+    # Pack the textures and flats into one atlas for the rendering kernels. With lazy loading only
+    # the ones the map uses are decoded; the others are decoded on first lookup
+    atlas_names = self.get_map_texture_names(wad_data) if LAZY_ASSETS else self.textures
+    self.atlas = TextureAtlas({name: self.textures[name] for name in atlas_names})
+
+    if LAZY_ASSETS:
+      for kind, assets in (('sprites', self.sprite_patches), ('patches', self.texture_patches),
+                           ('textures', self.textures)):
+        startup_profiler.count_deferred(kind, len(assets) - assets.count_loaded())
+    else:
+      self.sprites.load_all()
+      self.texture_patches.load_all()
+
+  # Texture ids of wall texture and flat names: atlas ids, or one of the sentinel ids. Names of
+  # textures that are missing from the WAD get NO_TEXTURE
+  def get_texture_ids(self, names, ids=None):
+    ids = self.atlas.ids if ids is None else ids
+    return np.array([
+      SKY_TEXTURE if name == self.sky_flat_name else NO_TEXTURE if name == '-' else ids.get(name, NO_TEXTURE)
+      for name in names
+    ], dtype=np.int32)
+
+  # Texture ids of the texture names of a map (see WADData.get_texture_names). The textures not packed yet
+  # get the ids add_map will give them, so the ids can be resolved before the map is added to the atlas
+  def get_map_texture_ids(self, wad_data):
+    ids = dict(self.atlas.ids)
+    for name in self.get_map_texture_names(wad_data):
+      ids.setdefault(name, len(ids))
+    return self.get_texture_ids(wad_data.get_texture_names(), ids)
+
+  # Names of the wall textures and flats referenced by a map, in texture order
+  def get_map_texture_names(self, wad_data):
+    names = set(wad_data.get_texture_names())
+    return [name for name in self.textures if name in names]
+
+  # Decode the textures of a map ahead of its use, e.g. on a background thread while it is preloaded
+  def load_map_textures(self, wad_data):
+    for name in self.get_map_texture_names(wad_data):
+      self.textures[name]
+
+  # Pack the textures of another map into the atlas
+  def add_map(self, wad_data):
+    self.atlas.add({name: self.textures[name] for name in self.get_map_texture_names(wad_data)})
+
+  # Decode a wall texture or a flat
+  def load_texture(self, name):
+    if flat_lump := self.flat_lumps.get(name):
+      return self.load_flat(flat_lump)
+    return Texture(self, self.texture_maps[name]).image
+
+  # Directory entries of the flats by name
+  def get_flat_lumps(self, start_marker='F_START', end_marker='F_END'):
     idx1 = self.get_lump_index(start_marker) + 1
     idx2 = self.get_lump_index(end_marker)
-    flat_lumps = self.reader.directory[idx1: idx2]
-
-    flats = {}
-    for flat_lump in flat_lumps:
-      offset = flat_lump['lump_offset']
-      size = flat_lump['lump_size']
+    return {flat_lump['lump_name']: flat_lump for flat_lump in self.reader.directory[idx1: idx2]}
 
-      flat_data = []
-      for i in range(size):
-        flat_data.append(self.reader.read_1_byte(offset + i, byte_format='B'))
+  # Load a flat image
+  def load_flat(self, flat_lump):
+    offset = flat_lump['lump_offset']
+    size = flat_lump['lump_size']
 
-      flat_name = flat_lump['lump_name']
-      flats[flat_name] = Flat(self, flat_data).image
-    return flats
+    flat_data = []
+    for i in range(size):
+      flat_data.append(self.reader.read_1_byte(offset + i, byte_format='B'))
+    return Flat(self, flat_data).image
 
   # Load texture maps
   def load_texture_maps(self, texture_lump_name):
@@ -193,7 +321,7 @@ class AssetData:
     idx1 = self.get_lump_index(start_marker) + 1
     idx2 = self.get_lump_index(end_marker)
     lumps_info = self.reader.directory[idx1: idx2]
-    sprites = {
-      lump['lump_name']: Patch(self, lump['lump_name']).image for lump in lumps_info
-    }
+    names = [lump['lump_name'] for lump in lumps_info]
+    self.sprite_patches = LazyAssets(names, lambda name: Patch(self, name))
+    sprites = LazyAssets(names, lambda name: self.sprite_patches[name].image)
     return sprites
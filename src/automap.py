@@ -0,0 +1,234 @@
+from collections import OrderedDict
+import numpy as np
+import pygame as pg
+from settings import *
+from baked_level import NO_SIDEDEF
+
+# Automap class, draws the map from above in place of the view (toggled with Tab). The linedefs are
+# joined into polylines once per map and drawn per zoom level into tiles that are cached, so a frame
+# only blits the tiles in view and draws the player, its field of view and the highlighted BSP nodes
+# on top. Panning, and zooming to a level drawn before, are served from the cached tiles.
+class Automap:
+  # Line colors as in DOOM: one-sided and secret walls, floor height changes, ceiling height changes
+  # and two-sided lines without a height change
+  COLORS = {'wall': (252, 0, 0), 'floor': (188, 120, 72), 'ceil': (252, 252, 0), 'flat': (96, 96, 96)}
+  BACKGROUND = (0, 0, 0)
+  LINE_WIDTH = 2
+
+  def __init__(self, engine):
+    self.engine = engine  # Reference to the main engine
+    self.wad_data = engine.wad_data  # WAD data from the engine
+    self.active = False  # Drawn in place of the view when active
+    self.follow = True  # Keep the player in the center of the screen
+    self.show_node_path = False  # Highlight the BSP nodes from the root to the player's sub sector
+    self.highlighted_nodes = []  # Ids of further nodes to highlight
+    self.tiles = OrderedDict()  # Cached tiles by (zoom, tile x, tile y), least recently used first
+    self.points = {}  # Vertex positions in map pixels by zoom level
+
+    # Zoom levels, in screen pixels per map unit. The first one fits the whole map on the screen
+    self.x_min, self.x_max, self.y_min, self.y_max = self.wad_data.get_map_bounds()
+    fit = min((WIDTH - 60) / max(self.x_max - self.x_min, 1), (HEIGHT - 60) / max(self.y_max - self.y_min, 1))
+    self.scales = [fit * AUTOMAP_ZOOM_STEP ** zoom for zoom in range(AUTOMAP_ZOOM_LEVELS)]
+    self.zoom = min(AUTOMAP_ZOOM, AUTOMAP_ZOOM_LEVELS - 1)
+    self.center = vec2(engine.player.pos)  # Map position shown in the center of the screen
+
+    self.vertex_x, self.vertex_y, self.polylines, self.polyline_bounds = self.prepare(self.wad_data)
+
+  # The vertex coordinates and the polylines of a map with their bounds
+  @staticmethod
+  def prepare(wad_data):
+    return wad_data.get_prepared('automap', Automap.get_polylines)
+
+  # Join the drawn linedefs into polylines of one color. Each polyline is a color and an array of vertex
+  # ids; the bounds (x min, x max, y min, y max) of the polylines select the ones crossing a tile
+  @staticmethod
+  def get_polylines(wad_data):
+    vertexes = wad_data.geometry.vertexes
+    vertex_x, vertex_y = vertexes['x'].astype(np.float64), vertexes['y'].astype(np.float64)
+    tables = wad_data.get_tables()
+    lines, sides, sectors = tables['linedefs'], tables['sidedefs'], tables['sectors']
+    flags = wad_data.LINEDEF_FLAGS
+
+    two_sided = lines['back_sidedef_id'] != NO_SIDEDEF
+    front = sectors[sides['sector_id'][lines['front_sidedef_id']]]
+    back = sectors[sides['sector_id'][np.where(two_sided, lines['back_sidedef_id'], lines['front_sidedef_id'])]]
+    line_classes = np.select(
+      [~two_sided | ((lines['flags'] & flags['SECRET']) != 0),
+       front['floor_height'] != back['floor_height'],
+       front['ceil_height'] != back['ceil_height']],
+      ['wall', 'floor', 'ceil'], 'flat'
+    )
+    drawn = (lines['flags'] & flags['DONT_DRAW']) == 0
+
+    polylines = []
+    for line_class, color in Automap.COLORS.items():
+      line_ids = np.flatnonzero(drawn & (line_classes == line_class))
+      starts = lines['start_vertex_id'][line_ids].tolist()
+      ends = lines['end_vertex_id'][line_ids].tolist()
+      polylines += [(color, np.array(chain)) for chain in Automap.chain_lines(starts, ends)]
+
+    bounds = np.empty((len(polylines), 4))
+    for i, (color, chain) in enumerate(polylines):
+      xs, ys = vertex_x[chain], vertex_y[chain]
+      bounds[i] = xs.min(), xs.max(), ys.min(), ys.max()
+    return vertex_x, vertex_y, polylines, bounds
+
+  # Join lines sharing a vertex into chains of vertex ids, so a chain is drawn with one call. Chains are
+  # kept short so their bounds stay local and a tile only draws the chains near it
+  @staticmethod
+  def chain_lines(starts, ends, max_length=AUTOMAP_MAX_CHAIN):
+    lines_by_vertex = {}
+    for line, (v1, v2) in enumerate(zip(starts, ends)):
+      lines_by_vertex.setdefault(v1, []).append(line)
+      lines_by_vertex.setdefault(v2, []).append(line)
+
+    used = [False] * len(starts)
+    chains = []
+    for first_line in range(len(starts)):
+      if used[first_line]:
+        continue
+      used[first_line] = True
+      chain = [starts[first_line], ends[first_line]]
+      while len(chain) <= max_length:
+        vertex = chain[-1]
+        line = next((line for line in lines_by_vertex[vertex] if not used[line]), None)
+        if line is None:
+          break
+        used[line] = True
+        chain.append(ends[line] if starts[line] == vertex else starts[line])
+      chains.append(chain)
+    return chains
+
+  def toggle(self):
+    self.active = not self.active
+
+  def set_zoom(self, zoom):
+    self.zoom = min(max(zoom, 0), len(self.scales) - 1)
+
+  def handle_event(self, e):
+    if e.type == pg.KEYDOWN:
+      if e.key in (pg.K_EQUALS, pg.K_PLUS, pg.K_KP_PLUS):
+        self.set_zoom(self.zoom + 1)
+      elif e.key in (pg.K_MINUS, pg.K_KP_MINUS):
+        self.set_zoom(self.zoom - 1)
+      elif e.key == pg.K_f:
+        self.follow = not self.follow
+      elif e.key == pg.K_n:
+        self.show_node_path = not self.show_node_path
+    elif e.type == pg.MOUSEWHEEL:
+      self.set_zoom(self.zoom + e.y)
+    elif e.type == pg.MOUSEMOTION and e.buttons[0]:
+      # Dragging pans the map and stops following the player
+      self.follow = False
+      scale = self.scales[self.zoom]
+      self.center -= vec2(e.rel[0], -e.rel[1]) / scale
+
+  # Vertex positions in map pixels at a zoom level: x from the left and y down from the top of the map
+  def get_points(self, zoom):
+    if (points := self.points.get(zoom)) is None:
+      scale = self.scales[zoom]
+      points = self.points[zoom] = np.column_stack(
+        ((self.vertex_x - self.x_min) * scale, (self.y_max - self.vertex_y) * scale)
+      )
+    return points
+
+  def get_tile(self, zoom, tx, ty):
+    key = zoom, tx, ty
+    if (tile := self.tiles.get(key)) is not None:
+      self.tiles.move_to_end(key)
+      return tile
+
+    tile = self.tiles[key] = self.draw_tile(zoom, tx, ty)
+    if len(self.tiles) > AUTOMAP_CACHE_TILES:
+      self.tiles.popitem(last=False)
+    return tile
+
+  # Draw the polylines crossing a tile into a new surface
+  def draw_tile(self, zoom, tx, ty):
+    scale, size = self.scales[zoom], AUTOMAP_TILE_SIZE
+    tile = pg.Surface((size, size)).convert()
+    tile.fill(self.BACKGROUND)
+
+    # Map area of the tile, with a margin for the line width
+    margin = self.LINE_WIDTH / scale
+    x1 = self.x_min + tx * size / scale - margin
+    x2 = self.x_min + (tx + 1) * size / scale + margin
+    y1 = self.y_max - (ty + 1) * size / scale - margin
+    y2 = self.y_max - ty * size / scale + margin
+
+    bounds = self.polyline_bounds
+    crossing = (bounds[:, 0] <= x2) & (bounds[:, 1] >= x1) & (bounds[:, 2] <= y2) & (bounds[:, 3] >= y1)
+    if crossing.any():
+      points = self.get_points(zoom) - (tx * size, ty * size)
+      for i in np.flatnonzero(crossing):
+        color, chain = self.polylines[i]
+        pg.draw.lines(tile, color, False, points[chain], self.LINE_WIDTH)
+    return tile
+
+  # Draw the automap over the whole screen: the cached tiles in view, then the dynamic overlay
+  def draw(self, screen):
+    if self.follow:
+      self.center.update(self.engine.player.pos)
+    zoom, size = self.zoom, AUTOMAP_TILE_SIZE
+    scale = self.scales[zoom]
+
+    # Map pixel at the top left corner of the screen
+    left = (self.center.x - self.x_min) * scale - H_WIDTH
+    top = (self.y_max - self.center.y) * scale - H_HEIGHT
+
+    screen.fill(self.BACKGROUND)
+    tiles_x = int((self.x_max - self.x_min) * scale) // size + 1
+    tiles_y = int((self.y_max - self.y_min) * scale) // size + 1
+    for ty in range(max(int(top // size), 0), min(int((top + HEIGHT) // size) + 1, tiles_y)):
+      for tx in range(max(int(left // size), 0), min(int((left + WIDTH) // size) + 1, tiles_x)):
+        screen.blit(self.get_tile(zoom, tx, ty), (tx * size - left, ty * size - top))
+
+    self.draw_nodes(screen, left, top, scale)
+    self.draw_player(screen, left, top, scale)
+
+  def draw_player(self, screen, left, top, scale):
+    player = self.engine.player
+    x = (player.pos.x - self.x_min) * scale - left
+    y = (self.y_max - player.pos.y) * scale - top
+
+    # Field of view edges of a fixed length on screen; map y points up, screen y down
+    length = HEIGHT / 4
+    for angle in (player.angle - H_FOV, player.angle + H_FOV):
+      angle = math.radians(angle)
+      pg.draw.line(screen, 'yellow', (x, y), (x + length * math.cos(angle), y - length * math.sin(angle)), 2)
+    pg.draw.circle(screen, 'orange', (x, y), 6)
+
+  # Draw the bounding boxes (front green, back red) and partition line (blue) of the highlighted nodes
+  def draw_nodes(self, screen, left, top, scale):
+    node_ids = self.highlighted_nodes + (self.get_node_path() if self.show_node_path else [])
+    if not node_ids:
+      return None
+
+    bsp = self.engine.bsp
+    nodes = bsp.nodes
+
+    def to_screen(x, y):
+      return (x - self.x_min) * scale - left, (self.y_max - y) * scale - top
+
+    for node_id in node_ids:
+      for bbox, color in ((bsp.front_bboxes[node_id], 'green'), (bsp.back_bboxes[node_id], 'red')):
+        bbox_top, bbox_bottom, bbox_left, bbox_right = bbox
+        x1, y1 = to_screen(bbox_left, bbox_top)
+        x2, y2 = to_screen(bbox_right, bbox_bottom)
+        pg.draw.rect(screen, color, (x1, y1, x2 - x1, y2 - y1), 1)
+      x, y = nodes.x_partition[node_id], nodes.y_partition[node_id]
+      dx, dy = nodes.dx_partition[node_id], nodes.dy_partition[node_id]
+      pg.draw.line(screen, 'blue', to_screen(x, y), to_screen(x + dx, y + dy), 2)
+
+  # Ids of the nodes on the way from the root to the sub sector of the player
+  def get_node_path(self):
+    bsp = self.engine.bsp
+    node_ids = []
+    node_id = bsp.root_node_id
+    while node_id < bsp.SUB_SECTOR_IDENTIFIER:
+      node_ids.append(node_id)
+      if bsp.is_point_on_back_side(node_id, self.engine.player.pos):
+        node_id = bsp.nodes.back_child_id[node_id]
+      else:
+        node_id = bsp.nodes.front_child_id[node_id]
+    return node_ids
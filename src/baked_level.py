@@ -0,0 +1,242 @@
+import os
+import sys
+import json
+import time
+import struct
+import hashlib
+import argparse
+
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+
+import numpy as np
+from settings import *
+from data_types import *
+from wad_reader import WADReader
+from wad_data import WADData
+from geometry_store import GEOMETRY_DTYPES, GeometryStore, LazyRecords
+
+# Baked levels. A map is loaded once from the WAD, with all its links resolved, and written as fixed
+# size record tables with integer indices: sidedef and seg sectors, seg vertexes and linedefs, texture
+# names as indices into a name table, seg angles converted to degrees, seg lengths and the patched
+# upper and lower textures. The file is memory mapped back and records are only built on first access,
+# so loading a baked level takes the same time for any map size.
+#
+# File layout: magic, version and the size of a JSON table of contents, the table of contents (map name,
+# digest of the source lumps, offset and count of every table), then the tables at aligned offsets.
+
+BAKED_MAGIC = b'DLVL'
+BAKED_VERSION = 1
+BAKED_HEADER = struct.Struct('<4sII')  # Magic, version, table of contents size
+BAKED_ALIGN = 64  # Alignment of the tables in the file
+BAKED_EXTENSION = '.lvl'
+
+# Record layouts of the tables. Ids keep the signedness of the WAD lumps they come from
+BAKED_DTYPES = {
+  **GEOMETRY_DTYPES,
+  'linedefs': np.dtype([
+    ('start_vertex_id', '<u2'), ('end_vertex_id', '<u2'), ('flags', '<u2'), ('line_type', '<u2'),
+    ('sector_tag', '<u2'), ('front_sidedef_id', '<u2'), ('back_sidedef_id', '<u2'),
+  ]),
+  'sidedefs': np.dtype([
+    ('x_offset', '<i2'), ('y_offset', '<i2'), ('upper_texture', '<u2'), ('lower_texture', '<u2'),
+    ('middle_texture', '<u2'), ('sector_id', '<u2'),
+  ]),
+  'sectors': np.dtype([
+    ('floor_height', '<i2'), ('ceil_height', '<i2'), ('floor_texture', '<u2'), ('ceil_texture', '<u2'),
+    ('light_level', '<u2'), ('type', '<u2'), ('tag', '<u2'),
+  ]),
+  'segments': np.dtype([
+    ('start_vertex_id', '<i2'), ('end_vertex_id', '<i2'), ('angle', '<f8'), ('linedef_id', '<i2'),
+    ('direction', '<i2'), ('offset', '<i2'), ('front_sector_id', '<i4'), ('back_sector_id', '<i4'),
+    ('length', '<f4'),
+  ]),
+  'texture_names': np.dtype('S8'),
+}
+
+NO_SIDEDEF = 0xFFFF  # Linedef side without a sidedef
+NO_SECTOR = -1  # Seg without a back sector
+
+# Path of the baked file of a map of a WAD
+def get_baked_path(wad_path, map_name, baked_dir=BAKED_LEVEL_DIR):
+  wad_name = os.path.splitext(os.path.basename(wad_path))[0]
+  return os.path.join(baked_dir, f'{wad_name}_{map_name}{BAKED_EXTENSION}')
+
+# Digest of the lumps of a map, to tell whether a baked level is still up to date with its WAD
+def get_map_digest(reader, map_name):
+  map_index = reader.lump_indices[map_name]
+  digest = hashlib.sha1()
+  for lump_info in reader.directory[map_index + 1: map_index + 1 + len(WADData.LUMP_INDICES)]:
+    offset = lump_info['lump_offset']
+    digest.update(reader.wad_bytes[offset: offset + lump_info['lump_size']])
+  return digest.hexdigest()
+
+# Build the record tables of a loaded map
+def get_level_tables(wad_data):
+  texture_names = wad_data.get_texture_names()
+  texture_ids = {name: tex_id for tex_id, name in enumerate(texture_names)}
+  sector_ids = {id(sector): sector_id for sector_id, sector in enumerate(wad_data.sectors)}
+
+  def table(name, rows):
+    return np.array(rows, dtype=BAKED_DTYPES[name])
+
+  segments = table('segments', [
+    (s.start_vertex_id, s.end_vertex_id, s.angle, s.linedef_id, s.direction, s.offset,
+     sector_ids[id(s.front_sector)], NO_SECTOR if s.back_sector is None else sector_ids[id(s.back_sector)], 0)
+    for s in wad_data.segments
+  ])
+  vertexes = wad_data.geometry.vertexes
+  start, end = vertexes[segments['start_vertex_id']], vertexes[segments['end_vertex_id']]
+  segments['length'] = np.hypot(end['x'] - start['x'].astype(np.float64), end['y'] - start['y'].astype(np.float64))
+
+  return {
+    **wad_data.geometry.tables,
+    'linedefs': table('linedefs', [
+      (l.start_vertex_id, l.end_vertex_id, l.flags, l.line_type, l.sector_tag, l.front_sidedef_id,
+       l.back_sidedef_id) for l in wad_data.linedefs
+    ]),
+    'sidedefs': table('sidedefs', [
+      (s.x_offset, s.y_offset, texture_ids[s.upper_texture], texture_ids[s.lower_texture],
+       texture_ids[s.middle_texture], s.sector_id) for s in wad_data.sidedefs
+    ]),
+    'sectors': table('sectors', [
+      (s.floor_height, s.ceil_height, texture_ids[s.floor_texture], texture_ids[s.ceil_texture],
+       round(s.light_level * 255), s.type, s.tag) for s in wad_data.sectors
+    ]),
+    'segments': segments,
+    'texture_names': table('texture_names', [name.encode('ascii') for name in texture_names]),
+  }
+
+# Write a loaded map to a baked file
+def bake_level(wad_data, map_name, digest, path):
+  tables = get_level_tables(wad_data)
+
+  # Offsets relative to the end of the header, which is aligned as well
+  offsets, offset = {}, 0
+  for name, array in tables.items():
+    offsets[name] = [offset, len(array)]
+    offset += -(-array.nbytes // BAKED_ALIGN) * BAKED_ALIGN
+  toc = json.dumps({'map': map_name, 'digest': digest, 'tables': offsets}).encode()
+  header_size = -(-(BAKED_HEADER.size + len(toc)) // BAKED_ALIGN) * BAKED_ALIGN
+
+  os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+  with open(path, 'wb') as f:
+    f.write(BAKED_HEADER.pack(BAKED_MAGIC, BAKED_VERSION, len(toc)) + toc)
+    for name, array in tables.items():
+      f.seek(header_size + offsets[name][0])
+      f.write(array.tobytes())
+    f.truncate(header_size + offset)
+  return path
+
+# BakedFile class, a memory mapped baked level. The tables are read-only views of the mapping
+class BakedFile:
+  def __init__(self, path):
+    self.path = path
+    self.data = np.memmap(path, dtype=np.uint8, mode='r')
+
+    magic, version, toc_size = BAKED_HEADER.unpack_from(self.data)
+    if magic != BAKED_MAGIC:
+      raise ValueError(f'{path} is not a baked level')
+    if version != BAKED_VERSION:
+      raise ValueError(f'{path} has version {version}, expected {BAKED_VERSION}; bake it again')
+
+    toc = json.loads(bytes(self.data[BAKED_HEADER.size: BAKED_HEADER.size + toc_size]))
+    self.map_name = toc['map']
+    self.digest = toc['digest']  # Digest of the lumps the level was baked from
+    header_size = -(-(BAKED_HEADER.size + toc_size) // BAKED_ALIGN) * BAKED_ALIGN
+    self.tables = {
+      name: np.frombuffer(self.data, BAKED_DTYPES[name], count, header_size + offset)
+      for name, (offset, count) in toc['tables'].items()
+    }
+
+# BakedLevel class, the data of a map loaded from a baked file. It stands in for WADData: the map records
+# have the same attributes and links, built on first access from the mapped tables
+class BakedLevel(WADData):
+  def __init__(self, engine, map_name, baked_file, reader=None, asset_data=None):
+    self.baked_file = baked_file
+    self.tables = baked_file.tables  # Record tables, for code working on whole arrays
+    super().__init__(engine, map_name, reader, asset_data)
+
+  def load_map(self, map_name):
+    # This method sets up the record sequences of the baked map; no record is read yet.
+
+    tables = self.tables
+    self.texture_names = [name.decode('ascii') for name in tables['texture_names'].tolist()]
+    self.geometry = GeometryStore({name: tables[name] for name in GEOMETRY_DTYPES})
+    self.link_geometry()
+    self.sectors = LazyRecords(tables['sectors'], self.make_sector)
+    self.sidedefs = LazyRecords(tables['sidedefs'], self.make_sidedef)
+    self.linedefs = LazyRecords(tables['linedefs'], self.make_linedef)
+    self.segments = LazyRecords(tables['segments'], self.make_seg)
+
+  def make_sector(self, row):
+    sector = Sector()
+    (sector.floor_height, sector.ceil_height, floor_texture, ceil_texture, light_level,
+     sector.type, sector.tag) = row
+    sector.floor_texture = self.texture_names[floor_texture]
+    sector.ceil_texture = self.texture_names[ceil_texture]
+    sector.light_level = light_level / 255.0
+    return sector
+
+  def make_sidedef(self, row):
+    sidedef = Sidedef()
+    sidedef.x_offset, sidedef.y_offset, upper_texture, lower_texture, middle_texture, sidedef.sector_id = row
+    sidedef.upper_texture = self.texture_names[upper_texture]
+    sidedef.lower_texture = self.texture_names[lower_texture]
+    sidedef.middle_texture = self.texture_names[middle_texture]
+    sidedef.sector = self.sectors[sidedef.sector_id]
+    return sidedef
+
+  def make_linedef(self, row):
+    linedef = Linedef()
+    (linedef.start_vertex_id, linedef.end_vertex_id, linedef.flags, linedef.line_type, linedef.sector_tag,
+     linedef.front_sidedef_id, linedef.back_sidedef_id) = row
+    linedef.front_sidedef = self.sidedefs[linedef.front_sidedef_id]
+    if linedef.back_sidedef_id == NO_SIDEDEF:
+      linedef.back_sidedef = None
+    else:
+      linedef.back_sidedef = self.sidedefs[linedef.back_sidedef_id]
+    return linedef
+
+  def make_seg(self, row):
+    seg = Seg()
+    (seg.start_vertex_id, seg.end_vertex_id, seg.angle, seg.linedef_id, seg.direction, seg.offset,
+     front_sector_id, back_sector_id, length) = row
+    seg.linedef = self.linedefs[seg.linedef_id]
+    seg.front_sector = self.sectors[front_sector_id]
+    seg.back_sector = None if back_sector_id == NO_SECTOR else self.sectors[back_sector_id]
+    return seg
+
+  def get_tables(self):
+    return self.tables
+
+  def get_texture_names(self):
+    return list(self.texture_names)
+
+def main(argv=None):
+  parser = argparse.ArgumentParser(description='Bake the maps of a WAD into memory mapped level files.')
+  parser.add_argument('--wad', default='./resources/wad/DOOM1.WAD', help='path to the WAD file')
+  parser.add_argument('--maps', nargs='*', help='maps to bake (default: all maps of the WAD)')
+  parser.add_argument('--output-dir', default=BAKED_LEVEL_DIR, help='directory the baked levels are written to')
+  args = parser.parse_args(argv)
+
+  from level_manager import MAP_NAME_PATTERN
+
+  reader = WADReader(args.wad)
+  map_names = args.maps or [lump['lump_name'] for lump in reader.directory
+                            if MAP_NAME_PATTERN.fullmatch(lump['lump_name'])]
+  asset_data = WADData(None, map_names[0], reader).asset_data  # Only needed to load the maps
+  for map_name in map_names:
+    start = time.perf_counter()
+    wad_data = WADData(None, map_name, reader, asset_data)
+    load_time = time.perf_counter() - start
+
+    path = bake_level(wad_data, map_name, get_map_digest(reader, map_name),
+                      get_baked_path(args.wad, map_name, args.output_dir))
+    start = time.perf_counter()
+    BakedLevel(None, map_name, BakedFile(path), reader, asset_data)
+    baked_time = time.perf_counter() - start
+    print(f'{map_name}: {path} ({os.path.getsize(path) / 1024:.0f} KB), '
+          f'WAD load {load_time * 1000:.1f} ms, baked load {baked_time * 1000:.2f} ms', file=sys.stderr)
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,122 @@
+import os
+import sys
+import json
+import time
+import argparse
+import multiprocessing
+
+# Render without a window: SDL's dummy video driver must be selected before pygame initializes the display
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+# SDL turns SIGTERM into a quit event by default, which would keep the pool from terminating its workers
+os.environ.setdefault('SDL_NO_SIGNAL_HANDLERS', '1')
+
+import numpy as np
+import pygame as pg
+from main import DoomEngine
+from viewport import Camera, Viewport
+
+# Output formats of the rendered views
+IMAGE_FORMATS = ('png', 'bmp', 'tga', 'jpg')
+ARRAY_FORMAT = 'npy'
+
+# BatchRenderer class, renders a map from given viewpoints without a display or input.
+# A viewpoint is (x, y, angle) or (x, y, angle, height); without a height the camera stands at eye
+# height on the floor below it.
+class BatchRenderer:
+  def __init__(self, wad_path, map_name='E1M1'):
+    self.engine = DoomEngine(wad_path=wad_path, map_name=map_name, pipelined=False, preload=False)
+    self.viewport = Viewport(self.engine.player)  # Every viewpoint is rendered into this view
+
+  # Render a viewpoint and return a copy of the framebuffer, shape (WIDTH, HEIGHT, 3). Without a copy the
+  # framebuffer of the viewport is returned, which the next render overwrites
+  def render(self, view, copy=True):
+    engine = self.engine
+    self.viewport.camera = Camera.at(engine.bsp, *view)
+    engine.render_view(self.viewport)
+    return self.viewport.framebuffer.copy() if copy else self.viewport.framebuffer
+
+  # Render a viewpoint and write it to path, as an image or as a .npy array
+  def render_to_file(self, view, path):
+    framebuffer = self.render(view)
+    write_framebuffer(framebuffer, path)
+    return path
+
+def write_framebuffer(framebuffer, path):
+  if path.endswith('.' + ARRAY_FORMAT):
+    np.save(path, framebuffer)
+  else:
+    pg.image.save(pg.surfarray.make_surface(framebuffer), path)
+
+# Renderer of the current worker process, loaded once by init_worker
+worker_renderer = None
+worker_output = None  # (output directory, format) or None to send the framebuffers back
+
+def init_worker(wad_path, map_name, output_dir, output_format):
+  # Pool initializer: load the level and assets once per worker process
+  global worker_renderer, worker_output
+  worker_renderer = BatchRenderer(wad_path, map_name)
+  worker_output = (output_dir, output_format) if output_dir else None
+
+def render_job(job):
+  # Render one (index, view) job in a worker. Returns (index, view, path or framebuffer, time in ms)
+  index, view = job
+  start = time.perf_counter()
+  if worker_output:
+    output_dir, output_format = worker_output
+    result = worker_renderer.render_to_file(view, os.path.join(output_dir, f'view_{index:05d}.{output_format}'))
+  else:
+    result = worker_renderer.render(view)
+  return index, view, result, (time.perf_counter() - start) * 1000
+
+# Render the viewpoints on a pool of worker processes, each loading the level once. Results are yielded
+# as they complete, in completion order, as (index, view, path or framebuffer, time in ms). With an
+# output directory each view is written to a file by its worker; otherwise the framebuffers are returned
+def render_views(wad_path, map_name, views, output_dir=None, output_format='png', processes=None, chunk_size=1):
+  if output_format not in IMAGE_FORMATS + (ARRAY_FORMAT,):
+    raise ValueError(f'unknown output format {output_format!r}')
+  if output_dir:
+    os.makedirs(output_dir, exist_ok=True)
+
+  processes = min(processes or os.cpu_count() or 1, max(1, len(views)))
+  jobs = list(enumerate(tuple(view) for view in views))
+  # Spawned workers start from a clean interpreter instead of a fork of the caller's pygame and SDL state
+  context = multiprocessing.get_context('spawn')
+  with context.Pool(processes, initializer=init_worker,
+                    initargs=(wad_path, map_name, output_dir, output_format)) as pool:
+    yield from pool.imap_unordered(render_job, jobs, chunksize=chunk_size)
+    pool.close()
+    pool.join()
+
+def main(argv=None):
+  parser = argparse.ArgumentParser(description='Render many viewpoints of a map without a display.')
+  parser.add_argument('views', help='JSON file with a list of [x, y, angle(, height)] viewpoints')
+  parser.add_argument('--wad', default='./resources/wad/DOOM1.WAD', help='path to the WAD file')
+  parser.add_argument('--map', default='E1M1', help='map to load')
+  parser.add_argument('--output-dir', default='renders', help='directory the rendered views are written to')
+  parser.add_argument('--format', default='png', choices=IMAGE_FORMATS + (ARRAY_FORMAT,), help='output format')
+  parser.add_argument('--processes', type=int, help='number of worker processes (default: one per CPU)')
+  parser.add_argument('--chunk-size', type=int, default=1, help='views handed to a worker at a time')
+  parser.add_argument('--manifest', help='write a JSON line per rendered view to this file')
+  args = parser.parse_args(argv)
+
+  with open(args.views) as f:
+    views = json.load(f)
+
+  start = time.perf_counter()
+  manifest = open(args.manifest, 'w') if args.manifest else None
+  try:
+    for i, (index, view, path, render_ms) in enumerate(render_views(
+        args.wad, args.map, views, args.output_dir, args.format, args.processes, args.chunk_size)):
+      if manifest:
+        manifest.write(json.dumps({'index': index, 'view': view, 'path': path, 'render_ms': render_ms}) + '\n')
+        manifest.flush()
+      print(f'[{i + 1}/{len(views)}] {path} ({render_ms:.1f} ms)', file=sys.stderr)
+  finally:
+    if manifest:
+      manifest.close()
+  print(f'rendered {len(views)} views in {time.perf_counter() - start:.1f} s', file=sys.stderr)
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,149 @@
+import os
+import sys
+import json
+import time
+import argparse
+
+# Render without a window: SDL's dummy video driver must be selected before pygame initializes the display
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')  # Keep stdout clean for the JSON report
+
+from main import DoomEngine
+from startup_profiler import startup_profiler
+from settings import *
+
+# Benchmark class, renders a map headlessly along a scripted camera path and reports frame timings.
+# The path is a list of (x, y, angle) keyframes, optionally with an eye height, that the camera moves
+# through at a constant rate over the measured frames. No keyboard input is read.
+class Benchmark:
+  def __init__(self, wad_path, map_name='E1M1', path=None, present=True, pipelined=False):
+    self.engine = DoomEngine(wad_path=wad_path, map_name=map_name, pipelined=pipelined, preload=False)
+    self.present = present  # Include the framebuffer blit and display flip in every frame
+    self.path = path or self.get_default_path()
+
+  def get_default_path(self):
+    # A full turn on the spot at the player start, which sees the area around the start in every direction
+    player = self.engine.player
+    x, y = player.pos
+    return [(x, y, player.angle + a) for a in range(0, 361, 45)]
+
+  def get_view(self, t):
+    # Camera pose at t in [0, 1] along the path, interpolated linearly between keyframes
+    if len(self.path) == 1:
+      return tuple(self.path[0])
+
+    pos = t * (len(self.path) - 1)
+    i = min(int(pos), len(self.path) - 2)
+    k = pos - i
+    a, b = self.path[i], self.path[i + 1]
+    return tuple(a[j] + (b[j] - a[j]) * k for j in range(min(len(a), len(b))))
+
+  def render_frame(self, t):
+    # Place the camera on the path and render one frame, returning its duration in milliseconds
+    engine = self.engine
+    profiling = engine.is_profiling()
+    start = time.perf_counter()
+    engine.frame_start = start
+    if profiling:
+      engine.profiler.begin_frame()
+    engine.player.set_view(*self.get_view(t))
+    engine.render()
+    if self.present:
+      engine.draw()
+    else:
+      if profiling:
+        engine.profiler.end_frame()
+      startup_profiler.mark_first_frame()
+    return (time.perf_counter() - start) * 1000
+
+  def run(self, frames, warmup=3):
+    # Warm-up frames (JIT compilation, caches) are rendered first and not measured
+    for i in range(warmup):
+      self.render_frame(0.0)
+
+    frame_times = []
+    start = time.perf_counter()
+    for i in range(frames):
+      frame_times.append(self.render_frame(i / max(1, frames - 1)))
+    if self.engine.presenter:
+      self.engine.presenter.wait()  # The last frame is still being presented
+    total = time.perf_counter() - start
+
+    report = {
+      'wad': self.engine.wad_path,
+      'map': self.engine.map_name,
+      'resolution': [WIDTH, HEIGHT],
+      'column_step': self.engine.view.column_step,
+      'frames': frames,
+      'warmup_frames': warmup,
+      'present': self.present,
+      'total_s': total,
+      'fps': frames / total if total else 0.0,
+      'frame_ms': self.get_stats(frame_times),
+      'startup': startup_profiler.get_report(),
+    }
+    if self.engine.presenter:
+      report['pipelined_present'] = self.engine.presenter.get_stats()
+    return report
+
+  @staticmethod
+  def get_stats(frame_times):
+    # Mean, extremes and nearest-rank percentiles of the frame times
+    ordered = sorted(frame_times)
+
+    def percentile(p):
+      return ordered[min(len(ordered) - 1, max(0, math.ceil(p / 100 * len(ordered)) - 1))]
+
+    return {
+      'mean': sum(ordered) / len(ordered),
+      'min': ordered[0],
+      'p50': percentile(50),
+      'p95': percentile(95),
+      'p99': percentile(99),
+      'max': ordered[-1],
+    }
+
+def load_path(path_file):
+  # A camera path file is a JSON list of [x, y, angle] or [x, y, angle, height] keyframes
+  with open(path_file) as f:
+    return [tuple(view) for view in json.load(f)]
+
+def main(argv=None):
+  parser = argparse.ArgumentParser(description='Headless frame time benchmark.')
+  parser.add_argument('--wad', default='./resources/wad/DOOM1.WAD', help='path to the WAD file')
+  parser.add_argument('--map', default='E1M1', help='map to load')
+  parser.add_argument('--frames', type=int, default=200, help='number of measured frames')
+  parser.add_argument('--warmup', type=int, default=3, help='number of unmeasured warm-up frames')
+  parser.add_argument('--path', help='JSON camera path file, a list of [x, y, angle(, height)] keyframes')
+  parser.add_argument('--no-present', action='store_true', help='do not blit and flip the frames')
+  parser.add_argument('--pipelined', action='store_true',
+                      help='present the frames on the frame presenter thread and report its latencies')
+  parser.add_argument('--output', help='write the JSON report to this file instead of stdout')
+  parser.add_argument('--trace', help='profile the frames and write a Chrome trace to this file')
+  parser.add_argument('--profile', help='profile the frames and write per-frame JSON lines to this file')
+  parser.add_argument('--column-step', type=int, default=COLUMN_STEP, help='draw every n-th column only')
+  args = parser.parse_args(argv)
+
+  path = load_path(args.path) if args.path else None
+  benchmark = Benchmark(args.wad, args.map, path=path, present=not args.no_present, pipelined=args.pipelined)
+  benchmark.engine.view.column_step = args.column_step
+  if args.trace or args.profile:
+    benchmark.engine.get_profiler().enable()
+  profiler = benchmark.engine.profiler
+  report = benchmark.run(args.frames, warmup=args.warmup)
+
+  if args.trace:
+    profiler.export_chrome_trace(args.trace)
+  if args.profile:
+    profiler.export_json_lines(args.profile)
+
+  if args.output:
+    with open(args.output, 'w') as f:
+      json.dump(report, f, indent=2)
+  else:
+    json.dump(report, sys.stdout, indent=2)
+    print()
+
+if __name__ == '__main__':
+  main()
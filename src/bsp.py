@@ -1,3 +1,4 @@
+import numpy as np
 from settings import *
 
 # This class represents a Binary Space Partitioning (BSP) tree used in the game engine
@@ -9,50 +10,83 @@ class BSP:
   def __init__(self, engine):
     self.engine = engine  # The game engine
     self.player = engine.player  # The player
-    self.nodes = engine.wad_data.nodes  # The nodes in the BSP tree
-    self.sub_sectors = engine.wad_data.sub_sectors  # The sub sectors in the BSP tree
+    # The node fields of the BSP tree indexed by node id, the sub sector fields indexed by sub sector id, and
+    # the bounding boxes (top, bottom, left, right) of the front and back children of every node
+    self.nodes, self.sub_sectors, self.front_bboxes, self.back_bboxes = self.prepare(engine.wad_data)
     self.segs = engine.wad_data.segments  # The segments in the BSP tree
-    self.root_node_id = len(self.nodes) - 1  # The root node of the BSP tree
-    self.is_traverse_bsp = True  # Determines if we should traverse the BSP tree
+    self.root_node_id = len(engine.wad_data.geometry.nodes) - 1  # The root node of the BSP tree
 
-  # Update the BSP traversal
-  def update(self):
-    self.is_traverse_bsp = True  # Reset traversal flag
-    self.render_bsp_node(node_id=self.root_node_id)  # Start rendering from root node
+  # The node and sub sector columns and node bounding boxes of a map
+  @staticmethod
+  def prepare(wad_data):
+    return wad_data.get_prepared('bsp', BSP.build_tables)
+
+  @staticmethod
+  def build_tables(wad_data):
+    geometry = wad_data.geometry
+    nodes = geometry.get_columns('nodes')
+    front_bboxes = list(zip(nodes.front_top, nodes.front_bottom, nodes.front_left, nodes.front_right))
+    back_bboxes = list(zip(nodes.back_top, nodes.back_bottom, nodes.back_left, nodes.back_right))
+    return nodes, geometry.get_columns('sub_sectors'), front_bboxes, back_bboxes
+
+  # Update the BSP traversal of a viewport, which holds the camera and whether to go on traversing the tree
+  def update(self, view):
+    view.is_traverse_bsp = True  # Reset traversal flag
+    self.render_bsp_node(view, node_id=self.root_node_id)  # Start rendering from root node
 
   # Get the height of the sub sector
   def get_sub_sector_height(self):
+    # Get the sub sector the player is in and return the floor height of its first segment
+    return self.get_floor_height(self.player.pos)
+
+  # Get the floor height of the sub sector containing a point
+  def get_floor_height(self, pos):
+    first_seg_id = self.sub_sectors.first_seg_id[self.get_sub_sector_id(pos)]
+    return self.segs[first_seg_id].front_sector.floor_height
+
+  # Get the ids of the sub sectors containing the points (xs[i], ys[i]) of two arrays, walking the tree of a
+  # map for all the points at once
+  @staticmethod
+  def get_sub_sector_ids(wad_data, xs, ys):
+    nodes = wad_data.geometry.nodes
+    ids = np.full(len(xs), len(nodes) - 1)
+    while (walking := ids < BSP.SUB_SECTOR_IDENTIFIER).any():
+      node = nodes[ids[walking]]
+      dx = xs[walking] - node['x_partition']
+      dy = ys[walking] - node['y_partition']
+      is_on_back = dx * node['dy_partition'] - dy * node['dx_partition'] <= 0
+      ids[walking] = np.where(is_on_back, node['back_child_id'], node['front_child_id'])
+    return ids - BSP.SUB_SECTOR_IDENTIFIER
+
+  # Get the id of the sub sector containing a point
+  def get_sub_sector_id(self, pos):
     sub_sector_id = self.root_node_id
 
     # Find the sub sector by traversing the BSP tree
     while not sub_sector_id >= self.SUB_SECTOR_IDENTIFIER:
-      node = self.nodes[sub_sector_id]
-
-      # Determine if player is on the back side of the node
-      is_on_back = self.is_on_back_side(node)
+      # Determine if the point is on the back side of the node
+      is_on_back = self.is_point_on_back_side(sub_sector_id, pos)
       if is_on_back:
-        sub_sector_id = self.nodes[sub_sector_id].back_child_id
+        sub_sector_id = self.nodes.back_child_id[sub_sector_id]
       else:
-        sub_sector_id = self.nodes[sub_sector_id].front_child_id
+        sub_sector_id = self.nodes.front_child_id[sub_sector_id]
 
-    # Get the sub sector and return the floor height of the first segment
-    sub_sector = self.sub_sectors[sub_sector_id - self.SUB_SECTOR_IDENTIFIER]
-    seg = self.segs[sub_sector.first_seg_id]
-    return seg.front_sector.floor_height
+    return sub_sector_id - self.SUB_SECTOR_IDENTIFIER
 
-  # Convert an angle to the x position on screen
+  # Convert an angle to the x position on the screen of a viewport
   @staticmethod
-  def angle_to_x(angle):
+  def angle_to_x(view, angle):
     if angle > 0:
-      x = SCREEN_DIST - math.tan(math.radians(angle)) * H_WIDTH
+      x = view.screen_dist - math.tan(math.radians(angle)) * view.h_width
     else:
-      x = -math.tan(math.radians(angle)) * H_WIDTH + SCREEN_DIST
+      x = -math.tan(math.radians(angle)) * view.h_width + view.screen_dist
     return int(x)
 
-  # Add a segment to the field of view (FOV)
-  def add_segment_to_fov(self, vertex1, vertex2):
-    angle1 = self.point_to_angle(vertex1)
-    angle2 = self.point_to_angle(vertex2)
+  # Add a segment to the field of view (FOV) of a viewport's camera. The vertexes are (x, y) pairs
+  def add_segment_to_fov(self, view, vertex1, vertex2):
+    camera = view.camera
+    angle1 = self.point_to_angle(camera.pos, *vertex1)
+    angle2 = self.point_to_angle(camera.pos, *vertex2)
 
     # Normalize the difference between angles
     span = self.norm(angle1 - angle2)
@@ -62,8 +96,8 @@ class BSP:
 
     rw_angle1 = angle1
 
-    angle1 -= self.player.angle
-    angle2 -= self.player.angle
+    angle1 -= camera.angle
+    angle2 -= camera.angle
 
     span1 = self.norm(angle1 + H_FOV)
 
@@ -78,64 +112,73 @@ class BSP:
         return False
       angle2 = -H_FOV
 
-    x1 = self.angle_to_x(angle1)
-    x2 = self.angle_to_x(angle2)
+    x1 = self.angle_to_x(view, angle1)
+    x2 = self.angle_to_x(view, angle2)
 
     return x1, x2, rw_angle1
 
   # Render a sub sector by adding each segment in the sub sector to the FOV
-  def render_sub_sector(self, sub_sector_id):
-    sub_sector = self.sub_sectors[sub_sector_id]
+  def render_sub_sector(self, view, sub_sector_id):
+    first_seg_id = self.sub_sectors.first_seg_id[sub_sector_id]
+    seg_handler = self.engine.seg_handler
+    segs = seg_handler.segs
+
+    for seg_id in range(first_seg_id, first_seg_id + self.sub_sectors.seg_count[sub_sector_id]):
+      start = segs.start_x[seg_id], segs.start_y[seg_id]
+      end = segs.end_x[seg_id], segs.end_y[seg_id]
+      if result := self.add_segment_to_fov(view, start, end):
+        seg_handler.classify_segment(view, seg_id, *result)
 
-    for i in range(sub_sector.seg_count):
-      seg = self.segs[sub_sector.first_seg_id + i]
-      if result := self.add_segment_to_fov(seg.start_vertex, seg.end_vertex):
-        self.engine.seg_handler.classify_segment(seg, *result)
+    # Queue the things standing in this sub sector for sprite drawing
+    self.engine.sprite_renderer.add_sub_sector_things(view, sub_sector_id)
 
   # Normalize an angle to a value between 0 and 360
   @staticmethod
   def norm(angle):
     return angle % 360
 
-  # Check if a bounding box is within the player's FOV
-  def check_bbox(self, bbox):
+  # Check if a bounding box (top, bottom, left, right) is within the FOV of a viewport's camera
+  def check_bbox(self, view, bbox):
+    top, bottom, left, right = bbox
+
     # Get the corners of the bounding box
-    a, b = vec2(bbox.left, bbox.bottom), vec2(bbox.left, bbox.top)
-    c, d = vec2(bbox.right, bbox.top), vec2(bbox.right, bbox.bottom)
+    a, b = (left, bottom), (left, top)
+    c, d = (right, top), (right, bottom)
 
     # Set the sides of the bounding box that need to be checked
-    # based on the player's position
-    px, py = self.player.pos
-    if px < bbox.left:
-      if py > bbox.top:
+    # based on the camera's position
+    camera = view.camera
+    px, py = camera.pos
+    if px < left:
+      if py > top:
         bbox_sides = (b, a), (c, b)
-      elif py < bbox.bottom:
+      elif py < bottom:
         bbox_sides = (b, a), (a, d)
       else:
         bbox_sides = (b, a),
-    elif px > bbox.right:
-      if py > bbox.top:
+    elif px > right:
+      if py > top:
         bbox_sides = (c, b), (d, c)
-      elif py < bbox.bottom:
+      elif py < bottom:
         bbox_sides = (a, d), (d, c)
       else:
         bbox_sides = (d, c),
     else:
-      if py > bbox.top:
+      if py > top:
         bbox_sides = (c, b),
-      elif py < bbox.bottom:
+      elif py < bottom:
         bbox_sides = (a, d),
       else:
         return True
 
-    # Check if any of the sides of the bounding box are within the player's FOV
+    # Check if any of the sides of the bounding box are within the camera's FOV
     for v1, v2 in bbox_sides:
-      angle1 = self.point_to_angle(v1)
-      angle2 = self.point_to_angle(v2)
+      angle1 = self.point_to_angle(camera.pos, *v1)
+      angle2 = self.point_to_angle(camera.pos, *v2)
 
       span = self.norm(angle1 - angle2)
 
-      angle1 -= self.player.angle
+      angle1 -= camera.angle
       span1 = self.norm(angle1 + H_FOV)
 
       if span1 > FOV:
@@ -144,37 +187,38 @@ class BSP:
       return True
     return False
 
-  # Get the angle between the player's position and a vertex
-  def point_to_angle(self, vertex):
-    delta = vertex - self.player.pos
-    return math.degrees(math.atan2(delta.y, delta.x))
+  # Get the angle between a position and a point
+  @staticmethod
+  def point_to_angle(pos, x, y):
+    return math.degrees(math.atan2(y - pos.y, x - pos.x))
 
   # Render a BSP node by recursively rendering its children nodes
-  # The rendering order is determined by the player's position relative to the node's partition line
-  def render_bsp_node(self, node_id):
-    if self.is_traverse_bsp:
+  # The rendering order is determined by the camera's position relative to the node's partition line
+  def render_bsp_node(self, view, node_id):
+    if view.is_traverse_bsp:
 
       if node_id >= self.SUB_SECTOR_IDENTIFIER:
         sub_sector_id = node_id - self.SUB_SECTOR_IDENTIFIER
-        self.render_sub_sector(sub_sector_id)
+        self.render_sub_sector(view, sub_sector_id)
         return None
 
-      node = self.nodes[node_id]
+      nodes = self.nodes
 
-      # Determine if player is on the back side of the node
-      is_on_back = self.is_on_back_side(node)
+      # Determine if the camera is on the back side of the node
+      is_on_back = self.is_point_on_back_side(node_id, view.camera.pos)
 
       if is_on_back:
-        self.render_bsp_node(node.back_child_id)
-        if self.check_bbox(node.bbox['front']):
-          self.render_bsp_node(node.front_child_id)
+        self.render_bsp_node(view, nodes.back_child_id[node_id])
+        if self.check_bbox(view, self.front_bboxes[node_id]):
+          self.render_bsp_node(view, nodes.front_child_id[node_id])
       else:
-        self.render_bsp_node(node.front_child_id)
-        if self.check_bbox(node.bbox['back']):
-          self.render_bsp_node(node.back_child_id)
-
-  # Check if the player is on the back side of a node
-  def is_on_back_side(self, node):
-    dx = self.player.pos.x - node.x_partition
-    dy = self.player.pos.y - node.y_partition
-    return dx * node.dy_partition - dy * node.dx_partition <= 0
+        self.render_bsp_node(view, nodes.front_child_id[node_id])
+        if self.check_bbox(view, self.back_bboxes[node_id]):
+          self.render_bsp_node(view, nodes.back_child_id[node_id])
+
+  # Check if a point is on the back side of a node
+  def is_point_on_back_side(self, node_id, pos):
+    nodes = self.nodes
+    dx = pos.x - nodes.x_partition[node_id]
+    dy = pos.y - nodes.y_partition[node_id]
+    return dx * nodes.dy_partition[node_id] - dy * nodes.dx_partition[node_id] <= 0
@@ -82,7 +82,7 @@ class Sidedef:
 
   __slots__ += ['sector']
 
-# Class representing a segment with fields like start and end vertex ids, angle, linedef id, direction, and offset. Also maintains references to its vertices, linedef, and front and back sectors
+# Class representing a segment with fields like start and end vertex ids, angle, linedef id, direction, and offset. Also maintains references to its linedef, and front and back sectors
 class Seg:
   __slots__ = [
     'start_vertex_id',
@@ -92,7 +92,7 @@ class Seg:
     'direction',
     'offset'
   ]
-  __slots__ += ['start_vertex', 'end_vertex', 'linedef', 'front_sector', 'back_sector']
+  __slots__ += ['linedef', 'front_sector', 'back_sector']
 
 # Class representing a linedef with fields like start and end vertex ids, flags, line type, sector tag, and front and back sidedef ids. Also maintains references to its front and back sidedefs
 class Linedef:
@@ -132,3 +132,30 @@ class Node:
   # Initialize the node with bounding boxes for front and back sides
   def __init__(self):
     self.bbox = {'front': self.BBox(), 'back': self.BBox()}
+
+# Class representing a wall range drawn during seg rendering. Stores the screen range, the wall scale at both ends and,
+# for portals, the clip silhouette left after the range was drawn. Solid walls have no silhouette and occlude everything behind them
+class DrawSeg:
+  __slots__ = [
+    'x1',
+    'x2',
+    'scale1',
+    'scale2',
+    'seg',
+    'top_clip',
+    'bottom_clip'
+  ]
+
+# Class representing a thing projected to the screen for sprite drawing, with its screen range, scale, depth and sprite data
+class VisSprite:
+  __slots__ = [
+    'x1',
+    'x2',
+    'start_x',
+    'top_y',
+    'scale',
+    'depth',
+    'pos',
+    'sprite',
+    'light_level'
+  ]
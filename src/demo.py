@@ -0,0 +1,130 @@
+import os
+import sys
+import struct
+import hashlib
+import argparse
+from settings import *
+
+# Demo file layout: magic, format version, tic rate, map name, tic count, then one input byte per tic
+DEMO_MAGIC = b'PYDM'
+DEMO_VERSION = 1
+DEMO_HEADER = struct.Struct('<4sBH8sI')
+
+def write_demo(path, map_name, tics, tic_rate=DEMO_TIC_RATE):
+  # Write the recorded input bytes of a demo
+  with open(path, 'wb') as f:
+    f.write(DEMO_HEADER.pack(DEMO_MAGIC, DEMO_VERSION, tic_rate, map_name.encode('ascii'), len(tics)))
+    f.write(bytes(tics))
+
+def read_demo(path):
+  # Read a demo, returning its map name, tic rate and input bytes
+  with open(path, 'rb') as f:
+    data = f.read()
+
+  magic, version, tic_rate, map_name, count = DEMO_HEADER.unpack_from(data)
+  if magic != DEMO_MAGIC or version != DEMO_VERSION:
+    raise ValueError(f'{path} is not a version {DEMO_VERSION} demo file')
+  tics = data[DEMO_HEADER.size: DEMO_HEADER.size + count]
+  return map_name.rstrip(b'\0').decode('ascii'), tic_rate, tics
+
+# DemoRecorder class, an input source reading the keyboard and recording the input of every tic.
+# While recording, the engine runs with a fixed time step so the demo replays identically, one tic per
+# frame, and its frame rate is limited to the tic rate so the game runs in real time.
+class DemoRecorder:
+  def __init__(self, engine, tic_rate=DEMO_TIC_RATE):
+    self.engine = engine
+    self.tic_rate = tic_rate
+    self.tics = bytearray()
+
+    engine.fixed_dt = engine.dt = 1000 / tic_rate
+    engine.max_fps = tic_rate
+    engine.player.input_source = self
+
+  def get_buttons(self):
+    buttons = self.engine.player.get_input()
+    self.tics.append(buttons)
+    return buttons
+
+  def save(self, path):
+    write_demo(path, self.engine.map_name, self.tics, self.tic_rate)
+
+# DemoPlayer class, an input source replaying recorded tics with the demo's fixed time step.
+# The engine stops running when the demo ends.
+class DemoPlayer:
+  def __init__(self, engine, tics, tic_rate=DEMO_TIC_RATE):
+    self.engine = engine
+    self.tics = tics
+    self.tic = 0
+
+    engine.fixed_dt = engine.dt = 1000 / tic_rate
+    engine.player.input_source = self
+
+  @property
+  def finished(self):
+    return self.tic >= len(self.tics)
+
+  def get_buttons(self):
+    if self.finished:
+      self.engine.running = False
+      return 0
+    buttons = self.tics[self.tic]
+    self.tic += 1
+    return buttons
+
+def record(args):
+  from main import DoomEngine
+
+  engine = DoomEngine(wad_path=args.wad, map_name=args.map)
+  recorder = DemoRecorder(engine)
+  try:
+    engine.run()
+  finally:
+    # The engine exits the process when the window is closed
+    recorder.save(args.demo)
+    print(f'recorded {len(recorder.tics)} tics to {args.demo}')
+
+def play(args):
+  if args.headless:
+    os.environ['SDL_VIDEODRIVER'] = 'dummy'
+  from main import DoomEngine
+
+  map_name, tic_rate, tics = read_demo(args.demo)
+  engine = DoomEngine(wad_path=args.wad, map_name=map_name, preload=not args.headless)
+  player = DemoPlayer(engine, tics, tic_rate)
+
+  if not args.headless:
+    engine.max_fps = tic_rate  # Watch the demo in real time
+    engine.run()
+    return None
+
+  # Headless playback: one update and one frame per tic, hashing the camera path and the frames
+  path_digest, frame_digest = hashlib.sha1(), hashlib.sha1()
+  while not player.finished:
+    engine.update()
+    engine.draw()
+    p = engine.player
+    path_digest.update(struct.pack('<4d', p.pos.x, p.pos.y, p.angle, p.height))
+    frame_digest.update(engine.framebuffer.tobytes())
+  print(f'tics {len(tics)}  path {path_digest.hexdigest()}  frames {frame_digest.hexdigest()}')
+
+def main(argv=None):
+  parser = argparse.ArgumentParser(description='Record and play back input demos.')
+  parser.add_argument('--wad', default='./resources/wad/DOOM1.WAD', help='path to the WAD file')
+  commands = parser.add_subparsers(dest='command', required=True)
+
+  record_parser = commands.add_parser('record', help='play with the keyboard and record the input')
+  record_parser.add_argument('demo', help='demo file to write')
+  record_parser.add_argument('--map', default='E1M1', help='map to load')
+  record_parser.set_defaults(func=record)
+
+  play_parser = commands.add_parser('play', help='replay a recorded demo')
+  play_parser.add_argument('demo', help='demo file to read')
+  play_parser.add_argument('--headless', action='store_true',
+                           help='render without a window and print digests of the camera path and frames')
+  play_parser.set_defaults(func=play)
+
+  args = parser.parse_args(argv)
+  args.func(args)
+
+if __name__ == '__main__':
+  main()
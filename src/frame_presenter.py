@@ -0,0 +1,139 @@
+import threading
+import time
+from collections import deque
+import pygame as pg
+from settings import *
+
+# FramePresenter class, presents finished frames with the copy out of the framebuffer on a background thread.
+# The engine renders frame N+1 into one framebuffer while frame N is copied from the other one into an
+# off-screen surface (or handed to an encoder when running headless). SDL display calls are only safe on
+# the main thread on several platforms, so the copied frame is blitted to the screen with the overlays
+# and flipped by the main thread when it submits the next frame: a frame is shown one frame later than
+# without pipelining.
+class FramePresenter:
+  def __init__(self, engine, headless=None, encoder=None):
+    self.engine = engine  # Reference to the main engine
+    if headless is None:
+      headless = pg.display.get_driver() == 'dummy'  # No real display to flip to
+    self.headless = headless  # Encode frames instead of flipping the display
+    self.encoder = encoder or self.encode_frame  # Callable receiving each finished framebuffer
+    self.last_encoded = None  # Output of the default encoder
+
+    # Two framebuffers: one is being presented while the other is being rendered
+    self.buffers = [engine.framebuffer, engine.framebuffer.copy()]
+    self.back_index = 0  # Index of the buffer the engine is rendering into
+    # Off-screen surface the frames are copied into, in the format of the screen
+    self.surface = None if headless else pg.Surface(engine.screen.get_size(), 0, engine.screen)
+    self.copied = None  # (frame start time, profiler frame index) of the frame copied into the surface and not shown yet
+
+    self.pending = None  # (framebuffer, frame start time, profiler frame index) waiting to be presented
+    self.frame_ready = threading.Event()  # Set when a frame is submitted
+    self.present_done = threading.Event()  # Set when the presenter is idle
+    self.present_done.set()
+    self.running = True
+
+    # Time from the start of a frame's update to the end of its presentation, in ms
+    self.latencies = deque(maxlen=PRESENT_LATENCY_SAMPLES)
+    self.present_times = deque(maxlen=PRESENT_LATENCY_SAMPLES)
+    self.wait_times = deque(maxlen=PRESENT_LATENCY_SAMPLES)
+
+    self.thread = threading.Thread(target=self.run, name='FramePresenter', daemon=True)
+    self.thread.start()
+
+  # Hand the finished back buffer to the presenter and return the buffer to render the next frame into.
+  # The previous frame is shown first. At most one frame is ever in flight, so input-to-display latency
+  # stays bounded to two frames. Called on the main thread
+  def submit(self, framebuffer, frame_start, frame_index=None):
+    t = time.perf_counter()
+    self.present_done.wait()
+    self.wait_times.append((time.perf_counter() - t) * 1000)
+    self.show()
+
+    self.pending = framebuffer, frame_start, frame_index
+    self.present_done.clear()
+    self.frame_ready.set()
+
+    self.back_index ^= 1
+    return self.buffers[self.back_index]
+
+  # Background loop presenting submitted frames
+  def run(self):
+    while True:
+      self.frame_ready.wait()
+      self.frame_ready.clear()
+      if not self.running:
+        break
+
+      framebuffer, frame_start, frame_index = self.pending
+      t = time.perf_counter()
+      profiler = self.get_profiler(frame_index)
+      if profiler:
+        profiler.begin_present(frame_index)
+      if self.headless:
+        self.encode(framebuffer)
+      else:
+        self.engine.blit_framebuffer(framebuffer, self.surface)
+      if profiler:
+        profiler.end_present(shown=self.headless)  # A windowed frame is shown later, by the main thread
+      if self.headless:
+        self.latencies.append((time.perf_counter() - frame_start) * 1000)
+      else:
+        self.copied = frame_start, frame_index
+      self.present_times.append((time.perf_counter() - t) * 1000)
+
+      self.pending = None
+      self.present_done.set()
+
+  # Show the frame copied into the surface: blit it to the display, draw overlays and flip. Called on the
+  # main thread while no frame is in flight
+  def show(self):
+    if self.copied is None:
+      return None
+    (frame_start, frame_index), self.copied = self.copied, None
+    profiler = self.get_profiler(frame_index)
+    if profiler:
+      profiler.begin_present(frame_index)
+    self.engine.screen.blit(self.surface, (0, 0))
+    self.engine.draw_overlays()
+    self.engine.flip_display()
+    if profiler:
+      profiler.end_present(shown=True)
+    self.latencies.append((time.perf_counter() - frame_start) * 1000)
+
+  # Profiler to time the presentation of a frame with, if it is enabled. The blit and flip of a frame are
+  # reported in the profiler's present lane for that frame instead of the frame being rendered meanwhile
+  def get_profiler(self, frame_index):
+    profiler = self.engine.profiler
+    return profiler if self.engine.is_profiling() and frame_index is not None else None
+
+  # Hand a framebuffer to the encoder; a method so the profiler can time it
+  def encode(self, framebuffer):
+    self.encoder(framebuffer)
+
+  # Default headless encoder: keep the raw RGB bytes of the latest frame
+  def encode_frame(self, framebuffer):
+    self.last_encoded = framebuffer.tobytes()
+
+  # Block until the frame in flight has been presented, and show it. Called on the main thread
+  def wait(self):
+    self.present_done.wait()
+    self.show()
+
+  # Summary of the presentation pipeline timings in milliseconds
+  def get_stats(self):
+    def mean(values):
+      return sum(values) / len(values) if values else 0.0
+
+    return {
+      'latency_ms': mean(self.latencies),
+      'latency_max_ms': max(self.latencies, default=0.0),
+      'present_ms': mean(self.present_times),
+      'wait_ms': mean(self.wait_times),
+    }
+
+  # Finish the frame in flight and stop the background thread
+  def stop(self):
+    self.wait()
+    self.running = False
+    self.frame_ready.set()
+    self.thread.join()
@@ -0,0 +1,152 @@
+import os
+import sys
+import argparse
+from types import SimpleNamespace
+from collections.abc import Sequence
+
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+
+import numpy as np
+from pygame.math import Vector2 as vec2
+from data_types import Sector, Sidedef, Linedef, Seg
+
+# Record layouts of the geometry lumps of a map. They are the layouts of the lumps in the WAD, so the
+# tables are read from the WAD bytes without converting a field
+GEOMETRY_DTYPES = {
+  'vertexes': np.dtype([('x', '<i2'), ('y', '<i2')]),
+  'sub_sectors': np.dtype([('seg_count', '<i2'), ('first_seg_id', '<i2')]),
+  'nodes': np.dtype([
+    ('x_partition', '<i2'), ('y_partition', '<i2'), ('dx_partition', '<i2'), ('dy_partition', '<i2'),
+    ('front_top', '<i2'), ('front_bottom', '<i2'), ('front_left', '<i2'), ('front_right', '<i2'),
+    ('back_top', '<i2'), ('back_bottom', '<i2'), ('back_left', '<i2'), ('back_right', '<i2'),
+    ('front_child_id', '<u2'), ('back_child_id', '<u2'),
+  ]),
+  'things': np.dtype([('x', '<i2'), ('y', '<i2'), ('angle', '<u2'), ('type', '<u2'), ('flags', '<u2')]),
+}
+
+# Map records by lump name, in lump order
+MAP_RECORDS = {
+  'THINGS': 'things', 'LINEDEFS': 'linedefs', 'SIDEDEFS': 'sidedefs', 'VERTEXES': 'vertexes',
+  'SEGS': 'segments', 'SSECTORS': 'sub_sectors', 'NODES': 'nodes', 'SECTORS': 'sectors',
+}
+
+# Record types that are linked to by other records; their size is counted with their own structure
+LINKED_TYPES = (Sector, Sidedef, Linedef, Seg)
+
+# GeometryStore class, the geometry of a map (vertexes, sub sectors, BSP nodes and things) as typed
+# record tables, one NumPy structured array per structure. Code working on whole structures or in the
+# hot paths reads the columns; the map data also gives per-object views of the records, built on first
+# access (see LazyRecords).
+class GeometryStore:
+  def __init__(self, tables):
+    self.tables = tables  # Record tables by structure name
+    self.vertexes = tables['vertexes']
+    self.sub_sectors = tables['sub_sectors']
+    self.nodes = tables['nodes']
+    self.things = tables['things']
+
+  # Read the geometry lumps of a map. The tables are copied out of the WAD bytes so the reader can be closed
+  @classmethod
+  def from_lumps(cls, reader, map_index, lump_indices):
+    tables = {}
+    for lump_name, name in MAP_RECORDS.items():
+      if name not in GEOMETRY_DTYPES:
+        continue
+      lump_info = reader.directory[map_index + lump_indices[lump_name]]
+      dtype = GEOMETRY_DTYPES[name]
+      tables[name] = np.frombuffer(reader.wad_bytes, dtype, lump_info['lump_size'] // dtype.itemsize,
+                                   lump_info['lump_offset']).copy()
+    return cls(tables)
+
+  # Fields of a structure as Python lists, which are faster to index one value at a time than the arrays
+  def get_columns(self, name):
+    table = self.tables[name]
+    return SimpleNamespace(**{field: table[field].tolist() for field in table.dtype.names})
+
+  @property
+  def nbytes(self):
+    return sum(table.nbytes for table in self.tables.values())
+
+# Sequence of records built from a table on first access and kept for the later ones
+class LazyRecords(Sequence):
+  def __init__(self, table, make):
+    self.table = table  # Record table
+    self.make = make  # Function building the record of an index from its row
+    self.loaded = {}  # Records built so far by index
+
+  def __getitem__(self, index):
+    if isinstance(index, slice):
+      return [self[i] for i in range(*index.indices(len(self)))]
+    if index < 0:
+      index += len(self.table)
+    if (record := self.loaded.get(index)) is None:
+      record = self.loaded[index] = self.make(self.table[index].item())
+    return record
+
+  def __len__(self):
+    return len(self.table)
+
+  def get_loaded(self):
+    return list(self.loaded.values())
+
+# Approximate size in bytes of a record object and the values it owns. Small ints are shared by the
+# interpreter and counted anyway, so the sizes are upper bounds
+def get_object_size(obj):
+  size = sys.getsizeof(obj)
+  for name in getattr(type(obj), '__slots__', ()):
+    value = getattr(obj, name, None)
+    if value is None or isinstance(value, LINKED_TYPES):
+      continue
+    if isinstance(value, dict):
+      size += sys.getsizeof(value) + sum(get_object_size(item) for item in value.values())
+    else:
+      size += get_object_size(value)
+  return size
+
+# Memory used by the records of a loaded map, per structure: the record count, the size of its lump in
+# the WAD, the size of its typed table (geometry only) and the size of the record objects built so far
+def get_memory_report(wad_data):
+  reader = wad_data.reader
+  map_index = reader.lump_indices[wad_data.map_name]
+  report = {}
+  for lump_name, name in MAP_RECORDS.items():
+    records = getattr(wad_data, name)
+    objects = records.get_loaded() if hasattr(records, 'get_loaded') else records  # Lazy records or a list
+    table = wad_data.geometry.tables.get(name)
+    report[name] = {
+      'count': len(records),
+      'lump_bytes': reader.directory[map_index + wad_data.LUMP_INDICES[lump_name]]['lump_size'],
+      'array_bytes': 0 if table is None else table.nbytes,
+      'objects': len(objects),
+      'object_bytes': sys.getsizeof(records) + sum(get_object_size(obj) for obj in objects),
+    }
+  return report
+
+def format_memory_report(report):
+  lines = [f'{"structure":<12}{"count":>8}{"lump KB":>10}{"array KB":>10}{"objects":>9}{"object KB":>11}']
+  for name, row in report.items():
+    lines.append(f'{name:<12}{row["count"]:>8}{row["lump_bytes"] / 1024:>10.1f}{row["array_bytes"] / 1024:>10.1f}'
+                 f'{row["objects"]:>9}{row["object_bytes"] / 1024:>11.1f}')
+  total = {key: sum(row[key] for row in report.values()) for key in ('lump_bytes', 'array_bytes', 'object_bytes')}
+  lines.append(f'{"total":<12}{"":>8}{total["lump_bytes"] / 1024:>10.1f}{total["array_bytes"] / 1024:>10.1f}'
+               f'{"":>9}{total["object_bytes"] / 1024:>11.1f}')
+  return '\n'.join(lines)
+
+def main(argv=None):
+  parser = argparse.ArgumentParser(description='Print the memory used by the records of a map.')
+  parser.add_argument('--wad', default='./resources/wad/DOOM1.WAD', help='path to the WAD file')
+  parser.add_argument('--map', default='E1M1', help='map to load')
+  parser.add_argument('--all', action='store_true', help='build every per-object view before measuring')
+  args = parser.parse_args(argv)
+
+  from wad_reader import WADReader
+  from wad_data import WADData
+
+  wad_data = WADData(None, args.map, WADReader(args.wad))
+  if args.all:
+    for name in MAP_RECORDS.values():
+      list(getattr(wad_data, name))
+  print(format_memory_report(get_memory_report(wad_data)))
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,162 @@
+import os
+import sys
+import json
+import time
+import argparse
+
+# Render without a window: SDL's dummy video driver must be selected before pygame initializes the display
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+
+import numpy as np
+from settings import *
+from batch_render import BatchRenderer, write_framebuffer
+from jit_warmup import KERNELS
+from view_renderer import ViewRenderer
+from sprite_renderer import SpriteRenderer
+
+# Golden image regression harness. Fixed viewpoints are rendered to framebuffers and stored in one
+# compressed .npz file; later renders are compared against them per pixel within a tolerance.
+# The compiled kernels can also be checked against the same kernels run as plain Python functions
+# instead of their Numba compiled versions ('kernels'). This only checks the compilation of the kernels:
+# both renders go through the same BSP traversal, wall clipping, sprite clipping (store_draw_seg) and
+# tables (sky column cache, texture atlas, light tables, seg and sector tables), so a bug there shows up
+# in both and is only caught against golden images. Both renders use column step 1, so every column is
+# drawn by the kernels and none is copied by column decimation.
+
+# Largest per channel difference a pixel may have and still match, and share of the pixels that may
+# differ by more. Compiled kernels use fastmath, so a few texels can round differently from Python.
+DEFAULT_TOLERANCE = 2
+DEFAULT_MAX_MISMATCH = 0.001
+
+# Run the engine's rendering kernels as pure Python: slow, but free of compiler optimisations. Only the
+# kernels are swapped; the code calling them and their inputs are shared with the compiled path
+def use_python_kernels(engine):
+  owners = {ViewRenderer: engine.view_renderer, SpriteRenderer: engine.sprite_renderer}
+  for name, (owner, attr, signature) in KERNELS.items():
+    setattr(owners[owner], attr, getattr(owner, attr).py_func)
+
+# Default viewpoints: a turn on the spot at the player start in 45 degree steps
+def get_default_views(engine):
+  x, y = engine.player.pos
+  return [(x, y, engine.player.angle + a) for a in range(0, 360, 45)]
+
+def render_frames(renderer, views):
+  return np.stack([renderer.render(view) for view in views])
+
+def save_golden(path, frames, views, meta):
+  np.savez_compressed(path, frames=frames, views=np.array(views, dtype=np.float64),
+                      meta=np.array(json.dumps(meta)))
+
+def load_golden(path):
+  # Returns the frames, the viewpoints and the metadata of a golden file
+  with np.load(path) as data:
+    return data['frames'], [tuple(view) for view in data['views'].tolist()], json.loads(str(data['meta']))
+
+# Compare two frames per pixel. A pixel mismatches when one of its channels differs by more than the tolerance
+def compare_frame(expected, actual, tolerance=DEFAULT_TOLERANCE, max_mismatch=DEFAULT_MAX_MISMATCH):
+  if expected.shape != actual.shape:
+    return {'passed': False, 'error': f'shape {actual.shape} != {expected.shape}'}
+
+  diff = np.abs(expected.astype(np.int16) - actual.astype(np.int16)).max(axis=2)
+  mismatched = int(np.count_nonzero(diff > tolerance))
+  mismatch_ratio = mismatched / diff.size
+  return {
+    'passed': mismatch_ratio <= max_mismatch,
+    'max_diff': int(diff.max()),
+    'mismatched_pixels': mismatched,
+    'mismatch_ratio': mismatch_ratio,
+  }
+
+# Image of the differences: mismatching pixels in red over a dimmed copy of the expected frame
+def get_diff_image(expected, actual, tolerance=DEFAULT_TOLERANCE):
+  diff = np.abs(expected.astype(np.int16) - actual.astype(np.int16)).max(axis=2)
+  image = expected // 4
+  image[diff > tolerance] = 255, 0, 0
+  return image
+
+# Compare frames against expected ones, writing the actual and diff images of failing views to diff_dir
+def compare_frames(expected_frames, actual_frames, tolerance, max_mismatch, diff_dir=None):
+  results = []
+  for i, (expected, actual) in enumerate(zip(expected_frames, actual_frames)):
+    result = compare_frame(expected, actual, tolerance, max_mismatch)
+    if not result['passed'] and diff_dir and 'error' not in result:
+      os.makedirs(diff_dir, exist_ok=True)
+      write_framebuffer(actual, os.path.join(diff_dir, f'view_{i:03d}_actual.png'))
+      write_framebuffer(get_diff_image(expected, actual, tolerance), os.path.join(diff_dir, f'view_{i:03d}_diff.png'))
+    results.append({'view': i, **result})
+  return results
+
+def print_results(results):
+  for result in results:
+    status = 'ok' if result['passed'] else 'FAIL'
+    detail = result.get('error') or (f"max diff {result['max_diff']}, "
+                                     f"{result['mismatched_pixels']} pixels ({result['mismatch_ratio']:.4%})")
+    print(f"view {result['view']:3d}: {status:4} {detail}")
+  return all(result['passed'] for result in results)
+
+def main(argv=None):
+  parser = argparse.ArgumentParser(description='Golden image regression checks of the renderer.')
+  subparsers = parser.add_subparsers(dest='command', required=True)
+
+  record_parser = subparsers.add_parser('record', help='render the viewpoints and store them as golden images')
+  check_parser = subparsers.add_parser('check', help='compare renders against stored golden images')
+  kernels_parser = subparsers.add_parser('kernels', help='compare the compiled kernels with their Python functions')
+
+  for sub in (record_parser, check_parser, kernels_parser):
+    sub.add_argument('--wad', default='./resources/wad/DOOM1.WAD', help='path to the WAD file')
+    sub.add_argument('--map', default='E1M1', help='map to load')
+  for sub in (record_parser, check_parser):
+    sub.add_argument('--python-kernels', action='store_true', help='render with the pure Python kernels')
+  for sub in (check_parser, kernels_parser):
+    sub.add_argument('--tolerance', type=int, default=DEFAULT_TOLERANCE, help='largest matching channel difference')
+    sub.add_argument('--max-mismatch', type=float, default=DEFAULT_MAX_MISMATCH,
+                     help='share of the pixels allowed to differ by more than the tolerance')
+    sub.add_argument('--diff-dir', help='write the actual and diff images of failing views to this directory')
+  for sub in (record_parser, kernels_parser):
+    sub.add_argument('--views', help='JSON file with a list of [x, y, angle(, height)] viewpoints')
+  record_parser.add_argument('golden', help='golden .npz file to write')
+  check_parser.add_argument('golden', help='golden .npz file to compare against')
+  args = parser.parse_args(argv)
+
+  if args.command == 'check':
+    expected_frames, views, meta = load_golden(args.golden)
+    if (meta['wad'], meta['map']) != (os.path.basename(args.wad), args.map):
+      print(f"warning: golden images were recorded from {meta['wad']} {meta['map']}", file=sys.stderr)
+  renderer = BatchRenderer(args.wad, args.map)
+  if args.command != 'check':
+    if args.views:
+      with open(args.views) as f:
+        views = [tuple(view) for view in json.load(f)]
+    else:
+      views = get_default_views(renderer.engine)
+
+  if args.command == 'kernels':
+    # Compiled frames first, then the same views with the kernels swapped for their Python versions
+    renderer.viewport.column_step = 1
+    start = time.perf_counter()
+    expected_frames = render_frames(renderer, views)
+    compiled_time = time.perf_counter() - start
+    use_python_kernels(renderer.engine)
+    start = time.perf_counter()
+    actual_frames = render_frames(renderer, views)
+    print(f'compiled {compiled_time:.2f} s, python {time.perf_counter() - start:.2f} s')
+  else:
+    if args.python_kernels:
+      use_python_kernels(renderer.engine)
+    actual_frames = render_frames(renderer, views)
+
+  if args.command == 'record':
+    meta = {'wad': os.path.basename(args.wad), 'map': args.map, 'resolution': [WIDTH, HEIGHT],
+            'python_kernels': args.python_kernels}
+    save_golden(args.golden, actual_frames, views, meta)
+    print(f'recorded {len(views)} views to {args.golden}')
+    return None
+
+  results = compare_frames(expected_frames, actual_frames, args.tolerance, args.max_mismatch, args.diff_dir)
+  if not print_results(results):
+    sys.exit(1)
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,125 @@
+import os
+import time
+import inspect
+import argparse
+import importlib
+import numpy as np
+from settings import *
+from view_renderer import ViewRenderer
+from sprite_renderer import SpriteRenderer
+
+# Rendering kernels as (owner class, attribute name, signature). The signatures are the argument types
+# the renderers call the kernels with; they are used to build the ahead-of-time compiled module.
+KERNELS = {
+  'draw_column': (
+    ViewRenderer, 'draw_column',
+    'void(uint8[:,:,:], int64, int64, int64, UniTuple(float64, 3))'
+  ),
+  'draw_flat_col': (
+    ViewRenderer, 'draw_flat_col',
+    'void(uint8[:,:,:], uint8[:,:], int32[:,:], int64, int64, int64, int64, float32[:], '
+    'float64, float64, float64, float64, int64, int64)'
+  ),
+  'draw_wall_col': (
+    ViewRenderer, 'draw_wall_col',
+    'void(uint8[:,:,:], uint8[:,:], int32[:,:], int64, float64, int64, int64, int64, '
+    'float64, float64, float64, int64)'
+  ),
+  'draw_sprite_cols': (
+    SpriteRenderer, 'draw_sprite_cols',
+    'int64(uint8[:,:,:], uint8[:,:,:], uint8[:,:], int64, int64, float64, float64, float64, '
+    'int64[:], int64[:], float64, int64)'
+  ),
+}
+
+def warm_up(engine):
+  # Compile every rendering kernel against the argument types used while rendering, so the first frame
+  # does not stall. Kernels already compiled in an earlier run are loaded from Numba's on-disk cache.
+  # The ray tracer kernels are not needed to draw a frame and are compiled on their first query.
+  # Returns the time spent in seconds.
+  start = time.perf_counter()
+
+  # The pipelined presenter renders into a second framebuffer; compile for both if their layouts differ
+  framebuffers = engine.presenter.buffers if engine.presenter else [engine.framebuffer]
+  atlas = engine.view_renderer.atlas
+  warm_up_kernels(engine.view_renderer, engine.sprite_renderer, framebuffers,
+                  atlas.texels, atlas.info, engine.light_tables.get_z_light(1.0))
+  return time.perf_counter() - start
+
+def warm_up_kernels(view_renderer, sprite_renderer, framebuffers, texels, tex_info, z_light):
+  # Call each kernel with arguments of the rendering types. The ranges are empty, nothing is drawn
+  sprite_tex = np.zeros((1, 1, 3), dtype=np.uint8)
+  sprite_mask = np.zeros((1, 1), dtype=np.uint8)
+  clip = np.zeros(1, dtype=np.int64)
+
+  for framebuffer in framebuffers:
+    view_renderer.draw_column(framebuffer, 0, 1, 0, (0.0, 0.0, 0.0))
+    view_renderer.draw_flat_col(framebuffer, texels, tex_info, 0, 0, 1, 0, z_light,
+                                0.0, 0.0, 0.0, 0.0, WIDTH, H_HEIGHT)
+    view_renderer.draw_wall_col(framebuffer, texels, tex_info, 0, 0.0, 0, 1, 0,
+                                0.0, 1.0, 1.0, H_HEIGHT)
+    sprite_renderer.draw_sprite_cols(framebuffer, sprite_tex, sprite_mask, 1, 0, 0.0, 0.0,
+                                     1.0, clip, clip, 1.0, 1)
+
+def build_aot_kernels(output_dir=None):
+  # Compile the kernels ahead of time into an extension module next to the sources
+  from numba.pycc import CC
+
+  cc = CC(AOT_KERNELS_MODULE)
+  cc.output_dir = output_dir or os.path.dirname(os.path.abspath(__file__))
+  cc.target_cpu = 'host'  # The instruction set the JIT kernels are compiled for
+  for name, (owner, attr, signature) in KERNELS.items():
+    cc.export(name, signature)(get_aot_entry(getattr(owner, attr)))
+  cc.compile()
+  return cc.output_dir
+
+def get_aot_entry(kernel):
+  # Exported function calling a JIT kernel with the same parameters. numba.pycc compiles the functions it
+  # exports without the kernel's options (fastmath), while a kernel they call is compiled with its own,
+  # so the module computes the same pixels as the JIT kernels
+  params = ', '.join(inspect.signature(kernel.py_func).parameters)
+  namespace = {'kernel': kernel}
+  exec(f'def entry({params}):\n  return kernel({params})', namespace)
+  return namespace['entry']
+
+def load_aot_kernels():
+  # The ahead-of-time compiled module, or None if it has not been built
+  try:
+    return importlib.import_module(AOT_KERNELS_MODULE)
+  except ImportError:
+    return None
+
+def install_aot_kernels(engine):
+  # Replace the JIT kernels of the engine's renderers by the ahead-of-time compiled ones.
+  # Returns False when the module has not been built
+  if not (module := load_aot_kernels()):
+    return False
+
+  owners = {ViewRenderer: engine.view_renderer, SpriteRenderer: engine.sprite_renderer}
+  for name, (owner, attr, signature) in KERNELS.items():
+    setattr(owners[owner], attr, getattr(module, name))
+  return True
+
+def main(argv=None):
+  parser = argparse.ArgumentParser(description='Compile the rendering kernels.')
+  parser.add_argument('--aot', action='store_true',
+                      help=f'build the ahead-of-time compiled module {AOT_KERNELS_MODULE}')
+  parser.add_argument('--output-dir', help='directory of the ahead-of-time compiled module')
+  args = parser.parse_args(argv)
+
+  if args.aot:
+    start = time.perf_counter()
+    output_dir = build_aot_kernels(args.output_dir)
+    print(f'built {AOT_KERNELS_MODULE} in {output_dir} in {time.perf_counter() - start:.1f} s')
+  else:
+    # Compile the kernels for the rendering types without loading a WAD, filling Numba's on-disk cache
+    start = time.perf_counter()
+    framebuffer = np.zeros((WIDTH, HEIGHT, 3), dtype=np.uint8)
+    texels = np.zeros((1, 3), dtype=np.uint8)
+    tex_info = np.ones((1, 3), dtype=np.int32)
+    z_light = np.ones(MAX_LIGHT_Z, dtype=np.float32)
+    warm_up_kernels(ViewRenderer, SpriteRenderer, [framebuffer], texels, tex_info, z_light)
+    print(f'compiled {len(KERNELS)} kernels in {time.perf_counter() - start:.1f} s')
+
+if __name__ == '__main__':
+  main()
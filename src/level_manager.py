@@ -0,0 +1,93 @@
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from settings import *
+from startup_profiler import startup_profiler
+from wad_reader import WADReader
+from wad_data import WADData
+from baked_level import BakedFile, BakedLevel, get_baked_path, get_map_digest
+
+# Lump names of the map markers: ExMy in DOOM style WADs, MAPxx in DOOM 2 style ones
+MAP_NAME_PATTERN = re.compile(r'E\dM\d|MAP\d\d')
+
+# LevelManager class, loads the maps of a WAD by name. The WAD file is read once, and the asset data
+# (palettes, textures, sprites) of the first map is shared by all later maps, so a map change only reads
+# the map lumps. The next map can be preloaded on a background thread, decoding its textures as well;
+# switching to it then only packs the new textures into the atlas and links the subsystems to the tables
+# built along with it (see DoomEngine.prepare_map).
+class LevelManager:
+  def __init__(self, engine):
+    self.engine = engine  # Reference to the main engine
+    with startup_profiler.phase('wad_directory'):
+      self.reader = WADReader(engine.wad_path)  # Reader shared by all maps
+    self.asset_data = None  # Asset data shared by all maps, loaded with the first map
+    self.map_names = self.get_map_names()  # Names of the maps in the WAD, in directory order
+    self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='map_preload')
+    self.preloads = {}  # Futures of the preloaded map data by map name
+
+  def get_map_names(self):
+    return [lump['lump_name'] for lump in self.reader.directory if MAP_NAME_PATTERN.fullmatch(lump['lump_name'])]
+
+  # Name of the map after the given one, wrapping around to the first map
+  def get_next_map(self, map_name):
+    return self.map_names[(self.map_names.index(map_name) + 1) % len(self.map_names)]
+
+  # Load the data of a map, taking it from its preload when there is one. The textures of the map are
+  # packed into the shared atlas, so this has to run on the thread that renders
+  def load(self, map_name):
+    if map_name not in self.map_names:
+      raise ValueError(f'no map {map_name!r} in {self.engine.wad_path}')
+
+    future = self.preloads.pop(map_name, None)
+    wad_data = future.result() if future else self.read_map(map_name)
+    self.cancel_preloads()  # Maps preloaded for nothing
+    if wad_data.prepared.get('atlas_size', len(self.asset_data.atlas.names)) != len(self.asset_data.atlas.names):
+      wad_data.prepared.clear()  # Its texture ids were resolved against an atlas that has grown since
+    self.asset_data.add_map(wad_data)
+    return wad_data
+
+  # Read a map, from its baked level when there is an up to date one, and decode its textures
+  def read_map(self, map_name):
+    if baked_file := self.get_baked_file(map_name):
+      wad_data = BakedLevel(self.engine, map_name, baked_file, self.reader, self.asset_data)
+    else:
+      wad_data = WADData(self.engine, map_name, self.reader, self.asset_data)
+    if self.asset_data is None:
+      self.asset_data = wad_data.asset_data
+    else:
+      self.asset_data.load_map_textures(wad_data)
+    return wad_data
+
+  # Baked level of a map, or None when there is none or it was baked from other lumps
+  def get_baked_file(self, map_name):
+    if not BAKED_LEVEL_DIR or not os.path.exists(path := get_baked_path(self.engine.wad_path, map_name, BAKED_LEVEL_DIR)):
+      return None
+    baked_file = BakedFile(path)
+    if baked_file.digest != get_map_digest(self.reader, map_name):
+      return None
+    return baked_file
+
+  # Read a map and build the tables of its subsystems, on the background thread
+  def prepare_map(self, map_name):
+    wad_data = self.read_map(map_name)
+    wad_data.prepared['atlas_size'] = len(self.asset_data.atlas.names)
+    self.engine.prepare_map(wad_data)
+    return wad_data
+
+  # Start reading a map on the background thread. The first map has to be loaded before
+  def preload(self, map_name):
+    if map_name not in self.preloads:
+      self.preloads[map_name] = self.executor.submit(self.prepare_map, map_name)
+
+  def preload_next(self, map_name):
+    self.preload(self.get_next_map(map_name))
+
+  def cancel_preloads(self):
+    for future in self.preloads.values():
+      future.cancel()
+    self.preloads.clear()
+
+  # Stop the background thread, waiting for a preload in progress
+  def close(self):
+    self.cancel_preloads()
+    self.executor.shutdown()
@@ -0,0 +1,56 @@
+import numpy as np
+from settings import *
+
+# LightTables class, holds the light diminishing tables built once at startup.
+# As in DOOM, each sector light band has a table for flats indexed by distance ('z_light') and
+# a table for walls and sprites indexed by projection scale ('scale_light'). The entries are
+# brightness factors, so the renderers sample them instead of computing any falloff per pixel.
+class LightTables:
+  def __init__(self):
+    self.z_light = self.get_z_light_table()  # Flat light factors [light band, distance entry]
+    self.z_light_rows = list(self.z_light)  # Row views of the flat table, one per light band
+    self.scale_light = self.get_scale_light_table()  # Wall light factors [light band, scale entry]
+    self.scale_light_rows = self.scale_light.tolist()  # Same table as lists, for per-column lookups
+
+  @staticmethod
+  def get_start_map(light_band):
+    # Colormap used by a light band at close range
+    return (LIGHT_LEVELS - 1 - light_band) * 2 * NUM_COLORMAPS // LIGHT_LEVELS
+
+  @staticmethod
+  def get_brightness(colormap):
+    # Brightness factor of a colormap, from 1.0 (colormap 0) down to almost black
+    colormap = min(NUM_COLORMAPS - 1, max(0, colormap))
+    return 1.0 - colormap / NUM_COLORMAPS
+
+  def get_z_light_table(self):
+    # Flats darken with the distance of the row being drawn
+    table = np.zeros((LIGHT_LEVELS, MAX_LIGHT_Z), dtype=np.float32)
+    for i in range(LIGHT_LEVELS):
+      start_map = self.get_start_map(i)
+      for j in range(MAX_LIGHT_Z):
+        scale = (DOOM_W // 2) // (j + 1)
+        table[i, j] = self.get_brightness(start_map - scale // DIST_MAP)
+    return table
+
+  def get_scale_light_table(self):
+    # Walls and sprites darken as their projection scale shrinks
+    table = np.zeros((LIGHT_LEVELS, MAX_LIGHT_SCALE), dtype=np.float32)
+    for i in range(LIGHT_LEVELS):
+      start_map = self.get_start_map(i)
+      for j in range(MAX_LIGHT_SCALE):
+        table[i, j] = self.get_brightness(start_map - j // DIST_MAP)
+    return table
+
+  @staticmethod
+  def get_light_band(light_level):
+    # Light band of a sector light level stored as a 0.0-1.0 float
+    return min(LIGHT_LEVELS - 1, int(light_level * 255 + 0.5) >> LIGHT_SEG_SHIFT)
+
+  def get_z_light(self, light_level):
+    # Flat light factors of a sector light level, indexed by distance entry
+    return self.z_light_rows[self.get_light_band(light_level)]
+
+  def get_scale_light(self, light_level):
+    # Wall light factors of a sector light level, indexed by scale entry
+    return self.scale_light_rows[self.get_light_band(light_level)]
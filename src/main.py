@@ -1,55 +1,344 @@
 # Import the necessary libraries and modules
+from startup_profiler import startup_profiler
 import pygame as pg
 import sys
-from wad_data import WADData
+import time
+import importlib
 from settings import *
 from map_renderer import MapRenderer
+from viewport import Viewport
 from player import Player
 from bsp import BSP
 from seg_handler import SegHandler
 from view_renderer import ViewRenderer
+from sprite_renderer import SpriteRenderer
+from light_tables import LightTables
+# The optional subsystems (level manager, automap, ray tracer, frame presenter, frame profiler and resolution
+# controller) are imported on first use, see DoomEngine.import_optional.
+startup_profiler.add('imports', time.perf_counter() - startup_profiler.start)
 
 # DoomEngine class. This is the main engine of the game.
 class DoomEngine:
-  def __init__(self, wad_path='./resources/wad/DOOM1.WAD'):
+  def __init__(self, wad_path='./resources/wad/DOOM1.WAD', map_name='E1M1', pipelined=PIPELINED_PRESENT,
+               preload=PRELOAD_NEXT_MAP):
     self.wad_path = wad_path  # Path to the WAD file.
+    self.map_name = map_name  # Name of the map to load.
+    self.preload = preload  # Read the next map on a background thread while a map is played.
     self.screen = pg.display.set_mode(WIN_RES, pg.SCALED)  # Pygame display surface.
     self.framebuffer = pg.surfarray.array3d(self.screen)  # Access pixel data directly.
+    self.view = Viewport(None, framebuffer=self.framebuffer)  # The player's view, rendered into the framebuffer.
     self.clock = pg.time.Clock()  # Pygame Clock object to track time.
     self.running = True  # Main game loop flag.
-    self.dt = 1 / 60  # Delta time for each frame.
+    self.dt = 1 / 60  # Time step of the next player update in ms.
+    self.frame_time = 0.0  # Duration of the previous frame in ms.
+    self.fixed_timestep = FIXED_TIMESTEP  # Simulate in fixed tics and interpolate the camera between them.
+    self.tic_ms = 1000 / TIC_RATE  # Duration of a tic in ms.
+    self.tic_time = 0.0  # Time in ms not yet simulated.
+    self.tics = 0  # Number of tics simulated.
+    self.fixed_dt = None  # Fixed time step in ms used instead of the frame time (demo recording and playback).
+    self.max_fps = 0  # Frame rate limit, 0 for unlimited.
+    self.frame_start = time.perf_counter()  # Time the current frame started updating.
+    self.viewports = []  # Views of other cameras rendered and presented every frame.
+    self.reuse_frames = REUSE_UNCHANGED_FRAMES  # Reuse the last frame when the view has not changed.
+    self.world_version = 0  # Incremented whenever the world drawn in the views changes (see invalidate_views).
+    self.frame_keys = {}  # View key of the frame each framebuffer holds, by framebuffer id.
+    self.last_framebuffer = None  # Framebuffer holding the last rendered frame of the player's view.
+    self.frame_reused = False  # The current frame reused the last one.
+    self.frames_reused = 0  # Number of frames that reused the last one.
+    self.map_subsystems = [BSP, SegHandler, SpriteRenderer]  # Subsystems building tables for a map (see prepare_map).
     self.on_init()  # Initialize the engine.
+    self.presenter = None  # Background frame presenter.
+    if pipelined:
+      self.presenter = self.import_optional('frame_presenter').FramePresenter(self)
+    self.profiler = None  # Per-stage frame profiler, created when it is first enabled (see get_profiler).
+    self.resolution_controller = None  # Column decimation controller holding the target frame rate.
+    if ADAPTIVE_RESOLUTION:
+      self.resolution_controller = self.import_optional('resolution_controller').ResolutionController(self)
+    if USE_AOT_KERNELS:
+      from jit_warmup import install_aot_kernels
+      install_aot_kernels(self)  # Use the ahead-of-time compiled kernels when they have been built.
+    self.jit_warmup_time = 0.0  # Time spent compiling the kernels before the first frame.
+    if JIT_WARMUP:
+      from jit_warmup import warm_up
+      with startup_profiler.phase('jit_compile'):
+        self.jit_warmup_time = warm_up(self)
+    if PROFILE:
+      self.get_profiler().enable()
+
+  # Method to import an optional module when its subsystem is first used. The import time is added to the
+  # 'imports' phase of the startup profile.
+  @staticmethod
+  def import_optional(module_name):
+    with startup_profiler.phase('imports'):
+      return importlib.import_module(module_name)
 
   # Method to initialize the game engine and all other components.
   def on_init(self):
-    self.wad_data = WADData(self, map_name='E1M1')  # Load the WAD data.
+    # Loader of the maps, sharing the assets between them.
+    self.level_manager = self.import_optional('level_manager').LevelManager(self)
+    self.wad_data = self.level_manager.load(self.map_name)  # Load the WAD data.
+    with startup_profiler.phase('subsystems'):
+      self.init_subsystems()
+
+  # Method to initialize the subsystems working on the loaded map.
+  def init_subsystems(self):
+    self.light_tables = LightTables()  # Build the light diminishing tables.
+    self.init_map_subsystems()
+    self.view_renderer = ViewRenderer(self)  # Initialize the view renderer.
+    self.sprite_renderer = SpriteRenderer(self)  # Initialize the map thing renderer.
+
+  # Method to initialize the subsystems holding the geometry of the map.
+  def init_map_subsystems(self):
     self.map_renderer = MapRenderer(self)  # Initialize the map renderer.
     self.player = Player(self)  # Initialize the player.
+    self.view.camera = self.player  # The player's view is seen through the player.
     self.bsp = BSP(self)  # Initialize the BSP tree.
     self.seg_handler = SegHandler(self)  # Initialize the segment handler.
-    self.view_renderer = ViewRenderer(self)  # Initialize the view renderer.
+    self._ray_tracer = None  # Line of sight and hitscan queries, built on the first query (see ray_tracer).
+    self.automap = None  # Automap, built when it is first opened (see get_automap).
+
+  # Method to build the data the map subsystems derive from a map ahead of a map change. The level manager
+  # calls it on its thread for a preloaded map; the subsystems built by change_map then only look it up.
+  # The optional subsystems are prepared once they have been used.
+  def prepare_map(self, wad_data):
+    for subsystem in list(self.map_subsystems):
+      subsystem.prepare(wad_data)
+
+  # Line of sight and hitscan queries against the current map.
+  @property
+  def ray_tracer(self):
+    if self._ray_tracer is None:
+      RayTracer = self.import_optional('ray_trace').RayTracer
+      self._ray_tracer = RayTracer(self)
+      if RayTracer not in self.map_subsystems:
+        self.map_subsystems.append(RayTracer)
+    return self._ray_tracer
+
+  # Method to get the automap of the current map, building it the first time.
+  def get_automap(self):
+    if self.automap is None:
+      Automap = self.import_optional('automap').Automap
+      self.automap = Automap(self)
+      if Automap not in self.map_subsystems:
+        self.map_subsystems.append(Automap)
+    return self.automap
+
+  # Method to check whether the automap is drawn in place of the player's view.
+  def is_automap_active(self):
+    return self.automap is not None and self.automap.active
+
+  # Method to get the frame profiler, creating it the first time.
+  def get_profiler(self):
+    if self.profiler is None:
+      self.profiler = self.import_optional('profiler').FrameProfiler(self)
+    return self.profiler
+
+  # Method to check whether the frame profiler is enabled.
+  def is_profiling(self):
+    return self.profiler is not None and self.profiler.enabled
+
+  # Method to switch to another map of the WAD. The assets, the renderers and the engine settings are
+  # kept; only the subsystems holding map geometry are rebuilt.
+  def change_map(self, map_name):
+    self.wad_data = self.level_manager.load(map_name)
+    self.map_name = map_name
+    input_source = self.player.input_source
+    automap = self.automap
+    self.init_map_subsystems()
+    self.player.input_source = input_source
+    if automap:
+      self.get_automap().active, self.automap.zoom = automap.active, automap.zoom
+    self.viewports.clear()  # Their cameras are placed in the previous map.
+    self.invalidate_views()
+    self.sprite_renderer.set_map()
+    if self.is_profiling():
+      self.profiler.enable()  # Move the instrumentation to the new subsystems.
+    if self.preload:
+      self.level_manager.preload_next(map_name)
 
   # Method to update the game state.
   def update(self):
-    self.player.update()  # Update player state.
-    self.seg_handler.update()  # Update segment handler state.
-    self.bsp.update()  # Update BSP state.
-    self.dt = self.clock.tick()  # Update the clock.
+    self.frame_start = time.perf_counter()  # Mark the start of the frame for latency tracking.
+    if self.is_profiling():
+      self.profiler.begin_frame()
+    if self.fixed_timestep:
+      self.run_tics()  # Simulate the tics that elapsed during the previous frame.
+      with self.player.interpolated_view(self.get_tic_fraction()):
+        self.render_frame()  # Render the view between the last two tics.
+    else:
+      self.player.update()  # Update player state.
+      self.render_frame()  # Render the view into the framebuffer.
+    self.frame_time = self.clock.tick(self.get_max_fps())  # Update the clock.
+    # Time step of the next player update.
+    self.dt = self.fixed_dt or (self.tic_ms if self.fixed_timestep else self.frame_time)
+    if self.resolution_controller and not self.frame_reused:
+      # Frame time without the frame rate cap. Reused frames do no render work and are left out, or an idle
+      # view would make the controller lower the column step.
+      self.resolution_controller.update(self.clock.get_rawtime())
     pg.display.set_caption("Josue's Doom Engine: " + f'{self.clock.get_fps() :.1f}')  # Update the display caption with the current FPS.
 
+  # Method to advance the simulation by whole tics. With a fixed time step set (demo recording and playback)
+  # every update is exactly one tic.
+  def run_tics(self):
+    if self.fixed_dt:
+      self.run_tic()
+      return None
+
+    self.tic_time += self.frame_time
+    tics = 0
+    while self.tic_time >= self.tic_ms:
+      if tics == MAX_TICS_PER_FRAME:
+        self.tic_time %= self.tic_ms  # Too far behind: drop the backlog instead of catching up.
+        break
+      self.run_tic()
+      self.tic_time -= self.tic_ms
+      tics += 1
+
+  # Method to simulate one tic.
+  def run_tic(self):
+    self.player.save_view()
+    self.player.update()
+    self.tics += 1
+
+  # Method to get how far the current time is between the last tic and the next one, from 0 to 1.
+  def get_tic_fraction(self):
+    if self.fixed_dt:
+      return 1.0  # Frames and tics coincide.
+    return self.tic_time / self.tic_ms
+
+  # Method to get the frame rate limit of the current frame. Idle frames are capped, except while recording
+  # or playing a demo, which run on their own clock.
+  def get_max_fps(self):
+    if self.frame_reused and IDLE_MAX_FPS and self.fixed_dt is None:
+      return min(self.max_fps, IDLE_MAX_FPS) if self.max_fps else IDLE_MAX_FPS
+    return self.max_fps
+
+  # Method to render the frame: the player's view, unless the automap is drawn in its place, and the extra
+  # viewports. Views that have not changed since they were last rendered are reused.
+  def render_frame(self):
+    self.frame_reused = False
+    if not self.is_automap_active():
+      self.render_player_view()
+    for viewport in self.viewports:
+      key = self.get_view_key(viewport.camera, viewport.column_step)
+      if key != viewport.view_key or not self.reuse_frames:
+        self.render_view(viewport)
+        viewport.update_surface()
+        viewport.view_key = key
+
+  # Method to render the player's view into the framebuffer, or reuse the last frame if the view is unchanged.
+  def render_player_view(self):
+    key = self.get_view_key(self.player, self.view.column_step)
+    framebuffer, last_framebuffer = self.framebuffer, self.last_framebuffer
+    if self.reuse_frames and last_framebuffer is not None and self.frame_keys.get(id(last_framebuffer)) == key:
+      if self.frame_keys.get(id(framebuffer)) != key:
+        framebuffer[:] = last_framebuffer  # Pipelined presentation: the last frame is in the other buffer.
+        self.frame_keys[id(framebuffer)] = key
+      self.frame_reused = True
+      self.frames_reused += 1
+      return None
+    self.render()
+    self.frame_keys[id(framebuffer)] = key
+    self.last_framebuffer = framebuffer
+
+  # Method to get the key of what a view shows: the camera pose, the column step and the version of the world.
+  def get_view_key(self, camera, column_step):
+    return camera.pos.x, camera.pos.y, camera.angle, camera.height, column_step, self.world_version
+
+  # Method to be called when something drawn in the views changes without the cameras moving, so the next
+  # frame of every view is rendered again.
+  def invalidate_views(self):
+    self.world_version += 1
+
+  # Method to render the player's view into the framebuffer.
+  def render(self):
+    self.render_view(self.view)
+
+  # Method to render a viewport into its framebuffer. The renderers and the level are shared by all views;
+  # the camera, the projection and the clipping state of the render are the viewport's own.
+  def render_view(self, viewport):
+    self.seg_handler.update(viewport)  # Reset the clipping state of the view.
+    self.sprite_renderer.update(viewport)  # Reset the things projected in the previous frame.
+    self.bsp.update(viewport)  # Traverse the BSP tree from the camera, drawing the walls and flats.
+    self.sprite_renderer.draw(viewport)  # Draw the things visible from the traversed sub sectors.
+    if viewport.column_step > 1:
+      self.view_renderer.expand_columns(viewport)  # Fill in the columns skipped by column decimation.
+
+  # Method to add a view presented in a rectangle of the screen every frame (split screen, security cameras).
+  # The view is rendered at the size of the rectangle.
+  def add_viewport(self, camera, rect, column_step=COLUMN_STEP):
+    viewport = Viewport(camera, rect, column_step)
+    self.viewports.append(viewport)
+    return viewport
+
   # Method to draw to the screen.
   def draw(self):
-    pg.surfarray.blit_array(self.screen, self.framebuffer)  # Copy pixel data to the display surface.
-    self.view_renderer.draw_sprite()  # Draw sprites.
-    pg.display.flip()  # Update the display.
+    if self.presenter:
+      # Present this frame in the background and render the next one into the other buffer.
+      frame_index = self.profiler.frame_index if self.profiler else None
+      self.set_framebuffer(self.presenter.submit(self.framebuffer, self.frame_start, frame_index))
+    else:
+      self.blit_framebuffer(self.framebuffer)  # Copy pixel data to the display surface.
+      self.draw_overlays()  # Draw sprites and overlays.
+      self.flip_display()  # Update the display.
+
+    if self.is_profiling():
+      self.profiler.end_frame()
+    if startup_profiler.first_frame_time is None:
+      self.on_first_frame()
+
+  # Method called once the first frame has been drawn.
+  def on_first_frame(self):
+    if self.presenter:
+      self.presenter.wait()  # The first frame is only on screen once the presenter is done with it.
+    startup_profiler.mark_first_frame()
+    if STARTUP_REPORT:
+      print(startup_profiler.format_report())
+    if self.preload:
+      self.level_manager.preload_next(self.map_name)  # Read the next map while this one is played.
+
+  # Method to copy a framebuffer to the display surface, or to another surface.
+  def blit_framebuffer(self, framebuffer, surface=None):
+    pg.surfarray.blit_array(self.screen if surface is None else surface, framebuffer)
+
+  # Method to draw the weapon sprite (or the automap in place of the view) and the overlays on top of the view.
+  def draw_overlays(self):
+    if self.is_automap_active():
+      self.automap.draw(self.screen)
+    else:
+      self.view_renderer.draw_sprite()
+    for viewport in self.viewports:
+      viewport.present(self.screen)
+    if self.is_profiling():
+      self.profiler.draw_overlay(self.screen)
+
+  # Method to update the display.
+  def flip_display(self):
+    pg.display.flip()
+
+  # Method to switch the framebuffer the player's view is drawn into.
+  def set_framebuffer(self, framebuffer):
+    self.framebuffer = framebuffer
+    self.view.framebuffer = framebuffer
 
   # Method to check and handle Pygame events.
   def check_events(self):
     for e in pg.event.get():
       if e.type == pg.QUIT:  # If the QUIT event is triggered, end the game.
         self.running = False
+        if self.presenter:
+          self.presenter.stop()  # Finish the frame in flight before shutting down.
+        self.level_manager.close()
         pg.quit()
         sys.exit()
+      elif e.type == pg.KEYDOWN and e.key == pg.K_F3:  # Toggle the frame profiler and its overlay.
+        self.get_profiler().toggle()
+      elif e.type == pg.KEYDOWN and e.key == pg.K_F4:  # Go to the next map.
+        self.change_map(self.level_manager.get_next_map(self.map_name))
+      elif e.type == pg.KEYDOWN and e.key == pg.K_TAB:  # Toggle the automap.
+        self.get_automap().toggle()
+      elif self.is_automap_active():  # Zoom and pan the automap.
+        self.automap.handle_event(e)
 
   # Main game loop.
   def run(self):
@@ -1,4 +1,5 @@
 import random
+import numpy as np
 import pygame as pg
 import pygame.gfxdraw as gfx
 from settings import *
@@ -9,13 +10,19 @@ class MapRenderer:
     self.engine = engine  # Reference to the main engine
     self.screen = engine.screen  # Screen object from the engine
     self.wad_data = engine.wad_data  # WAD data from the engine
-    self.vertexes = self.wad_data.vertexes  # Vertex data from the WAD file
     self.linedefs = self.wad_data.linedefs  # Linedef data from the WAD file
     # Get map bounds for use in remapping
     self.x_min, self.x_max, self.y_min, self.y_max = self.get_map_bounds()
-    # Remap vertex positions to fit the screen
-    self.vertexes = [pg.math.Vector2(self.remap_x(v.x), self.remap_y(v.y))
-                     for v in self.vertexes]
+    self.screen_vertexes = None  # Vertex positions remapped to the screen, computed on first use
+
+  # Vertex positions remapped to fit the screen, an array of (x, y) rows. Only the debug drawing uses
+  # them, so the remapping is deferred until they are first drawn
+  @property
+  def vertexes(self):
+    if self.screen_vertexes is None:
+      vertexes = self.wad_data.geometry.vertexes
+      self.screen_vertexes = np.column_stack((self.remap_x(vertexes['x']), self.remap_y(vertexes['y'])))
+    return self.screen_vertexes
 
   # Placeholder draw method, draws nothing at the moment
   def draw(self):
@@ -108,26 +115,22 @@ class MapRenderer:
   def remap_x(self, n, out_min=30, out_max=WIDTH-30):
     # This method remaps the given x-coordinate (n) from the game map range to the screen range.
     # It also makes sure the x-coordinate stays within the screen bounds by clamping the input between the min and max x-coordinates of the map.
-    return (max(self.x_min, min(n, self.x_max)) - self.x_min) * (
+    # The coordinate can be a number or an array of them.
+    return (np.clip(n, self.x_min, self.x_max) - self.x_min) * (
       out_max - out_min) / (self.x_max - self.x_min) + out_min
 
   def remap_y(self, n, out_min=30, out_max=HEIGHT-30):
     # This method does the same thing as remap_x, but for y-coordinates.
     # Note the subtraction from HEIGHT at the beginning. This is because pygame's y-coordinates start at the top of the screen, not the bottom.
-    return HEIGHT - (max(self.y_min, min(n, self.y_max)) - self.y_min) * (
+    return HEIGHT - (np.clip(n, self.y_min, self.y_max) - self.y_min) * (
       out_max - out_min) / (self.y_max - self.y_min) - out_min
 
   def get_map_bounds(self):
-    # This method returns the bounding box of the game map by finding the smallest and largest x and y coordinates from the list of vertexes.
-    # The coordinates are sorted first to find the min and max values.
-    x_sorted = sorted(self.vertexes, key=lambda v: v.x)
-    x_min, x_max = x_sorted[0].x, x_sorted[-1].x
-    y_sorted = sorted(self.vertexes, key=lambda v: v.y)
-    y_min, y_max = y_sorted[0].y, y_sorted[-1].y
-    return x_min, x_max, y_min, y_max
+    # This method returns the bounding box of the game map, the smallest and largest x and y coordinates of its vertexes.
+    return self.wad_data.get_map_bounds()
 
   def draw_vertexes(self):
     # This method draws all the vertexes of the game map on the screen.
     # Each vertex is represented by a white circle.
-    for v in self.vertexes:
-      pg.draw.circle(self.engine.screen, 'white', (v.x, v.y), 4)
+    for x, y in self.vertexes:
+      pg.draw.circle(self.engine.screen, 'white', (x, y), 4)
@@ -1,20 +1,31 @@
 from settings import *
+from contextlib import contextmanager
 from pygame.math import Vector2 as vec2
 import pygame as pg
 
 class Player:
+  # Bits of the per-tic input state, as returned by get_input and stored in demos
+  BUTTON_TURN_LEFT = 1
+  BUTTON_TURN_RIGHT = 2
+  BUTTON_FORWARD = 4
+  BUTTON_BACKWARD = 8
+  BUTTON_STRAFE_LEFT = 16
+  BUTTON_STRAFE_RIGHT = 32
+
   def __init__(self, engine):
     # The Player class is initialized with an engine, which holds data related to the game's state.
     # The player's position and orientation (angle) are initialized from a "thing" in the game data.
 
     self.engine = engine
     self.thing = engine.wad_data.things[0]
-    self.pos = self.thing.pos
-    self.angle = self.thing.angle
-    self.height = PLAYER_HEIGHT
+    self.pos = vec2(self.thing.pos)
+    self.angle = float(self.thing.angle)
+    self.height = float(PLAYER_HEIGHT)
     self.floor_height = 0
     self.z_velocity = 0
     self.DIAGONAL_MOVE_CORRECTION = 1 / math.sqrt(2)
+    self.input_source = None  # Object providing get_buttons() instead of the keyboard (e.g. a demo)
+    self.save_view()  # View at the start of the current tic, the start point of the render interpolation
 
   def update(self):
     # This function updates the player's height and controls on each frame.
@@ -22,6 +33,39 @@ class Player:
     self.get_height()
     self.control()
 
+  def set_view(self, x, y, angle, height=None):
+    # This function places the player at a given position and view angle, as used by scripted cameras.
+    # Without an explicit eye height the player stands on the floor of the sub sector at that position.
+
+    self.pos = vec2(x, y)
+    self.angle = float(angle)
+    self.z_velocity = 0
+    if height is None:
+      height = self.engine.bsp.get_sub_sector_height() + PLAYER_HEIGHT
+    self.height = float(height)
+    self.save_view()
+
+  def save_view(self):
+    # This function stores the current view as the start of the next tic's render interpolation.
+
+    self.prev_pos = vec2(self.pos)
+    self.prev_angle = self.angle
+    self.prev_height = self.height
+
+  @contextmanager
+  def interpolated_view(self, alpha):
+    # This function places the player between its views at the start (alpha 0) and the end (alpha 1)
+    # of the last tic while the frame is rendered, then restores the simulated state.
+
+    state = self.pos, self.angle, self.height
+    self.pos = self.prev_pos.lerp(self.pos, alpha)
+    self.angle = self.prev_angle + (self.angle - self.prev_angle) * alpha
+    self.height = self.prev_height + (self.height - self.prev_height) * alpha
+    try:
+      yield
+    finally:
+      self.pos, self.angle, self.height = state
+
   def get_height(self):
     # This function updates the player's height.
     # The player's height changes depending on their movement and any changes to the floor height.
@@ -36,29 +80,57 @@ class Player:
       self.height += max(-15.0, self.z_velocity)
 
   def control(self):
-    # This function handles player's control inputs (keyboard events).
-    # The speed of the player is scaled by the time passed since the last frame to ensure smooth movement.
-    # Rotation is handled by the left and right arrow keys, and movement is handled by the WASD keys.
-    # If the player is moving diagonally, the movement vector is corrected to ensure the player doesn't move faster diagonally.
+    # This function handles player's control inputs, read from the keyboard or from the input source.
 
-    speed = PLAYER_SPEED * self.engine.dt
-    rot_speed = PLAYER_ROT_SPEED * self.engine.dt
+    if self.input_source:
+      buttons = self.input_source.get_buttons()
+    else:
+      buttons = self.get_input()
+    self.apply_input(buttons, self.engine.dt)
+
+  @classmethod
+  def get_input(cls):
+    # This function reads the keyboard into a bitmask of buttons.
+    # Rotation is handled by the left and right arrow keys, and movement is handled by the WASD keys.
 
     keys = pg.key.get_pressed()
 
+    buttons = 0
     if keys[pg.K_LEFT]:
-      self.angle += rot_speed
+      buttons |= cls.BUTTON_TURN_LEFT
     if keys[pg.K_RIGHT]:
+      buttons |= cls.BUTTON_TURN_RIGHT
+    if keys[pg.K_a]:
+      buttons |= cls.BUTTON_STRAFE_LEFT
+    if keys[pg.K_d]:
+      buttons |= cls.BUTTON_STRAFE_RIGHT
+    if keys[pg.K_w]:
+      buttons |= cls.BUTTON_FORWARD
+    if keys[pg.K_s]:
+      buttons |= cls.BUTTON_BACKWARD
+    return buttons
+
+  def apply_input(self, buttons, dt):
+    # This function turns and moves the player according to a bitmask of buttons.
+    # The speed of the player is scaled by the time step to ensure smooth movement.
+    # If the player is moving diagonally, the movement vector is corrected to ensure the player doesn't move faster diagonally.
+
+    speed = PLAYER_SPEED * dt
+    rot_speed = PLAYER_ROT_SPEED * dt
+
+    if buttons & self.BUTTON_TURN_LEFT:
+      self.angle += rot_speed
+    if buttons & self.BUTTON_TURN_RIGHT:
       self.angle -= rot_speed
 
     inc = vec2(0)
-    if keys[pg.K_a]:
+    if buttons & self.BUTTON_STRAFE_LEFT:
       inc += vec2(0, speed)
-    if keys[pg.K_d]:
+    if buttons & self.BUTTON_STRAFE_RIGHT:
       inc += vec2(0, -speed)
-    if keys[pg.K_w]:
+    if buttons & self.BUTTON_FORWARD:
       inc += vec2(speed, 0)
-    if keys[pg.K_s]:
+    if buttons & self.BUTTON_BACKWARD:
       inc += vec2(-speed, 0)
 
     if inc.x and inc.y:
@@ -0,0 +1,275 @@
+import json
+import time
+import inspect
+import threading
+from collections import deque
+import pygame as pg
+from settings import *
+
+# FrameProfiler class, times each stage of a frame and counts the work done on the hot paths.
+# Instrumentation is installed by wrapping the profiled methods on the engine's subsystem instances
+# when the profiler is enabled and removed again when it is disabled, so a disabled profiler adds
+# no cost to the hot paths. Nested stages report exclusive time (e.g. 'bsp' excludes the walls
+# drawn during the traversal). With pipelined presentation a frame is blitted and flipped while a
+# later frame is rendered; that work is reported in a separate present lane tagged with the index of
+# the frame presented.
+class FrameProfiler:
+  STAGES = ('player', 'bsp', 'classify', 'walls', 'flats', 'sky', 'sprites', 'blit', 'flip')
+  PRESENT_STAGES = ('encode', 'blit', 'flip')
+  COUNTERS = ('nodes_visited', 'bboxes_rejected', 'segs_classified', 'columns_drawn', 'pixels_written')
+
+  # Stages emitted as individual Chrome trace events. The other stages run once per column or seg
+  # and are only reported as per-frame totals
+  TRACED_STAGES = ('player', 'bsp', 'sprites', 'blit', 'flip', 'encode')
+
+  def __init__(self, engine):
+    self.engine = engine  # Reference to the main engine
+    self.enabled = False
+    self.wrapped = []  # (object, attribute name) of the installed wrappers
+    self.local = threading.local()  # Per-thread stack of nested stage timers
+
+    self.frame_index = 0
+    self.frame_start = 0.0
+    self.stage_times = dict.fromkeys(self.STAGES, 0.0)  # Seconds spent per stage in the current frame
+    self.counters = dict.fromkeys(self.COUNTERS, 0)  # Counters of the current frame
+    self.frames = deque(maxlen=PROFILER_HISTORY)  # Reports of the recent frames
+    self.present_stage_times = {}  # Frame index -> seconds spent per stage presenting the frame so far
+    self.presents = deque(maxlen=PROFILER_HISTORY)  # Present lane reports of the recent frames
+    self.trace_events = deque(maxlen=PROFILER_HISTORY * (len(self.TRACED_STAGES) + 2))
+    self.font = None
+
+  def enable(self):
+    # Install the instrumentation on the current subsystems
+    if self.enabled:
+      self.disable()
+    self.enabled = True
+    self.instrument()
+
+  def disable(self):
+    # Remove the instance level wrappers, restoring the class methods
+    for obj, name in self.wrapped:
+      delattr(obj, name)
+    self.wrapped = []
+    self.present_stage_times.clear()
+    self.enabled = False
+
+  def toggle(self):
+    self.disable() if self.enabled else self.enable()
+
+  def instrument(self):
+    engine = self.engine
+    bsp = engine.bsp
+    seg_handler = engine.seg_handler
+    view_renderer = engine.view_renderer
+
+    self.wrap(engine.player, 'update', self.timed, 'player')
+    self.wrap(bsp, 'update', self.timed, 'bsp')
+    self.wrap(bsp, 'render_bsp_node', self.counted, 'nodes_visited')
+    self.wrap(bsp, 'check_bbox', self.counted_rejections, 'bboxes_rejected')
+    self.wrap(seg_handler, 'classify_segment', self.timed_and_counted, 'classify', 'segs_classified')
+    self.wrap(seg_handler, 'draw_solid_wall_range', self.timed, 'walls')
+    self.wrap(seg_handler, 'draw_portal_wall_range', self.timed, 'walls')
+    self.wrap(view_renderer, 'draw_wall_col', self.timed_columns, 'walls', type(view_renderer).draw_wall_col)
+    self.wrap(view_renderer, 'draw_flat', self.timed_flat_columns, view_renderer.sky_id)
+    self.wrap(engine.sprite_renderer, 'draw', self.timed, 'sprites')
+    self.wrap(engine.sprite_renderer, 'draw_sprite_cols', self.counted_pixels, 'pixels_written')
+    self.wrap(engine, 'blit_framebuffer', self.timed, 'blit')
+    self.wrap(engine, 'flip_display', self.timed, 'flip')
+    if engine.presenter:
+      self.wrap(engine.presenter, 'encode', self.timed, 'encode')
+
+  def wrap(self, obj, name, factory, *args):
+    # Replace obj.name by a wrapper around the current attribute
+    setattr(obj, name, factory(getattr(obj, name), *args))
+    self.wrapped.append((obj, name))
+
+  def get_stack(self):
+    if not hasattr(self.local, 'stack'):
+      self.local.stack = []
+    return self.local.stack
+
+  def push(self):
+    # Start a nested timer; returns the start time
+    self.get_stack().append(0.0)
+    return time.perf_counter()
+
+  def pop(self, stage, start):
+    # Stop the innermost timer and add its exclusive time to the stage
+    elapsed = time.perf_counter() - start
+    stack = self.get_stack()
+    # Stages timed while presenting go to the present lane of the frame being presented
+    stage_times = getattr(self.local, 'present_stage_times', None) or self.stage_times
+    stage_times[stage] += elapsed - stack.pop()
+    if stack:
+      stack[-1] += elapsed
+    if stage in self.TRACED_STAGES:
+      self.add_trace_event(stage, start, elapsed, getattr(self.local, 'present_frame', None))
+
+  def timed(self, func, stage):
+    def wrapper(*args, **kwargs):
+      start = self.push()
+      try:
+        return func(*args, **kwargs)
+      finally:
+        self.pop(stage, start)
+    return wrapper
+
+  def counted(self, func, counter):
+    counters = self.counters
+
+    def wrapper(*args, **kwargs):
+      counters[counter] += 1
+      return func(*args, **kwargs)
+    return wrapper
+
+  def counted_rejections(self, func, counter):
+    counters = self.counters
+
+    def wrapper(*args, **kwargs):
+      if not (result := func(*args, **kwargs)):
+        counters[counter] += 1
+      return result
+    return wrapper
+
+  def counted_pixels(self, func, counter):
+    # The wrapped kernel returns the number of pixels it wrote
+    counters = self.counters
+
+    def wrapper(*args):
+      pixels = func(*args)
+      counters[counter] += pixels
+      return pixels
+    return wrapper
+
+  def timed_and_counted(self, func, stage, counter):
+    return self.counted(self.timed(func, stage), counter)
+
+  def count_pixels(self, y1, y2):
+    if y1 < y2:
+      self.counters['columns_drawn'] += 1
+      self.counters['pixels_written'] += y2 - y1 + 1
+
+  @staticmethod
+  def get_arg_index(func, name):
+    # Position of a named parameter, looking through Numba dispatchers to the Python function
+    return list(inspect.signature(getattr(func, 'py_func', func)).parameters).index(name)
+
+  def timed_columns(self, func, stage, kernel):
+    # 'kernel' is the JIT kernel the wrapped function stands for, whose signature locates y1 and y2
+    i_y1, i_y2 = self.get_arg_index(kernel, 'y1'), self.get_arg_index(kernel, 'y2')
+
+    def wrapper(*args):
+      self.count_pixels(args[i_y1], args[i_y2])
+      start = self.push()
+      try:
+        return func(*args)
+      finally:
+        self.pop(stage, start)
+    return wrapper
+
+  def timed_flat_columns(self, func, sky_id):
+    # Flat columns are reported as 'sky' or 'flats' depending on their texture
+    i_tex, i_y1, i_y2 = (self.get_arg_index(func, name) for name in ('tex_id', 'y1', 'y2'))
+
+    def wrapper(*args):
+      self.count_pixels(args[i_y1], args[i_y2])
+      start = self.push()
+      try:
+        return func(*args)
+      finally:
+        self.pop('sky' if args[i_tex] == sky_id else 'flats', start)
+    return wrapper
+
+  def add_trace_event(self, name, start, elapsed, present_frame=None):
+    # Present lane events are put in their own track and carry the index of the frame presented
+    event = {
+      'name': name, 'ph': 'X', 'pid': 0, 'tid': threading.get_ident(),
+      'ts': start * 1e6, 'dur': elapsed * 1e6,
+    }
+    if present_frame is not None:
+      event['tid'] = 'present'
+      event['args'] = {'frame': present_frame}
+    self.trace_events.append(event)
+
+  def begin_present(self, frame_index):
+    # Time the following stages on this thread in the present lane of a frame
+    self.local.present_frame = frame_index
+    self.local.present_stage_times = self.present_stage_times.setdefault(
+      frame_index, dict.fromkeys(self.PRESENT_STAGES, 0.0))
+
+  def end_present(self, shown):
+    # Stop timing in the present lane; once the frame is shown its present report is recorded
+    frame_index = getattr(self.local, 'present_frame', None)
+    self.local.present_frame = self.local.present_stage_times = None
+    if shown and (stage_times := self.present_stage_times.pop(frame_index, None)) is not None:
+      self.presents.append({
+        'frame': frame_index,
+        'present_ms': sum(stage_times.values()) * 1000,
+        'stages_ms': {stage: t * 1000 for stage, t in stage_times.items()},
+      })
+
+  def begin_frame(self):
+    self.frame_start = time.perf_counter()
+    for stage in self.stage_times:
+      self.stage_times[stage] = 0.0
+    for counter in self.counters:
+      self.counters[counter] = 0
+
+  def end_frame(self):
+    # Record the report of the finished frame
+    elapsed = time.perf_counter() - self.frame_start
+    report = {
+      'frame': self.frame_index,
+      'frame_ms': elapsed * 1000,
+      'stages_ms': {stage: t * 1000 for stage, t in self.stage_times.items()},
+      'counters': dict(self.counters),
+      # Pixels written per screen pixel. Pixels drawn over (sprites over walls) count again, but so do the
+      # pixels of other views, and pixels left unwritten lower it, so this is not a count of overdraw
+      'fill_ratio': self.counters['pixels_written'] / (WIDTH * HEIGHT),
+    }
+    self.frames.append(report)
+    self.add_trace_event('frame', self.frame_start, elapsed)
+    self.trace_events.append({
+      'name': 'counters', 'ph': 'C', 'pid': 0, 'ts': self.frame_start * 1e6, 'args': report['counters'],
+    })
+    self.frame_index += 1
+
+  def draw_overlay(self, screen):
+    # Draw the last frame's report in the top left corner of the screen
+    if not self.frames:
+      return None
+    if self.font is None:
+      pg.font.init()
+      self.font = pg.font.Font(None, PROFILER_FONT_SIZE)
+
+    report = self.frames[-1]
+    lines = [f"frame {report['frame_ms']:6.2f} ms  fill ratio {report['fill_ratio']:.2f}"]
+    lines += [f'{stage:<9}{t:7.2f} ms' for stage, t in report['stages_ms'].items()]
+    if self.presents:
+      present = self.presents[-1]
+      lines += [f"present {present['present_ms']:6.2f} ms  (frame {present['frame']})"]
+    if self.engine.presenter:
+      stats = self.engine.presenter.get_stats()
+      lines += [f"latency {stats['latency_ms']:6.2f} ms  max {stats['latency_max_ms']:6.2f} ms",
+                f"present wait {stats['wait_ms']:6.2f} ms  thread {stats['present_ms']:6.2f} ms"]
+    lines += [f'{counter:<16}{n:>9}' for counter, n in report['counters'].items()]
+
+    y = 5
+    for line in lines:
+      image = self.font.render(line, True, 'white', 'black')
+      screen.blit(image, (5, y))
+      y += image.get_height()
+
+  def export_chrome_trace(self, path):
+    # Write the recorded events in Chrome trace format (chrome://tracing, Perfetto)
+    with open(path, 'w') as f:
+      json.dump({'traceEvents': list(self.trace_events), 'displayTimeUnit': 'ms'}, f)
+
+  def export_json_lines(self, path):
+    # Write one JSON report per recorded frame, with its present lane report when it was pipelined
+    presents = {present['frame']: present for present in self.presents}
+    with open(path, 'w') as f:
+      for report in self.frames:
+        if report['frame'] in presents:
+          report = dict(report, present=presents[report['frame']])
+        f.write(json.dumps(report) + '\n')
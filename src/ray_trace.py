@@ -0,0 +1,192 @@
+import numpy as np
+from numba import njit
+from settings import *
+from seg_handler import SegHandler
+
+SUB_SECTOR_IDENTIFIER = 0x8000  # Child ids at or above this are sub sectors
+
+# Kinds of hit: a one-sided wall, the lower or upper wall of a two-sided line, a floor or a ceiling
+HIT_NONE, HIT_WALL, HIT_LOWER, HIT_UPPER, HIT_FLOOR, HIT_CEILING = range(6)
+HIT_KINDS = ('none', 'wall', 'lower', 'upper', 'floor', 'ceiling')
+
+@njit(nogil=True, cache=True)
+def get_flat_hit(z1, dz, z, floor_height, ceil_height):
+  # Hit on the floor or the ceiling of the sector the ray is in when it is at height z, as (fraction, kind)
+  if z < floor_height:
+    return max((floor_height - z1) / dz, 0.0) if dz < 0 else 0.0, HIT_FLOOR
+  if z > ceil_height:
+    return max((ceil_height - z1) / dz, 0.0) if dz > 0 else 0.0, HIT_CEILING
+  return 1.0, HIT_NONE
+
+@njit(nogil=True, cache=True)
+def trace_ray(nodes, children, sub_sectors, seg_lines, seg_sectors, sector_heights, root_node_id, stack,
+              x1, y1, z1, x2, y2, z2):
+  # Trace the segment from (x1, y1, z1) to (x2, y2, z2) and return its first hit as (fraction of the
+  # segment, kind, seg id, sector id the ray was in), or (1, HIT_NONE, -1, sector id at the end).
+  # The BSP tree is walked front to back along the segment with an explicit stack: a node whose partition
+  # line the segment does not cross only has the child on its side visited, so the sub sectors visited are
+  # the ones the segment passes through, in order, and the first hit ends the walk.
+  dx, dy, dz = x2 - x1, y2 - y1, z2 - z1
+  sector_id = -1
+  top = 0
+  stack[0] = root_node_id
+
+  while top >= 0:
+    node_id = stack[top]
+    top -= 1
+
+    if node_id < SUB_SECTOR_IDENTIFIER:
+      px, py = nodes[node_id, 0], nodes[node_id, 1]
+      pdx, pdy = nodes[node_id, 2], nodes[node_id, 3]
+      start_on_back = (x1 - px) * pdy - (y1 - py) * pdx <= 0
+      end_on_back = (x2 - px) * pdy - (y2 - py) * pdx <= 0
+      near, far = (children[node_id, 1], children[node_id, 0]) if start_on_back else \
+        (children[node_id, 0], children[node_id, 1])
+      if start_on_back != end_on_back:
+        top += 1
+        stack[top] = far  # Visited once the near side is done
+      top += 1
+      stack[top] = near
+      continue
+
+    sub_sector_id = node_id - SUB_SECTOR_IDENTIFIER
+    first_seg_id, seg_count = sub_sectors[sub_sector_id, 0], sub_sectors[sub_sector_id, 1]
+    sector_id = seg_sectors[first_seg_id, 0]
+
+    # The ray leaves the sub sector through the nearest seg it crosses from the front side (the right
+    # of the seg); the segs of the neighbouring sub sectors it enters through are crossed from the back
+    exit_t, exit_seg_id = 2.0, -1
+    for seg_id in range(first_seg_id, first_seg_id + seg_count):
+      sx, sy = seg_lines[seg_id, 0], seg_lines[seg_id, 1]
+      sdx, sdy = seg_lines[seg_id, 2] - sx, seg_lines[seg_id, 3] - sy
+      cross = sdx * dy - sdy * dx
+      if cross <= 0:
+        continue
+      qx, qy = sx - x1, sy - y1
+      t = (qy * sdx - qx * sdy) / cross
+      u = (qy * dx - qx * dy) / cross
+      if 0.0 <= t <= 1.0 and 0.0 <= u <= 1.0 and t < exit_t:
+        exit_t, exit_seg_id = t, seg_id
+    if exit_seg_id < 0:
+      continue
+
+    # Between two crossings the height of the ray changes linearly, so it can only have left the sector
+    # through its floor or ceiling if it is outside them where it crosses the seg
+    z = z1 + dz * exit_t
+    t, kind = get_flat_hit(z1, dz, z, sector_heights[sector_id, 0], sector_heights[sector_id, 1])
+    if kind != HIT_NONE:
+      return t, kind, -1, sector_id
+    back_sector_id = seg_sectors[exit_seg_id, 1]
+    if back_sector_id < 0:
+      return exit_t, HIT_WALL, exit_seg_id, sector_id
+    if z < sector_heights[back_sector_id, 0]:
+      return exit_t, HIT_LOWER, exit_seg_id, sector_id
+    if z > sector_heights[back_sector_id, 1]:
+      return exit_t, HIT_UPPER, exit_seg_id, sector_id
+
+  # No wall in the way; the ray can still end below the floor or above the ceiling of the last sector
+  if sector_id >= 0:
+    t, kind = get_flat_hit(z1, dz, z2, sector_heights[sector_id, 0], sector_heights[sector_id, 1])
+    if kind != HIT_NONE:
+      return t, kind, -1, sector_id
+  return 1.0, HIT_NONE, -1, sector_id
+
+@njit(nogil=True, cache=True)
+def trace_rays(nodes, children, sub_sectors, seg_lines, seg_sectors, sector_heights, root_node_id,
+               starts, ends, fractions, kinds, seg_ids, sector_ids):
+  # Trace every ray from starts[i] to ends[i], arrays of shape (n, 3), into the output arrays
+  stack = np.empty(len(nodes) + 1, np.int64)
+  for i in range(len(starts)):
+    fractions[i], kinds[i], seg_ids[i], sector_ids[i] = trace_ray(
+      nodes, children, sub_sectors, seg_lines, seg_sectors, sector_heights, root_node_id, stack,
+      starts[i, 0], starts[i, 1], starts[i, 2], ends[i, 0], ends[i, 1], ends[i, 2]
+    )
+
+# RayHit class, the first hit of a traced ray
+class RayHit:
+  __slots__ = ['fraction', 'x', 'y', 'z', 'kind', 'seg_id', 'sector_id']
+
+  def __init__(self, fraction, x, y, z, kind, seg_id, sector_id):
+    self.fraction = fraction  # Fraction of the ray travelled before the hit
+    self.x, self.y, self.z = x, y, z  # Position of the hit
+    self.kind = kind  # One of HIT_WALL, HIT_LOWER, HIT_UPPER, HIT_FLOOR, HIT_CEILING
+    self.seg_id = seg_id  # Seg hit, -1 for floors and ceilings
+    self.sector_id = sector_id  # Sector the ray was in when it hit
+
+  def __repr__(self):
+    return (f'RayHit({HIT_KINDS[self.kind]} at ({self.x:.1f}, {self.y:.1f}, {self.z:.1f}), '
+            f'fraction={self.fraction:.3f}, seg_id={self.seg_id}, sector_id={self.sector_id})')
+
+# RayTracer class, line of sight and hitscan queries against the walls, floors and ceilings of a map.
+# A ray is a segment between two points (x, y, z); it is stopped by one-sided walls, by the lower and
+# upper walls of two-sided lines it passes below or above the opening of, and by floors and ceilings.
+# Middle textures and things do not block rays. The BSP tree, segs and sector heights are copied into
+# arrays once per map for the compiled kernels, which release the GIL.
+class RayTracer:
+  def __init__(self, engine):
+    self.engine = engine  # Reference to the main engine
+    self.tables = self.prepare(engine.wad_data)
+
+  # The arrays of a map the kernels trace rays against
+  @staticmethod
+  def prepare(wad_data):
+    return wad_data.get_prepared('ray_tables', RayTracer.build_tables)
+
+  @staticmethod
+  def build_tables(wad_data):
+    geometry = wad_data.geometry
+    nodes, sub_sectors = geometry.nodes, geometry.sub_sectors
+    segs, sectors = SegHandler.prepare(wad_data)[:2]
+
+    return (
+      # Partition lines (x, y, dx, dy) and the (front, back) child ids of the nodes
+      np.column_stack([nodes[field] for field in ('x_partition', 'y_partition', 'dx_partition', 'dy_partition')])
+        .astype(np.float64),
+      np.column_stack((nodes['front_child_id'], nodes['back_child_id'])).astype(np.int64),
+      # First seg id and seg count of the sub sectors
+      np.column_stack((sub_sectors['first_seg_id'], sub_sectors['seg_count'])).astype(np.int64),
+      # Start and end of the segs, their front and back sector ids, and the floor and ceiling heights of the sectors
+      np.column_stack((segs.start_x, segs.start_y, segs.end_x, segs.end_y)).astype(np.float64),
+      np.column_stack((segs.front_sector, segs.back_sector)).astype(np.int64),
+      np.column_stack((sectors.floor_height, sectors.ceil_height)).astype(np.float64),
+      len(nodes) - 1,  # Root node id
+    )
+
+  # Trace a ray from start to end, both (x, y, z). Returns the first RayHit, or None if nothing is in the way
+  def trace(self, start, end):
+    (x1, y1, z1), (x2, y2, z2) = start, end
+    stack = np.empty(len(self.tables[0]) + 1, np.int64)
+    fraction, kind, seg_id, sector_id = trace_ray(*self.tables, stack, x1, y1, z1, x2, y2, z2)
+    if kind == HIT_NONE:
+      return None
+    return RayHit(fraction, x1 + (x2 - x1) * fraction, y1 + (y2 - y1) * fraction, z1 + (z2 - z1) * fraction,
+                  kind, seg_id, sector_id)
+
+  # Check whether a point can be seen from another
+  def check_sight(self, start, end):
+    return self.trace(start, end) is None
+
+  # Trace a hitscan attack from a position and height along an angle in degrees. The slope is the height
+  # change per map unit of distance
+  def hitscan(self, pos, height, angle, slope=0.0, distance=HITSCAN_RANGE):
+    x, y = pos
+    angle = math.radians(angle)
+    end = x + distance * math.cos(angle), y + distance * math.sin(angle), height + slope * distance
+    return self.trace((x, y, height), end)
+
+  # Trace many rays in one call. starts and ends are arrays of shape (n, 3); returns the arrays of the hit
+  # fractions, kinds, seg ids and sector ids. The hit points are starts + fractions[:, None] * (ends - starts)
+  def trace_batch(self, starts, ends):
+    starts = np.ascontiguousarray(starts, dtype=np.float64)
+    ends = np.ascontiguousarray(ends, dtype=np.float64)
+    count = len(starts)
+    fractions = np.empty(count, np.float64)
+    kinds = np.empty(count, np.int8)
+    seg_ids = np.empty(count, np.int32)
+    sector_ids = np.empty(count, np.int32)
+    trace_rays(*self.tables, starts, ends, fractions, kinds, seg_ids, sector_ids)
+    return fractions, kinds, seg_ids, sector_ids
+
+  # Check the line of sight between many pairs of points; returns a boolean array
+  def check_sight_batch(self, starts, ends):
+    return self.trace_batch(starts, ends)[1] == HIT_NONE
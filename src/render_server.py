@@ -0,0 +1,431 @@
+import os
+import sys
+import json
+import math
+import time
+import zlib
+import signal
+import socket
+import struct
+import argparse
+import threading
+import multiprocessing
+
+# The workers render without a window: SDL's dummy video driver must be selected before pygame initializes the display
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+# SDL turns SIGTERM into a quit event by default, which would keep the pool from terminating its workers
+os.environ.setdefault('SDL_NO_SIGNAL_HANDLERS', '1')
+
+import numpy as np
+from settings import *
+
+# Render server protocol. A client opens a connection with a hello (encoding of the frames and column
+# step, 0 for the server's) and the server answers with a welcome (frame size, worker processes and the
+# player start of the map). The client then sends camera updates and the server sends back frames, each
+# tagged with the sequence number of the camera it was rendered from. Frames are the framebuffer bytes,
+# shape (width, height, 3), raw or zlib compressed. A camera height of NaN stands at eye height on the floor.
+SERVER_MAGIC = b'DRSV'
+PROTOCOL_VERSION = 1
+HELLO = struct.Struct('<4sBBB')  # Magic, version, encoding, column step
+WELCOME = struct.Struct('<4sBHHHfff')  # Magic, version, width, height, workers, start x, start y, start angle
+CAMERA = struct.Struct('<Iffff')  # Sequence number, x, y, angle, height
+FRAME = struct.Struct('<IBIff')  # Camera sequence number, encoding, payload size, render ms, encode ms
+ENCODINGS = {'raw': 0, 'zlib': 1}
+
+def open_socket(address, listen=False):
+  # A host:port address is a TCP socket, anything else the path of a Unix socket
+  if ':' in address:
+    host, port = address.rsplit(':', 1)
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)  # Camera updates are small and latency bound
+    target = host, int(port)
+  else:
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    target = address
+  if listen:
+    if sock.family == socket.AF_UNIX and os.path.exists(address):
+      os.remove(address)  # Left over by a server that was killed
+    else:
+      sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind(target)
+    sock.listen()
+  else:
+    sock.connect(target)
+  return sock
+
+def recv_exact(sock, size):
+  # Read exactly size bytes; None if the connection was closed before the first byte
+  buffer = bytearray(size)
+  view = memoryview(buffer)
+  received = 0
+  while received < size:
+    count = sock.recv_into(view[received:])
+    if count == 0:
+      if received == 0:
+        return None
+      raise ConnectionError('connection closed in the middle of a message')
+    received += count
+  return buffer
+
+# Worker side. Every worker process of the pool loads the level and the assets once, in the batch
+# renderer's pool initializer, and renders and encodes the frames of all clients.
+
+def get_player_start():
+  import batch_render
+  player = batch_render.worker_renderer.engine.player
+  return player.pos.x, player.pos.y, player.angle
+
+def render_frame(view, column_step, encoding):
+  # Render one camera and encode the frame. Returns (payload, render time in ms, encode time in ms)
+  import batch_render
+  renderer = batch_render.worker_renderer
+  start = time.perf_counter()
+  renderer.viewport.column_step = column_step
+  framebuffer = renderer.render(view, copy=False)
+  rendered = time.perf_counter()
+  if encoding == ENCODINGS['zlib']:
+    payload = zlib.compress(framebuffer, RENDER_SERVER_ZLIB_LEVEL)
+  else:
+    payload = framebuffer.tobytes()
+  return payload, (rendered - start) * 1000, (time.perf_counter() - rendered) * 1000
+
+# ClientSession class, one connected client. A reader thread only keeps the newest camera update; the
+# session renders it on the pool and sends the frame back. While the session waits for a frame and sends
+# it, the newest camera is already queued on the pool, so a client has at most two renders in the pool:
+# the frame being waited for or sent and the next one. Later cameras are only queued once that frame is
+# in the client's socket buffer, so a slow client gets fewer frames of its newest cameras instead of a
+# growing queue (updates replaced before they were queued are counted as dropped). A render failing in a
+# worker closes the connection of its client only.
+class ClientSession:
+  def __init__(self, server, sock, encoding, column_step):
+    self.server = server
+    self.sock = sock
+    self.encoding = encoding
+    self.column_step = column_step
+    self.pending = None  # Newest camera not rendered yet, (sequence, view)
+    self.closed = False  # The client closed its side of the connection
+    self.condition = threading.Condition()
+    self.frames = 0  # Frames sent
+
+  def read_cameras(self):
+    try:
+      while (data := recv_exact(self.sock, CAMERA.size)) is not None:
+        sequence, x, y, angle, height = CAMERA.unpack(data)
+        view = x, y, angle, None if math.isnan(height) else height
+        with self.condition:
+          if self.pending is not None:
+            self.server.stats.add_dropped()
+          self.pending = sequence, view
+          self.condition.notify()
+    except OSError:
+      pass
+    finally:
+      with self.condition:
+        self.closed = True
+        self.condition.notify()
+
+  # Take the newest camera, waiting for one if asked to. None once the client is gone
+  def take_camera(self, wait):
+    with self.condition:
+      while wait and self.pending is None and not self.closed:
+        self.condition.wait()
+      camera, self.pending = self.pending, None
+      return camera
+
+  def run(self):
+    threading.Thread(target=self.read_cameras, daemon=True).start()
+    in_flight = None  # (sequence, result) of the frame rendering
+    try:
+      while True:
+        camera = self.take_camera(wait=in_flight is None)
+        if camera is None and in_flight is None:
+          break
+        queued = None
+        if camera is not None:
+          # Queue the newest camera before sending the last frame, so a worker renders while we send
+          sequence, view = camera
+          queued = sequence, self.server.pool.apply_async(render_frame, (view, self.column_step, self.encoding))
+        if in_flight is not None:
+          self.send_frame(*in_flight)
+        in_flight = queued
+    except OSError:
+      pass  # The client went away
+    except Exception as error:
+      print(f'closing a client after a failed render: {error!r}', file=sys.stderr)
+    finally:
+      try:
+        self.sock.shutdown(socket.SHUT_RDWR)  # Also ends the reader thread blocked on the socket
+      except OSError:
+        pass
+      self.sock.close()
+
+  def send_frame(self, sequence, result):
+    payload, render_ms, encode_ms = result.get()
+    self.sock.sendall(FRAME.pack(sequence, self.encoding, len(payload), render_ms, encode_ms))
+    self.sock.sendall(payload)
+    self.frames += 1
+    self.server.stats.add_frame(len(payload), render_ms, encode_ms)
+
+# ServerStats class, frame counts and times of the server since the last report
+class ServerStats:
+  def __init__(self):
+    self.lock = threading.Lock()
+    self.reset()
+
+  def reset(self):
+    self.start = time.perf_counter()
+    self.frames = 0
+    self.bytes = 0
+    self.render_ms = 0.0
+    self.encode_ms = 0.0
+    self.dropped = 0
+
+  def add_frame(self, size, render_ms, encode_ms):
+    with self.lock:
+      self.frames += 1
+      self.bytes += size
+      self.render_ms += render_ms
+      self.encode_ms += encode_ms
+
+  def add_dropped(self):
+    with self.lock:
+      self.dropped += 1
+
+  # Throughput since the last report. Each worker process keeps one core busy, so the frame rate per
+  # core is the frame rate over the cores the workers can use
+  def report(self, workers, clients):
+    with self.lock:
+      elapsed = time.perf_counter() - self.start
+      frames = self.frames
+      cores = min(workers, os.cpu_count() or 1)
+      report = {
+        'clients': clients,
+        'workers': workers,
+        'fps': frames / elapsed,
+        'fps_per_core': frames / elapsed / cores,
+        'render_ms': self.render_ms / frames if frames else 0.0,
+        'encode_ms': self.encode_ms / frames if frames else 0.0,
+        'mb_per_s': self.bytes / elapsed / 2 ** 20,
+        'dropped_updates': self.dropped,
+      }
+      self.reset()
+    return report
+
+# RenderServer class, serves rendered frames of a map to the clients of a local socket. The level and
+# assets are loaded once per worker process of a pool shared by all clients; each client only costs a
+# session thread and its socket buffers.
+class RenderServer:
+  def __init__(self, wad_path, map_name='E1M1', address=RENDER_SERVER_ADDRESS, processes=None):
+    from batch_render import init_worker
+
+    self.address = address
+    self.processes = processes or os.cpu_count() or 1
+    # Spawned workers start from a clean interpreter instead of a fork of the caller's state
+    context = multiprocessing.get_context('spawn')
+    self.pool = context.Pool(self.processes, initializer=init_worker, initargs=(wad_path, map_name, None, 'png'))
+    self.start_view = self.pool.apply(get_player_start)  # Also waits for a worker to load the level
+    self.stats = ServerStats()
+    self.sessions = set()
+    self.sock = None
+
+  def serve_forever(self, report_interval=RENDER_SERVER_REPORT_INTERVAL):
+    self.sock = open_socket(self.address, listen=True)
+    if report_interval:
+      threading.Thread(target=self.report_loop, args=(report_interval,), daemon=True).start()
+    print(f'serving on {self.address} with {self.processes} workers', file=sys.stderr)
+    while True:
+      sock, _ = self.sock.accept()
+      threading.Thread(target=self.serve_client, args=(sock,), daemon=True).start()
+
+  def serve_client(self, sock):
+    hello = recv_exact(sock, HELLO.size)
+    if hello is None:
+      sock.close()
+      return None
+    magic, version, encoding, column_step = HELLO.unpack(hello)
+    if magic != SERVER_MAGIC or version != PROTOCOL_VERSION or encoding not in ENCODINGS.values():
+      sock.close()
+      return None
+    sock.sendall(WELCOME.pack(SERVER_MAGIC, PROTOCOL_VERSION, WIDTH, HEIGHT, self.processes, *self.start_view))
+
+    session = ClientSession(self, sock, encoding, column_step or COLUMN_STEP)
+    self.sessions.add(session)
+    try:
+      session.run()
+    finally:
+      self.sessions.discard(session)
+
+  def report_loop(self, interval):
+    while True:
+      time.sleep(interval)
+      if not self.sessions and not self.stats.frames:
+        self.stats.reset()  # Nothing to report while idle
+        continue
+      print(json.dumps(self.stats.report(self.processes, len(self.sessions))), file=sys.stderr)
+
+  def close(self):
+    if self.sock:
+      self.sock.close()
+      if self.sock.family == socket.AF_UNIX and os.path.exists(self.address):
+        os.remove(self.address)
+    self.pool.terminate()
+    self.pool.join()
+
+# RenderClient class, a client of the render server: sends camera updates and receives decoded frames
+class RenderClient:
+  def __init__(self, address=RENDER_SERVER_ADDRESS, encoding='zlib', column_step=0):
+    self.sock = open_socket(address)
+    self.encoding = ENCODINGS[encoding]
+    self.sock.sendall(HELLO.pack(SERVER_MAGIC, PROTOCOL_VERSION, self.encoding, column_step))
+    welcome = recv_exact(self.sock, WELCOME.size)
+    if welcome is None:
+      raise ConnectionError(f'{address} refused the connection')
+    magic, version, self.width, self.height, self.workers, *start_view = WELCOME.unpack(welcome)
+    self.start_view = tuple(start_view)  # Player start of the served map, (x, y, angle)
+
+  # Send a camera (x, y, angle) or (x, y, angle, height)
+  def send_camera(self, sequence, view):
+    x, y, angle, *height = view
+    self.sock.sendall(CAMERA.pack(sequence, x, y, angle, height[0] if height else math.nan))
+
+  # Receive the next frame as (camera sequence number, framebuffer, payload size, render ms, encode ms)
+  def receive_frame(self):
+    header = recv_exact(self.sock, FRAME.size)
+    if header is None:
+      raise ConnectionError('the server closed the connection')
+    sequence, encoding, size, render_ms, encode_ms = FRAME.unpack(header)
+    payload = recv_exact(self.sock, size)
+    if encoding == ENCODINGS['zlib']:
+      payload = zlib.decompress(payload)
+    framebuffer = np.frombuffer(payload, np.uint8).reshape(self.width, self.height, 3)
+    return sequence, framebuffer, size, render_ms, encode_ms
+
+  def close(self):
+    self.sock.close()
+
+# Mean and nearest-rank percentiles of a list of times
+def get_stats(times):
+  ordered = sorted(times)
+
+  def percentile(p):
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(p / 100 * len(ordered)) - 1))]
+
+  return {'mean': sum(ordered) / len(ordered), 'p50': percentile(50), 'p95': percentile(95), 'max': ordered[-1]}
+
+# Receive frames on one client with up to in_flight camera updates outstanding. Without a path the
+# camera turns on the spot at the player start, starting at an angle of its own
+def run_client(address, client_index, client_count, frames, encoding, column_step, in_flight, path, results):
+  client = RenderClient(address, encoding, column_step)
+  if path is None:
+    x, y, angle = client.start_view
+    angle += 360 * client_index / client_count
+    path = [(x, y, angle + 360 * i / frames) for i in range(frames)]
+
+  sent_at = {}
+  latencies, sizes = [], []
+  sequence = 0
+  start = time.perf_counter()
+  try:
+    for sequence in range(min(in_flight, frames)):
+      sent_at[sequence] = time.perf_counter()
+      client.send_camera(sequence, path[sequence % len(path)])
+    while len(latencies) < frames:
+      frame_sequence, framebuffer, size, render_ms, encode_ms = client.receive_frame()
+      latencies.append((time.perf_counter() - sent_at.pop(frame_sequence)) * 1000)
+      sizes.append(size)
+      # Send one camera per frame received; cameras dropped by the server are not answered
+      if len(latencies) < frames:
+        sequence += 1
+        sent_at[sequence] = time.perf_counter()
+        client.send_camera(sequence, path[sequence % len(path)])
+  finally:
+    client.close()
+  results[client_index] = {'latencies': latencies, 'sizes': sizes, 'workers': client.workers,
+                           'updates': sequence + 1, 'fps': frames / (time.perf_counter() - start)}
+
+# Load test: connect a number of clients, each receiving a number of frames, and report the throughput
+def run_load_test(address, clients=4, frames=100, encoding='zlib', column_step=0, in_flight=2, path=None):
+  results = [None] * clients
+  threads = [threading.Thread(target=run_client, args=(address, i, clients, frames, encoding, column_step,
+                                                       in_flight, path, results)) for i in range(clients)]
+  start = time.perf_counter()
+  for thread in threads:
+    thread.start()
+  for thread in threads:
+    thread.join()
+  elapsed = time.perf_counter() - start
+  if None in results:
+    raise RuntimeError('a client failed; see the error above')
+
+  total_frames = clients * frames
+  workers = results[0]['workers']
+  cores = min(workers, os.cpu_count() or 1)  # The clients run on the same host as the server
+  sizes = [size for result in results for size in result['sizes']]
+  return {
+    'address': address,
+    'clients': clients,
+    'frames_per_client': frames,
+    'encoding': encoding,
+    'in_flight': in_flight,
+    'workers': workers,
+    'total_s': elapsed,
+    'fps': total_frames / elapsed,
+    'fps_per_core': total_frames / elapsed / cores,
+    'client_fps': [result['fps'] for result in results],
+    'latency_ms': get_stats([latency for result in results for latency in result['latencies']]),
+    'frame_kb': sum(sizes) / len(sizes) / 1024,
+    'mb_per_s': sum(sizes) / elapsed / 2 ** 20,
+    'updates_sent': sum(result['updates'] for result in results),
+  }
+
+def main(argv=None):
+  parser = argparse.ArgumentParser(description='Serve rendered frames to local clients, or load test a server.')
+  commands = parser.add_subparsers(dest='command', required=True)
+
+  serve = commands.add_parser('serve', help='run the render server')
+  serve.add_argument('--wad', default='./resources/wad/DOOM1.WAD', help='path to the WAD file')
+  serve.add_argument('--map', default='E1M1', help='map to load')
+  serve.add_argument('--address', default=RENDER_SERVER_ADDRESS, help='Unix socket path or host:port')
+  serve.add_argument('--processes', type=int, help='number of worker processes (default: one per CPU)')
+  serve.add_argument('--report-interval', type=float, default=RENDER_SERVER_REPORT_INTERVAL,
+                     help='seconds between throughput reports, 0 for none')
+
+  load = commands.add_parser('load', help='load test a running server')
+  load.add_argument('--address', default=RENDER_SERVER_ADDRESS, help='Unix socket path or host:port')
+  load.add_argument('--clients', type=int, default=4, help='number of concurrent clients')
+  load.add_argument('--frames', type=int, default=100, help='frames received per client')
+  load.add_argument('--encoding', default='zlib', choices=ENCODINGS, help='frame encoding')
+  load.add_argument('--column-step', type=int, default=0, help='column step of the frames (0: server default)')
+  load.add_argument('--in-flight', type=int, default=2, help='camera updates a client keeps outstanding')
+  load.add_argument('--path', help='JSON camera path file, a list of [x, y, angle(, height)] views')
+  load.add_argument('--output', help='write the JSON report to this file instead of stdout')
+  args = parser.parse_args(argv)
+
+  if args.command == 'serve':
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))  # Clean up the workers and socket on kill too
+    server = RenderServer(args.wad, args.map, args.address, args.processes)
+    try:
+      server.serve_forever(args.report_interval)
+    except KeyboardInterrupt:
+      pass
+    finally:
+      server.close()
+    return None
+
+  path = None
+  if args.path:
+    with open(args.path) as f:
+      path = [tuple(view) for view in json.load(f)]
+  report = run_load_test(args.address, args.clients, args.frames, args.encoding, args.column_step,
+                         args.in_flight, path)
+  if args.output:
+    with open(args.output, 'w') as f:
+      json.dump(report, f, indent=2)
+  else:
+    json.dump(report, sys.stdout, indent=2)
+    print()
+
+if __name__ == '__main__':
+  main()
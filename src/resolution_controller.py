@@ -0,0 +1,55 @@
+from collections import deque
+from settings import *
+
+# ResolutionController class, holds a target frame rate by changing the column step of the player's view.
+# Frame times are averaged over a window of frames. The step grows when the average exceeds the frame
+# budget and shrinks only when the finer step is predicted to fit well within it; after every change
+# the controller waits before measuring again. The gap between the two thresholds and the wait keep
+# the resolution from flickering between two steps.
+class ResolutionController:
+  def __init__(self, engine, target_fps=TARGET_FPS, min_step=MIN_COLUMN_STEP, max_step=MAX_COLUMN_STEP):
+    self.engine = engine  # Reference to the main engine
+    self.budget_ms = 1000 / target_fps  # Frame time to hold
+    self.min_step, self.max_step = min_step, max_step
+    self.frame_times = deque(maxlen=RESOLUTION_WINDOW)  # Frame times in ms since the last change
+    self.cooldown = 0  # Frames left to skip after a change
+    self.changes = 0  # Number of step changes, to check for flicker
+
+    self.set_column_step(min(max(self.column_step, min_step), max_step))
+
+  @property
+  def column_step(self):
+    return self.engine.view.column_step
+
+  # Record the time of the last frame and change the column step when the window is full
+  def update(self, frame_ms):
+    if self.cooldown:
+      self.cooldown -= 1
+      return None
+
+    self.frame_times.append(frame_ms)
+    if len(self.frame_times) < self.frame_times.maxlen:
+      return None
+
+    mean_ms = sum(self.frame_times) / len(self.frame_times)
+    step = self.column_step
+    if mean_ms > self.budget_ms * RESOLUTION_UPPER and step < self.max_step:
+      self.change_step(step + 1)
+    elif step > self.min_step and self.predict_frame_time(mean_ms, step, step - 1) < self.budget_ms * RESOLUTION_LOWER:
+      self.change_step(step - 1)
+
+  @staticmethod
+  def predict_frame_time(frame_ms, step, new_step):
+    # Frame time at another column step, taking the frame cost as proportional to the drawn columns.
+    # The BSP traversal does not scale with the columns, so a finer step usually costs more than
+    # predicted; the lower threshold leaves room for that.
+    return frame_ms * step / new_step
+
+  def change_step(self, step):
+    self.set_column_step(step)
+    self.frame_times.clear()
+    self.cooldown = RESOLUTION_COOLDOWN
+    self.changes += 1
+
+  def set_column_step(self, step):
+    self.engine.view.column_step = step
@@ -1,5 +1,8 @@
 # import all settings
 from settings import *
+from data_types import DrawSeg
+from asset_data import NO_TEXTURE
+from seg_table import SegTable, SectorTable, NO_SECTOR
 
 class SegHandler:
   # Maximum and minimum scale values
@@ -10,189 +13,238 @@ class SegHandler:
     # initializing the engine and its related attributes
     self.engine = engine
     self.wad_data = engine.wad_data
-    self.player = engine.player
-    self.framebuffer = self.engine.framebuffer
     self.textures = self.wad_data.asset_data.textures
+    self.atlas = self.wad_data.asset_data.atlas
     self.sky_id = self.wad_data.asset_data.sky_id
+    self.light_tables = engine.light_tables
 
-    # initializing segment related variables
-    self.seg = None
-    self.rw_angle1 = None
-    self.screen_range: set = None
-    self.x_to_angle = self.get_x_to_angle_table()
-    self.upper_clip, self.lower_clip = [], []
+    # Render data of the segs and sectors in struct-of-arrays layout, resolved once per map. The arrays
+    # are for compiled kernels; the draw paths index the same columns as lists
+    self.seg_table, self.sector_table, self.segs, self.sectors = self.prepare(self.wad_data)
 
-  def update(self):
+  @staticmethod
+  def prepare(wad_data):
+    # The seg and sector tables of a map, as arrays and as lists
+    return wad_data.get_prepared('seg_tables', SegHandler.build_tables)
+
+  @staticmethod
+  def build_tables(wad_data):
+    texture_ids = wad_data.asset_data.get_map_texture_ids(wad_data)
+    seg_table = SegTable.from_level(wad_data, texture_ids)
+    sector_table = SectorTable.from_level(wad_data, texture_ids)
+    return seg_table, sector_table, seg_table.to_lists(), sector_table.to_lists()
+
+  def update(self, view):
+    # The camera, the projection and the clipping state of a frame are kept in the viewport being
+    # rendered ('view'), which every draw method is given.
     # initialize floor and ceiling clipping height
     # initialize the screen range
-    self.init_floor_ceil_clip_height()
-    self.init_screen_range()
+    # reset the wall ranges drawn in the previous frame
+    self.init_floor_ceil_clip_height(view)
+    self.init_screen_range(view)
+    view.draw_segs = []
 
-  def init_floor_ceil_clip_height(self):
+  @staticmethod
+  def init_floor_ceil_clip_height(view):
     # Initialize upper and lower clipping heights for floor and ceiling
-    self.upper_clip = [-1 for _ in range(WIDTH)]
-    self.lower_clip = [HEIGHT for _ in range(WIDTH)]
+    view.upper_clip = [-1 for _ in range(view.width)]
+    view.lower_clip = [view.height for _ in range(view.width)]
 
-  @staticmethod
-  def get_x_to_angle_table():
-    # creating a table for x to angle conversion
-    x_to_angle = []
-    for i in range(0, WIDTH + 1):
-      angle = math.degrees(math.atan((H_WIDTH - i) / SCREEN_DIST))
-      x_to_angle.append(angle)
-    return x_to_angle
-
-  def scale_from_global_angle(self, x, rw_normal_angle, rw_distance):
+  def scale_from_global_angle(self, view, x, rw_normal_angle, rw_distance):
     # calculating scale based on global angle
-    x_angle = self.x_to_angle[x]
-    num = SCREEN_DIST * math.cos(math.radians(rw_normal_angle - x_angle - self.player.angle))
+    x_angle = view.x_to_angle[x]
+    num = view.screen_dist * math.cos(math.radians(rw_normal_angle - x_angle - view.camera.angle))
     den = rw_distance * math.cos(math.radians(x_angle))
 
     scale = num / den
     scale = min(self.MAX_SCALE, max(self.MIN_SCALE, scale))
     return scale
 
-  def init_screen_range(self):
+  @staticmethod
+  def init_screen_range(view):
     # Initialize the screen range
-    self.screen_range = set(range(WIDTH))
+    view.screen_range = set(range(view.width))
 
-  def draw_solid_wall_range(self, x1, x2):
+  @staticmethod
+  def store_draw_seg(view, x1, x2, scale1, scale2, solid):
+    # Record a drawn wall range so sprites behind it can be clipped against its silhouette.
+    # Portals keep a copy of the clip arrays as they are after the range has been drawn.
+    draw_seg = DrawSeg()
+    draw_seg.x1, draw_seg.x2 = x1, x2
+    draw_seg.scale1, draw_seg.scale2 = scale1, scale2
+    draw_seg.seg = view.seg  # Seg id
+    if solid:
+      draw_seg.top_clip = draw_seg.bottom_clip = None
+    else:
+      draw_seg.top_clip = view.upper_clip[x1: x2 + 1]
+      draw_seg.bottom_clip = view.lower_clip[x1: x2 + 1]
+    view.draw_segs.append(draw_seg)
+
+  @staticmethod
+  def get_first_column(view, x1):
+    # First column from x1 on that is drawn with column decimation (only every column_step-th column of
+    # the view is drawn), and the column step
+    col_step = view.column_step
+    return x1 + (-x1) % col_step, col_step
+
+  @staticmethod
+  def advance(value, step, skip, col_step):
+    # Move a per column interpolated value forward by skip columns and scale its step to col_step columns
+    return value + step * skip, step * col_step
+
+  def draw_solid_wall_range(self, view, x1, x2):
     # This function is used to draw the range of a solid wall.
     # Various properties such as wall texture, ceiling texture, floor texture and light level are considered.
     # Geometry of the wall is calculated using cosine and sine functions.
     # Drawing is done based on whether the wall, ceiling and floor should be drawn or not.
 
-    seg = self.seg
-    front_sector = seg.front_sector
-    line = seg.linedef
-    side = seg.linedef.front_sidedef
+    seg_id = view.seg
+    camera = view.camera
+    segs, sectors = self.segs, self.sectors
+    front_sector = segs.front_sector[seg_id]
     renderer = self.engine.view_renderer
-    upper_clip = self.upper_clip
-    lower_clip = self.lower_clip
-    framebuffer = self.framebuffer
-
-    wall_texture_id = side.middle_texture
-    ceil_texture_id = front_sector.ceil_texture
-    floor_texture_id = front_sector.floor_texture
-    light_level = front_sector.light_level
-
-    world_front_z1 = front_sector.ceil_height - self.player.height
-    world_front_z2 = front_sector.floor_height - self.player.height
-
-    b_draw_wall = side.middle_texture != '-'
-    b_draw_ceil = world_front_z1 > 0 or front_sector.ceil_texture == self.sky_id
+    upper_clip = view.upper_clip
+    lower_clip = view.lower_clip
+    framebuffer = view.framebuffer
+    h_height = view.h_height
+
+    wall_texture = segs.middle_texture[seg_id]
+    ceil_texture_id = sectors.ceil_texture[front_sector]
+    floor_texture_id = sectors.floor_texture[front_sector]
+    light_level = sectors.light_level[front_sector]
+    scale_light = self.light_tables.get_scale_light(light_level)
+
+    world_front_z1 = sectors.ceil_height[front_sector] - camera.height
+    world_front_z2 = sectors.floor_height[front_sector] - camera.height
+
+    b_draw_wall = wall_texture != NO_TEXTURE
+    b_draw_ceil = world_front_z1 > 0 or ceil_texture_id == self.sky_id
     b_draw_floor = world_front_z2 < 0
 
-    rw_normal_angle = seg.angle + 90
-    offset_angle = rw_normal_angle - self.rw_angle1
+    rw_normal_angle = segs.normal_angle[seg_id]
+    offset_angle = rw_normal_angle - view.rw_angle1
 
-    hypotenuse = math.dist(self.player.pos, seg.start_vertex)
+    hypotenuse = math.dist(camera.pos, (segs.start_x[seg_id], segs.start_y[seg_id]))
     rw_distance = hypotenuse * math.cos(math.radians(offset_angle))
 
-    rw_scale1 = self.scale_from_global_angle(x1, rw_normal_angle, rw_distance)
+    rw_scale1 = self.scale_from_global_angle(view, x1, rw_normal_angle, rw_distance)
 
     if math.isclose(offset_angle % 360, 90, abs_tol=1):
       rw_scale1 *= 0.01
 
     if x1 < x2:
-      scale2 = self.scale_from_global_angle(x2, rw_normal_angle, rw_distance)
+      scale2 = self.scale_from_global_angle(view, x2, rw_normal_angle, rw_distance)
       rw_scale_step = (scale2 - rw_scale1) / (x2 - x1)
     else:
       rw_scale_step = 0
 
-    wall_texture = self.textures[wall_texture_id]
-    if line.flags & self.wad_data.LINEDEF_FLAGS['DONT_PEG_BOTTOM']:
-      v_top = front_sector.floor_height + wall_texture.shape[1]
-      middle_tex_alt = v_top - self.player.height
+    self.store_draw_seg(view, x1, x2, rw_scale1, rw_scale1 + rw_scale_step * (x2 - x1), solid=True)
+
+    texels, tex_info = self.atlas.texels, self.atlas.info
+    if segs.peg_bottom[seg_id]:
+      v_top = sectors.floor_height[front_sector] + self.atlas.heights[wall_texture]
+      middle_tex_alt = v_top - camera.height
     else:
       middle_tex_alt = world_front_z1
-    middle_tex_alt += side.y_offset
+    middle_tex_alt += segs.y_offset[seg_id]
 
     rw_offset = hypotenuse * math.sin(math.radians(offset_angle))
-    rw_offset += seg.offset + side.x_offset
+    rw_offset += segs.tex_offset[seg_id]
 
-    rw_center_angle = rw_normal_angle - self.player.angle
+    rw_center_angle = rw_normal_angle - camera.angle
 
-    wall_y1 = H_HEIGHT - world_front_z1 * rw_scale1
+    wall_y1 = h_height - world_front_z1 * rw_scale1
     wall_y1_step = -rw_scale_step * world_front_z1
 
-    wall_y2 = H_HEIGHT - world_front_z2 * rw_scale1
+    wall_y2 = h_height - world_front_z2 * rw_scale1
     wall_y2_step = -rw_scale_step * world_front_z2
 
-    for x in range(x1, x2 + 1):
+    # Start at the first drawn column and step over the decimated ones
+    x_first, col_step = self.get_first_column(view, x1)
+    skip = x_first - x1
+    rw_scale1, rw_scale_step = self.advance(rw_scale1, rw_scale_step, skip, col_step)
+    wall_y1, wall_y1_step = self.advance(wall_y1, wall_y1_step, skip, col_step)
+    wall_y2, wall_y2_step = self.advance(wall_y2, wall_y2_step, skip, col_step)
+
+    for x in range(x_first, x2 + 1, col_step):
       draw_wall_y1 = wall_y1 - 1
       draw_wall_y2 = wall_y2
 
       if b_draw_ceil:
         cy1 = upper_clip[x] + 1
         cy2 = int(min(draw_wall_y1 - 1, lower_clip[x] - 1))
-        renderer.draw_flat(ceil_texture_id, light_level, x, cy1, cy2, world_front_z1)
+        renderer.draw_flat(view, ceil_texture_id, light_level, x, cy1, cy2, world_front_z1)
 
       if b_draw_wall:
         wy1 = int(max(draw_wall_y1, upper_clip[x] + 1))
         wy2 = int(min(draw_wall_y2, lower_clip[x] - 1))
 
         if wy1 < wy2:
-          angle = rw_center_angle - self.x_to_angle[x]
+          angle = rw_center_angle - view.x_to_angle[x]
           texture_column = rw_distance * math.tan(math.radians(angle)) - rw_offset
           inv_scale = 1.0 / rw_scale1
+          wall_light = scale_light[min(int(rw_scale1 * view.light_scale_unit), MAX_LIGHT_SCALE - 1)]
 
-          renderer.draw_wall_col(framebuffer, wall_texture, texture_column, x, wy1, wy2,
-                                 middle_tex_alt, inv_scale, light_level)
+          renderer.draw_wall_col(framebuffer, texels, tex_info, wall_texture, texture_column,
+                                 x, wy1, wy2, middle_tex_alt, inv_scale, wall_light, h_height)
 
       if b_draw_floor:
         fy1 = int(max(draw_wall_y2 + 1, upper_clip[x] + 1))
         fy2 = lower_clip[x] - 1
-        renderer.draw_flat(floor_texture_id, light_level, x, fy1, fy2, world_front_z2)
+        renderer.draw_flat(view, floor_texture_id, light_level, x, fy1, fy2, world_front_z2)
 
       rw_scale1 += rw_scale_step
       wall_y1 += wall_y1_step
       wall_y2 += wall_y2_step
 
-  def draw_portal_wall_range(self, x1, x2):
+  def draw_portal_wall_range(self, view, x1, x2):
     # Similar to draw_solid_wall_range, but this function is used to draw a range of portal wall.
     # The texture of the upper and lower walls and the texture of the ceiling and floor are considered.
     # Depending on the front and back sectors, certain parts of the portal are drawn or skipped.
     # These parts include the upper wall, ceiling, lower wall and floor.
 
-    seg = self.seg
-    front_sector = seg.front_sector
-    back_sector = seg.back_sector
-    line = seg.linedef
-    side = seg.linedef.front_sidedef
+    seg_id = view.seg
+    camera = view.camera
+    segs, sectors = self.segs, self.sectors
+    front_sector = segs.front_sector[seg_id]
+    back_sector = segs.back_sector[seg_id]
     renderer = self.engine.view_renderer
-    upper_clip = self.upper_clip
-    lower_clip = self.lower_clip
-    framebuffer = self.framebuffer
-
-    upper_wall_texture = side.upper_texture
-    lower_wall_texture = side.lower_texture
-    tex_ceil_id = front_sector.ceil_texture
-    tex_floor_id = front_sector.floor_texture
-    light_level = front_sector.light_level
-
-    world_front_z1 = front_sector.ceil_height - self.player.height
-    world_back_z1 = back_sector.ceil_height - self.player.height
-
-    world_front_z2 = front_sector.floor_height - self.player.height
-    world_back_z2 = back_sector.floor_height - self.player.height
-
-    if front_sector.ceil_texture == back_sector.ceil_texture == self.sky_id:
+    upper_clip = view.upper_clip
+    lower_clip = view.lower_clip
+    framebuffer = view.framebuffer
+    h_height = view.h_height
+
+    upper_wall_texture = segs.upper_texture[seg_id]
+    lower_wall_texture = segs.lower_texture[seg_id]
+    tex_ceil_id = sectors.ceil_texture[front_sector]
+    tex_floor_id = sectors.floor_texture[front_sector]
+    back_tex_ceil_id = sectors.ceil_texture[back_sector]
+    light_level = sectors.light_level[front_sector]
+    back_light_level = sectors.light_level[back_sector]
+    scale_light = self.light_tables.get_scale_light(light_level)
+
+    world_front_z1 = sectors.ceil_height[front_sector] - camera.height
+    world_back_z1 = sectors.ceil_height[back_sector] - camera.height
+
+    world_front_z2 = sectors.floor_height[front_sector] - camera.height
+    world_back_z2 = sectors.floor_height[back_sector] - camera.height
+
+    if tex_ceil_id == back_tex_ceil_id == self.sky_id:
       world_front_z1 = world_back_z1
 
     if (world_front_z1 != world_back_z1 or
-        front_sector.light_level != back_sector.light_level or
-        front_sector.ceil_texture != back_sector.ceil_texture):
-      b_draw_upper_wall = side.upper_texture != '-' and world_back_z1 < world_front_z1
-      b_draw_ceil = world_front_z1 >= 0 or front_sector.ceil_texture == self.sky_id
+        light_level != back_light_level or
+        tex_ceil_id != back_tex_ceil_id):
+      b_draw_upper_wall = upper_wall_texture != NO_TEXTURE and world_back_z1 < world_front_z1
+      b_draw_ceil = world_front_z1 >= 0 or tex_ceil_id == self.sky_id
     else:
       b_draw_upper_wall = False
       b_draw_ceil = False
 
     if (world_front_z2 != world_back_z2 or
-        front_sector.floor_texture != back_sector.floor_texture or
-        front_sector.light_level != back_sector.light_level):
-      b_draw_lower_wall = side.lower_texture != '-' and world_back_z2 > world_front_z2
+        tex_floor_id != sectors.floor_texture[back_sector] or
+        light_level != back_light_level):
+      b_draw_lower_wall = lower_wall_texture != NO_TEXTURE and world_back_z2 > world_front_z2
       b_draw_floor = world_front_z2 <= 0
     else:
       b_draw_lower_wall = False
@@ -202,54 +254,53 @@ class SegHandler:
         not b_draw_floor):
       return None
 
-    rw_normal_angle = seg.angle + 90
-    offset_angle = rw_normal_angle - self.rw_angle1
+    rw_normal_angle = segs.normal_angle[seg_id]
+    offset_angle = rw_normal_angle - view.rw_angle1
 
-    hypotenuse = math.dist(self.player.pos, seg.start_vertex)
+    hypotenuse = math.dist(camera.pos, (segs.start_x[seg_id], segs.start_y[seg_id]))
     rw_distance = hypotenuse * math.cos(math.radians(offset_angle))
 
-    rw_scale1 = self.scale_from_global_angle(x1, rw_normal_angle, rw_distance)
+    rw_scale1 = self.scale_from_global_angle(view, x1, rw_normal_angle, rw_distance)
 
     if x2 > x1:
-      scale2 = self.scale_from_global_angle(x2, rw_normal_angle, rw_distance)
+      scale2 = self.scale_from_global_angle(view, x2, rw_normal_angle, rw_distance)
       rw_scale_step = (scale2 - rw_scale1) / (x2 - x1)
     else:
       rw_scale_step = 0
+    scale1 = rw_scale1
 
-    if b_draw_upper_wall:
-      upper_wall_texture = self.textures[side.upper_texture]
+    texels, tex_info = self.atlas.texels, self.atlas.info
 
-      if line.flags & self.wad_data.LINEDEF_FLAGS['DONT_PEG_TOP']:
+    if b_draw_upper_wall:
+      if segs.peg_top[seg_id]:
         upper_tex_alt = world_front_z1
       else:
-        v_top = back_sector.ceil_height + upper_wall_texture.shape[1]
-        upper_tex_alt = v_top - self.player.height
-      upper_tex_alt += side.y_offset
+        v_top = sectors.ceil_height[back_sector] + self.atlas.heights[upper_wall_texture]
+        upper_tex_alt = v_top - camera.height
+      upper_tex_alt += segs.y_offset[seg_id]
 
     if b_draw_lower_wall:
-      lower_wall_texture = self.textures[side.lower_texture]
-
-      if line.flags & self.wad_data.LINEDEF_FLAGS['DONT_PEG_BOTTOM']:
+      if segs.peg_bottom[seg_id]:
         lower_tex_alt = world_front_z1
       else:
         lower_tex_alt = world_back_z2
-      lower_tex_alt += side.y_offset
+      lower_tex_alt += segs.y_offset[seg_id]
 
     if seg_textured := b_draw_upper_wall or b_draw_lower_wall:
       rw_offset = hypotenuse * math.sin(math.radians(offset_angle))
-      rw_offset += seg.offset + side.x_offset
+      rw_offset += segs.tex_offset[seg_id]
 
-      rw_center_angle = rw_normal_angle - self.player.angle
+      rw_center_angle = rw_normal_angle - camera.angle
 
-    wall_y1 = H_HEIGHT - world_front_z1 * rw_scale1
+    wall_y1 = h_height - world_front_z1 * rw_scale1
     wall_y1_step = -rw_scale_step * world_front_z1
 
-    wall_y2 = H_HEIGHT - world_front_z2 * rw_scale1
+    wall_y2 = h_height - world_front_z2 * rw_scale1
     wall_y2_step = -rw_scale_step * world_front_z2
 
     if b_draw_upper_wall:
       if world_back_z1 > world_front_z2:
-        portal_y1 = H_HEIGHT - world_back_z1 * rw_scale1
+        portal_y1 = h_height - world_back_z1 * rw_scale1
         portal_y1_step = -rw_scale_step * world_back_z1
       else:
         portal_y1 = wall_y2
@@ -257,20 +308,32 @@ class SegHandler:
 
     if b_draw_lower_wall:
       if world_back_z2 < world_front_z1:
-        portal_y2 = H_HEIGHT - world_back_z2 * rw_scale1
+        portal_y2 = h_height - world_back_z2 * rw_scale1
         portal_y2_step = -rw_scale_step * world_back_z2
       else:
         portal_y2 = wall_y1
         portal_y2_step = wall_y1_step
 
-    for x in range(x1, x2 + 1):
+    # Start at the first drawn column and step over the decimated ones
+    x_first, col_step = self.get_first_column(view, x1)
+    skip = x_first - x1
+    rw_scale1, rw_scale_step = self.advance(rw_scale1, rw_scale_step, skip, col_step)
+    wall_y1, wall_y1_step = self.advance(wall_y1, wall_y1_step, skip, col_step)
+    wall_y2, wall_y2_step = self.advance(wall_y2, wall_y2_step, skip, col_step)
+    if b_draw_upper_wall:
+      portal_y1, portal_y1_step = self.advance(portal_y1, portal_y1_step, skip, col_step)
+    if b_draw_lower_wall:
+      portal_y2, portal_y2_step = self.advance(portal_y2, portal_y2_step, skip, col_step)
+
+    for x in range(x_first, x2 + 1, col_step):
       draw_wall_y1 = wall_y1 - 1
       draw_wall_y2 = wall_y2
 
       if seg_textured:
-        angle = rw_center_angle - self.x_to_angle[x]
+        angle = rw_center_angle - view.x_to_angle[x]
         texture_column = rw_distance * math.tan(math.radians(angle)) - rw_offset
         inv_scale = 1.0 / rw_scale1
+        wall_light = scale_light[min(int(rw_scale1 * view.light_scale_unit), MAX_LIGHT_SCALE - 1)]
 
       if b_draw_upper_wall:
         draw_upper_wall_y1 = wall_y1 - 1
@@ -279,13 +342,13 @@ class SegHandler:
         if b_draw_ceil:
           cy1 = upper_clip[x] + 1
           cy2 = int(min(draw_wall_y1 - 1, lower_clip[x] - 1))
-          renderer.draw_flat(tex_ceil_id, light_level, x, cy1, cy2, world_front_z1)
+          renderer.draw_flat(view, tex_ceil_id, light_level, x, cy1, cy2, world_front_z1)
 
         wy1 = int(max(draw_upper_wall_y1, upper_clip[x] + 1))
         wy2 = int(min(draw_upper_wall_y2, lower_clip[x] - 1))
 
-        renderer.draw_wall_col(framebuffer, upper_wall_texture, texture_column, x, wy1, wy2,
-                               upper_tex_alt, inv_scale, light_level)
+        renderer.draw_wall_col(framebuffer, texels, tex_info, upper_wall_texture, texture_column,
+                               x, wy1, wy2, upper_tex_alt, inv_scale, wall_light, h_height)
 
         if upper_clip[x] < wy2:
           upper_clip[x] = wy2
@@ -295,7 +358,7 @@ class SegHandler:
       if b_draw_ceil:
         cy1 = upper_clip[x] + 1
         cy2 = int(min(draw_wall_y1 - 1, lower_clip[x] - 1))
-        renderer.draw_flat(tex_ceil_id, light_level, x, cy1, cy2, world_front_z1)
+        renderer.draw_flat(view, tex_ceil_id, light_level, x, cy1, cy2, world_front_z1)
 
         if upper_clip[x] < cy2:
           upper_clip[x] = cy2
@@ -304,15 +367,15 @@ class SegHandler:
         if b_draw_floor:
           fy1 = int(max(draw_wall_y2 + 1, upper_clip[x] + 1))
           fy2 = lower_clip[x] - 1
-          renderer.draw_flat(tex_floor_id, light_level, x, fy1, fy2, world_front_z2)
+          renderer.draw_flat(view, tex_floor_id, light_level, x, fy1, fy2, world_front_z2)
 
         draw_lower_wall_y1 = portal_y2 - 1
         draw_lower_wall_y2 = wall_y2
 
         wy1 = int(max(draw_lower_wall_y1, upper_clip[x] + 1))
         wy2 = int(min(draw_lower_wall_y2, lower_clip[x] - 1))
-        renderer.draw_wall_col(framebuffer, lower_wall_texture, texture_column, x, wy1, wy2,
-                               lower_tex_alt, inv_scale, light_level)
+        renderer.draw_wall_col(framebuffer, texels, tex_info, lower_wall_texture, texture_column,
+                               x, wy1, wy2, lower_tex_alt, inv_scale, wall_light, h_height)
 
         if lower_clip[x] > wy1:
           lower_clip[x] = wy1
@@ -322,7 +385,7 @@ class SegHandler:
       if b_draw_floor:
         fy1 = int(max(draw_wall_y2 + 1, upper_clip[x] + 1))
         fy2 = lower_clip[x] - 1
-        renderer.draw_flat(tex_floor_id, light_level, x, fy1, fy2, world_front_z2)
+        renderer.draw_flat(view, tex_floor_id, light_level, x, fy1, fy2, world_front_z2)
 
         if lower_clip[x] > draw_wall_y2 + 1:
           lower_clip[x] = fy1
@@ -331,56 +394,59 @@ class SegHandler:
       wall_y1 += wall_y1_step
       wall_y2 += wall_y2_step
 
-  def clip_portal_walls(self, x_start, x_end):
+    self.store_draw_seg(view, x1, x2, scale1, scale1 + rw_scale_step / col_step * (x2 - x1), solid=False)
+
+  def clip_portal_walls(self, view, x_start, x_end):
     # This function checks if the current wall is intersecting with the screen range
     # and calls draw_portal_wall_range to draw the portal walls.
 
     curr_wall = set(range(x_start, x_end))
 
-    if intersection := curr_wall & self.screen_range:
+    if intersection := curr_wall & view.screen_range:
 
       if len(intersection) == len(curr_wall):
-        self.draw_portal_wall_range(x_start, x_end - 1)
+        self.draw_portal_wall_range(view, x_start, x_end - 1)
       else:
         arr = sorted(intersection)
         x = arr[0]
         for x1, x2 in zip(arr, arr[1:]):
           if x2 - x1 > 1:
-            self.draw_portal_wall_range(x, x1)
+            self.draw_portal_wall_range(view, x, x1)
             x = x2
-        self.draw_portal_wall_range(x, arr[-1])
+        self.draw_portal_wall_range(view, x, arr[-1])
 
-  def clip_solid_walls(self, x_start, x_end):
+  def clip_solid_walls(self, view, x_start, x_end):
     # Similar to clip_portal_walls, but this function is used to draw solid walls.
     # It checks if the current wall is intersecting with the screen range
     # and calls draw_solid_wall_range to draw the solid walls.
 
-    if self.screen_range:
+    if view.screen_range:
       curr_wall = set(range(x_start, x_end))
 
-      if intersection := curr_wall & self.screen_range:
+      if intersection := curr_wall & view.screen_range:
 
         if len(intersection) == len(curr_wall):
-          self.draw_solid_wall_range(x_start, x_end - 1)
+          self.draw_solid_wall_range(view, x_start, x_end - 1)
         else:
           arr = sorted(intersection)
           x, x2 = arr[0], arr[-1]
 
           for x1, x2 in zip(arr, arr[1:]):
             if x2 - x1 > 1:
-              self.draw_solid_wall_range(x, x1)
+              self.draw_solid_wall_range(view, x, x1)
               x = x2
-          self.draw_solid_wall_range(x, x2)
+          self.draw_solid_wall_range(view, x, x2)
 
-        self.screen_range -= intersection
+        view.screen_range -= intersection
 
     else:
-      self.engine.bsp.is_traverse_bsp = False
+      view.is_traverse_bsp = False
 
-  def classify_segment(self, segment, x1, x2, rw_angle1):
+  def classify_segment(self, view, seg_id, x1, x2, rw_angle1):
     """
-    This method takes in a segment and the start and end range (x1, x2) on screen where the segment
-    will be drawn, as well as the angle at which the segment is viewed (rw_angle1).
+    This method takes in the viewport being rendered, the id of a segment and the start and end range (x1, x2)
+    on screen where the segment will be drawn, as well as the angle at which the segment is viewed (rw_angle1).
+    The segment's data is read from the seg and sector tables.
 
     If the start and end range are the same (i.e., the segment does not span any screen space),
     the method does not proceed further and returns None.
@@ -401,28 +467,29 @@ class SegHandler:
     If any of the conditions in the last check are not met, the portal needs to be drawn, and the method
     calls the clip_portal_walls method to draw the portal walls on the screen.
     """
-    self.seg = segment
-    self.rw_angle1 = rw_angle1
+    view.seg = seg_id
+    view.rw_angle1 = rw_angle1
 
     if x1 == x2:
       return None
 
-    back_sector = segment.back_sector
-    front_sector = segment.front_sector
+    segs, sectors = self.segs, self.sectors
+    back_sector = segs.back_sector[seg_id]
+    front_sector = segs.front_sector[seg_id]
 
-    if back_sector is None:
-      self.clip_solid_walls(x1, x2)
+    if back_sector == NO_SECTOR:
+      self.clip_solid_walls(view, x1, x2)
       return None
 
-    if (front_sector.ceil_height != back_sector.ceil_height or
-        front_sector.floor_height != back_sector.floor_height):
-      self.clip_portal_walls(x1, x2)
+    if (sectors.ceil_height[front_sector] != sectors.ceil_height[back_sector] or
+        sectors.floor_height[front_sector] != sectors.floor_height[back_sector]):
+      self.clip_portal_walls(view, x1, x2)
       return None
 
-    if (back_sector.ceil_texture == front_sector.ceil_texture and
-        back_sector.floor_texture == front_sector.floor_texture and
-        back_sector.light_level == front_sector.light_level and
-        self.seg.linedef.front_sidedef.middle_texture == '-'):
+    if (sectors.ceil_texture[back_sector] == sectors.ceil_texture[front_sector] and
+        sectors.floor_texture[back_sector] == sectors.floor_texture[front_sector] and
+        sectors.light_level[back_sector] == sectors.light_level[front_sector] and
+        segs.middle_texture[seg_id] == NO_TEXTURE):
       return None
 
-    self.clip_portal_walls(x1, x2)
+    self.clip_portal_walls(view, x1, x2)
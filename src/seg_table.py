@@ -0,0 +1,76 @@
+import numpy as np
+from settings import *
+from asset_data import NO_TEXTURE
+
+NO_SECTOR = -1  # Sector id of the missing back sector of a one sided seg
+
+# ColumnTable class, a table in struct-of-arrays layout: one array per field, indexed by the record id.
+# The arrays can be handed to compiled kernels; to_lists gives the same table with Python lists,
+# which are faster to index one value at a time from Python code.
+class ColumnTable:
+  FIELDS = ()
+
+  def __init__(self, **columns):
+    for name in self.FIELDS:
+      setattr(self, name, columns[name])
+
+  def __len__(self):
+    return len(getattr(self, self.FIELDS[0]))
+
+  def to_lists(self):
+    return type(self)(**{name: np.asarray(getattr(self, name)).tolist() for name in self.FIELDS})
+
+# SegTable class, the render data of every seg of a map, resolved once at load time: the wall normal
+# angle, the start and end vertex, the texture offsets of the front sidedef of the linedef, the texture ids
+# of its wall textures, the pegging flags of the linedef and the ids of the front and back sectors.
+class SegTable(ColumnTable):
+  FIELDS = (
+    'normal_angle', 'start_x', 'start_y', 'end_x', 'end_y', 'tex_offset', 'y_offset',
+    'middle_texture', 'upper_texture', 'lower_texture', 'peg_top', 'peg_bottom', 'two_sided',
+    'front_sector', 'back_sector',
+  )
+
+  # The texture ids are those of the names of wad_data.get_texture_names()
+  @classmethod
+  def from_level(cls, wad_data, texture_ids):
+    tables = wad_data.get_tables()
+    segs, vertexes = tables['segments'], tables['vertexes']
+    line = tables['linedefs'][segs['linedef_id']]
+    side = tables['sidedefs'][line['front_sidedef_id']]
+
+    start, end = vertexes[segs['start_vertex_id']], vertexes[segs['end_vertex_id']]
+    flags = line['flags']
+
+    return cls(
+      normal_angle=segs['angle'] + 90,
+      start_x=start['x'].astype(np.float64),
+      start_y=start['y'].astype(np.float64),
+      end_x=end['x'].astype(np.float64),
+      end_y=end['y'].astype(np.float64),
+      tex_offset=segs['offset'].astype(np.int32) + side['x_offset'],  # Seg offset along the linedef plus the sidedef offset
+      y_offset=side['y_offset'].astype(np.int32),
+      middle_texture=texture_ids[side['middle_texture']],
+      upper_texture=texture_ids[side['upper_texture']],
+      lower_texture=texture_ids[side['lower_texture']],
+      peg_top=(flags & wad_data.LINEDEF_FLAGS['DONT_PEG_TOP']) != 0,
+      peg_bottom=(flags & wad_data.LINEDEF_FLAGS['DONT_PEG_BOTTOM']) != 0,
+      two_sided=segs['back_sector_id'] != NO_SECTOR,
+      front_sector=segs['front_sector_id'].astype(np.int32),
+      back_sector=segs['back_sector_id'].astype(np.int32),
+    )
+
+# SectorTable class, the render data of every sector of a map: heights, texture ids of the flats and light level.
+class SectorTable(ColumnTable):
+  FIELDS = ('floor_height', 'ceil_height', 'floor_texture', 'ceil_texture', 'light_level')
+
+  @classmethod
+  def from_level(cls, wad_data, texture_ids):
+    sectors = wad_data.get_tables()['sectors']
+
+    return cls(
+      floor_height=sectors['floor_height'].astype(np.int32),
+      ceil_height=sectors['ceil_height'].astype(np.int32),
+      floor_texture=texture_ids[sectors['floor_texture']],
+      ceil_texture=texture_ids[sectors['ceil_texture']],
+      light_level=sectors['light_level'] / 255.0,
+    )
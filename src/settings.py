@@ -32,3 +32,98 @@ SCREEN_DIST = H_WIDTH / math.tan(math.radians(H_FOV))
 
 # Key color used for transparency or other effects, similar to green screen.
 COLOR_KEY = (152, 0, 136)
+
+# Copy frames out of the framebuffer on a background thread while the next frame is rendered (double-buffered
+# framebuffer). Display calls stay on the main thread, so frames are shown one frame later.
+PIPELINED_PRESENT = False
+# Number of recent frames kept for presentation latency statistics.
+PRESENT_LATENCY_SAMPLES = 120
+
+# Things closer to the view plane than this are not drawn as sprites.
+MIN_SPRITE_DEPTH = 4
+
+# Light diminishing, modelled on DOOM's light tables.
+# Number of sector light bands and of colormap brightness steps.
+LIGHT_LEVELS = 16
+NUM_COLORMAPS = 32
+# Sector light levels (0-255) are shifted down by this to get the light band.
+LIGHT_SEG_SHIFT = 4
+# Flats: number of distance entries and the shift turning a distance in map units into an entry.
+MAX_LIGHT_Z = 128
+LIGHT_Z_SHIFT = 4
+# Walls and sprites: number of scale entries and the factor turning a projection scale into an entry.
+MAX_LIGHT_SCALE = 48
+LIGHT_SCALE_UNIT = 16 * (DOOM_W / 2) / SCREEN_DIST
+# Divisor applied to the distance term when picking a colormap.
+DIST_MAP = 2
+
+# Frame profiler: enabled at startup (toggle in game with F3), number of frames kept and overlay font size.
+PROFILE = False
+PROFILER_HISTORY = 600
+PROFILER_FONT_SIZE = 24
+
+# The simulation runs in fixed tics at this rate (tics per second); frames interpolate the camera between tics.
+FIXED_TIMESTEP = True
+TIC_RATE = 35
+# Most tics simulated per frame; when a frame takes longer the backlog is dropped and the game slows down.
+MAX_TICS_PER_FRAME = 5
+
+# Demos store one input byte per tic, simulated with a fixed time step at this rate (tics per second).
+DEMO_TIC_RATE = TIC_RATE
+
+# Compile the rendering kernels at engine start instead of on first use.
+JIT_WARMUP = True
+# Use the ahead-of-time compiled kernels module when it has been built (python -m jit_warmup --aot).
+USE_AOT_KERNELS = False
+AOT_KERNELS_MODULE = 'doom_kernels'
+
+# Decode sprites and the textures the map does not use on first use instead of at startup.
+LAZY_ASSETS = True
+# Print the startup time breakdown once the first frame is presented.
+STARTUP_REPORT = False
+# Read the next map of the WAD on a background thread once a map is running, for fast map changes. Default
+# of the engine's preload flag; the benchmark, batch and headless demo engines never preload.
+PRELOAD_NEXT_MAP = True
+# Directory of the levels baked with baked_level.py. A baked level that is up to date with the WAD is
+# loaded instead of the map lumps; None always loads from the WAD.
+BAKED_LEVEL_DIR = './resources/baked'
+
+# Column decimation: the renderer draws every COLUMN_STEP-th column and widens them to fill the screen.
+COLUMN_STEP = 1
+# Adaptive resolution: adjust the column step between MIN_COLUMN_STEP and MAX_COLUMN_STEP to hold TARGET_FPS.
+ADAPTIVE_RESOLUTION = False
+TARGET_FPS = 60
+MIN_COLUMN_STEP = 1
+MAX_COLUMN_STEP = 4
+# Frames averaged per decision, the shares of the frame budget above which the step grows and below which
+# the finer step must be predicted to fit before it shrinks, and frames to wait after a change.
+RESOLUTION_WINDOW = 15
+RESOLUTION_UPPER = 0.95
+RESOLUTION_LOWER = 0.75
+RESOLUTION_COOLDOWN = 30
+
+# Automap (toggled with Tab): zoom levels, each AUTOMAP_ZOOM_STEP times the previous one from the level
+# fitting the whole map, and the level it opens at.
+AUTOMAP_ZOOM_LEVELS = 8
+AUTOMAP_ZOOM_STEP = 1.5
+AUTOMAP_ZOOM = 3
+# Size in pixels of the cached automap tiles and the number of tiles kept.
+AUTOMAP_TILE_SIZE = 512
+AUTOMAP_CACHE_TILES = 48
+# Most lines joined into one automap polyline.
+AUTOMAP_MAX_CHAIN = 32
+
+# Render server (render_server.py): default address, a Unix socket path or host:port for TCP, the zlib level
+# of compressed frames and the seconds between throughput reports.
+RENDER_SERVER_ADDRESS = './doom_render.sock'
+RENDER_SERVER_ZLIB_LEVEL = 1
+RENDER_SERVER_REPORT_INTERVAL = 5
+
+# Range in map units of hitscan traces (DOOM's MISSILERANGE).
+HITSCAN_RANGE = 2048
+
+# Frame reuse: a frame whose view (camera pose, column step and world state) has not changed since the last
+# render reuses the last framebuffer, and only the overlays are drawn again. While frames are reused the
+# game loop runs at no more than IDLE_MAX_FPS (0 for no limit); input is still read every frame.
+REUSE_UNCHANGED_FRAMES = True
+IDLE_MAX_FPS = TIC_RATE
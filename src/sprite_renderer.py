@@ -0,0 +1,234 @@
+import numpy as np
+import pygame as pg
+from settings import *
+from numba import njit
+from data_types import VisSprite
+from bsp import BSP
+
+# Sprite name prefixes of the map things that can be drawn, keyed by thing type, with the frame to draw
+# when it is not the first one ('A'): the corpses use the last frames of the player's death animations.
+# The frame is used either rotation independent ('A0') or facing the viewer ('A1').
+THING_SPRITES = {
+  5: 'BKEY', 6: 'YKEY', 9: 'SPOS', 10: 'PLAYW', 12: 'PLAYW', 13: 'RKEY', 15: 'PLAYN',
+  24: 'POL5', 34: 'CAND', 35: 'CBRA', 43: 'TRE1', 44: 'TBLU', 45: 'TGRN', 46: 'TRED',
+  48: 'ELEC', 54: 'TRE2', 55: 'SMBT', 56: 'SMGT', 57: 'SMRT', 58: 'SARG',
+  2001: 'SHOT', 2002: 'MGUN', 2003: 'LAUN', 2004: 'PLAS', 2005: 'CSAW', 2006: 'BFUG',
+  2007: 'CLIP', 2008: 'SHEL', 2010: 'ROCK', 2011: 'STIM', 2012: 'MEDI', 2013: 'SOUL',
+  2014: 'BON1', 2015: 'BON2', 2018: 'ARM1', 2019: 'ARM2', 2022: 'PINV', 2023: 'PSTR',
+  2024: 'PINS', 2025: 'SUIT', 2026: 'PMAP', 2028: 'COLU', 2035: 'BAR1', 2045: 'PVIS',
+  2046: 'BROK', 2047: 'CELL', 2048: 'AMMO', 2049: 'SBOX',
+  3001: 'TROO', 3002: 'SARG', 3003: 'BOSS', 3004: 'POSS', 3005: 'HEAD', 3006: 'SKUL',
+}
+
+# Thing flag marking things that only appear in multiplayer games
+THING_FLAG_MULTIPLAYER = 16
+
+# SpriteRenderer class, draws the things of the map as scaled sprite columns.
+# Things in the sub sectors visited by the BSP traversal are projected, sorted from far to near,
+# and clipped against the wall silhouettes that the SegHandler stored while drawing walls.
+# The projected things and the view direction of a frame are kept in the viewport being rendered.
+class SpriteRenderer:
+  def __init__(self, engine):
+    self.engine = engine  # Reference to the main engine
+    self.asset_data = engine.wad_data.asset_data  # Asset data holding the sprite patches
+
+    self.sprites = {}  # Decoded sprite data keyed by sprite name, shared by all maps
+    self.set_map()
+
+  # Take over the map and the segment handler of the engine, at start and after a map change
+  def set_map(self):
+    self.wad_data = self.engine.wad_data  # WAD data from the engine
+    self.seg_handler = self.engine.seg_handler  # Segment handler holding the drawn wall ranges
+    self.sub_sector_things = self.get_sub_sector_things()  # Drawable things keyed by sub sector id
+
+  # Reset the projected things of a viewport and cache its view direction for the new frame
+  @staticmethod
+  def update(view):
+    view.vis_sprites = []
+    angle = math.radians(view.camera.angle)
+    view.sin_a, view.cos_a = math.sin(angle), math.cos(angle)
+
+  # Group the drawable things by the sub sector they stand in. Each entry holds the thing position,
+  # its floor height, its sprite data and the light level of its sector
+  def get_sub_sector_things(self):
+    sub_sector_things = {}
+    for sub_sector_id, things in self.prepare(self.wad_data).items():
+      entries = [(pos, floor_height, sprite, light_level) for pos, floor_height, thing_type, light_level in things
+                 if (sprite := self.get_thing_sprite(thing_type))]
+      if entries:
+        sub_sector_things[sub_sector_id] = entries
+    return sub_sector_things
+
+  # The things of a map that can be drawn, grouped by sub sector id, as (position, floor height, thing type,
+  # light level) entries. Looking up the sprites is left to get_sub_sector_things
+  @staticmethod
+  def prepare(wad_data):
+    return wad_data.get_prepared('things', SpriteRenderer.group_things)
+
+  @staticmethod
+  def group_things(wad_data):
+    things = wad_data.geometry.things
+    thing_ids = np.flatnonzero(np.isin(things['type'], list(THING_SPRITES)) &
+                               ((things['flags'] & THING_FLAG_MULTIPLAYER) == 0))
+    xs, ys = things['x'][thing_ids].astype(np.float64), things['y'][thing_ids].astype(np.float64)
+    sub_sector_ids = BSP.get_sub_sector_ids(wad_data, xs, ys)
+    first_seg_ids = wad_data.geometry.sub_sectors['first_seg_id'][sub_sector_ids]
+
+    sub_sector_things = {}
+    for thing_id, sub_sector_id, first_seg_id in zip(thing_ids.tolist(), sub_sector_ids.tolist(), first_seg_ids.tolist()):
+      thing = wad_data.things[thing_id]
+      sector = wad_data.segments[first_seg_id].front_sector
+      entry = thing.pos, sector.floor_height, thing.type, sector.light_level
+      sub_sector_things.setdefault(sub_sector_id, []).append(entry)
+    return sub_sector_things
+
+  # Get the sprite data of a thing type or None if it has no known sprite
+  def get_thing_sprite(self, thing_type):
+    if not (prefix := THING_SPRITES.get(thing_type)):
+      return None
+    if len(prefix) == 4:
+      prefix += 'A'  # No frame given: the first one
+
+    for name in (prefix + '0', prefix + '1'):
+      if name in self.sprites:
+        return self.sprites[name]
+      if patch := self.asset_data.sprite_patches.get(name):
+        # Texture columns, opacity mask and the patch offsets used to place the sprite
+        image = patch.unscaled_image
+        sprite = (pg.surfarray.array3d(image), pg.surfarray.array_colorkey(image),
+                  patch.header.left_offset, patch.header.top_offset)
+        self.sprites[name] = sprite
+        return sprite
+    return None
+
+  # Project the things of a sub sector visited by the BSP traversal
+  def add_sub_sector_things(self, view, sub_sector_id):
+    if things := self.sub_sector_things.get(sub_sector_id):
+      for thing in things:
+        self.project_thing(view, *thing)
+
+  # Project a thing to the screen of a viewport and queue it for drawing if it is in front of the camera
+  # and on screen
+  def project_thing(self, view, pos, floor_height, sprite, light_level):
+    tex, mask, left_offset, top_offset = sprite
+    camera = view.camera
+
+    dx = pos.x - camera.pos.x
+    dy = pos.y - camera.pos.y
+
+    # Distance along the view direction and lateral offset (positive to the left)
+    depth = dx * view.cos_a + dy * view.sin_a
+    if depth < MIN_SPRITE_DEPTH:
+      return None
+    side = dy * view.cos_a - dx * view.sin_a
+
+    scale = view.screen_dist / depth
+    start_x = view.h_width - (side + left_offset) * scale
+    x1 = int(start_x)
+    x2 = int(start_x + len(tex) * scale) - 1
+    if x1 >= view.width or x2 < 0 or x2 < x1:
+      return None
+
+    # Sprites dim with their projection scale, like walls
+    scale_light = self.engine.light_tables.get_scale_light(light_level)
+
+    vis = VisSprite()
+    vis.x1, vis.x2 = max(x1, 0), min(x2, view.width - 1)
+    vis.start_x = start_x
+    vis.top_y = view.h_height - (floor_height + top_offset - camera.height) * scale
+    vis.scale = scale
+    vis.depth = depth
+    vis.pos = pos
+    vis.sprite = sprite
+    vis.light_level = scale_light[min(int(scale * view.light_scale_unit), MAX_LIGHT_SCALE - 1)]
+    view.vis_sprites.append(vis)
+
+  # Draw the projected things of a viewport from the farthest to the nearest
+  def draw(self, view):
+    for vis in sorted(view.vis_sprites, key=lambda v: v.scale):
+      self.draw_vis_sprite(view, vis)
+
+  # Clip a projected thing against the wall silhouettes in front of it and draw its visible columns.
+  # Things hidden behind walls over their whole screen range are skipped
+  def draw_vis_sprite(self, view, vis):
+    x1, x2 = vis.x1, vis.x2
+    height = view.height
+    clip_top = [-2] * (x2 - x1 + 1)
+    clip_bottom = [-2] * (x2 - x1 + 1)
+
+    # Later wall ranges are farther away and their silhouettes already include the nearer ones
+    for draw_seg in reversed(view.draw_segs):
+      if draw_seg.x1 > x2 or draw_seg.x2 < x1:
+        continue
+
+      scale_lo, scale_hi = sorted((draw_seg.scale1, draw_seg.scale2))
+      if scale_hi < vis.scale:
+        continue  # The wall is entirely behind the thing
+      if scale_lo < vis.scale and not self.is_behind_seg(vis.pos, draw_seg.seg):
+        continue  # The thing stands in front of the wall line
+
+      r1, r2 = max(draw_seg.x1, x1), min(draw_seg.x2, x2)
+      if draw_seg.top_clip is None:
+        for i in range(r1 - x1, r2 - x1 + 1):
+          if clip_top[i] == -2:
+            clip_top[i], clip_bottom[i] = height, -1
+      else:
+        offset = x1 - draw_seg.x1
+        for i in range(r1 - x1, r2 - x1 + 1):
+          if clip_top[i] == -2:
+            clip_top[i] = draw_seg.top_clip[i + offset]
+          if clip_bottom[i] == -2:
+            clip_bottom[i] = draw_seg.bottom_clip[i + offset]
+
+    visible = False
+    for i in range(x2 - x1 + 1):
+      if clip_top[i] == -2:
+        clip_top[i] = -1
+      if clip_bottom[i] == -2:
+        clip_bottom[i] = height
+      if clip_bottom[i] - clip_top[i] > 1:
+        visible = True
+
+    if not visible:
+      return None
+
+    tex, mask, _, _ = vis.sprite
+    self.draw_sprite_cols(view.framebuffer, tex, mask, x1, x2, vis.start_x, vis.top_y,
+                          1.0 / vis.scale, np.array(clip_top), np.array(clip_bottom),
+                          vis.light_level, view.column_step)
+
+  # Check if a point is behind a seg, i.e. on the side facing away from the viewer
+  def is_behind_seg(self, pos, seg_id):
+    segs = self.seg_handler.segs
+    x1, y1, x2, y2 = segs.start_x[seg_id], segs.start_y[seg_id], segs.end_x[seg_id], segs.end_y[seg_id]
+    return (pos.x - x1) * (y2 - y1) - (pos.y - y1) * (x2 - x1) <= 0
+
+  @staticmethod
+  @njit(nogil=True, cache=True)
+  def draw_sprite_cols(framebuffer, tex, mask, x1, x2, start_x, top_y, inv_scale,
+                       clip_top, clip_bottom, light_level, col_step):
+    # This method draws the columns x1..x2 of a sprite scaled by 1 / inv_scale, skipping transparent texels
+    # and the rows outside each column's clip range. With column decimation only the columns the walls
+    # are drawn at (every col_step-th one) are drawn; the others are filled in by expand_columns.
+    # Returns the number of pixels written.
+
+    tex_w, tex_h = tex.shape[0], tex.shape[1]
+    bottom_y = top_y + tex_h / inv_scale
+    pixels = 0
+
+    for x in range(x1 + (-x1) % col_step, x2 + 1, col_step):
+      tex_col = int((x - start_x) * inv_scale)
+      if tex_col < 0 or tex_col >= tex_w:
+        continue
+
+      i = x - x1
+      y1 = max(int(top_y), clip_top[i] + 1)
+      y2 = min(int(bottom_y), clip_bottom[i] - 1)
+
+      for iy in range(y1, y2 + 1):
+        tex_y = int((iy - top_y) * inv_scale)
+        if 0 <= tex_y < tex_h and mask[tex_col, tex_y]:
+          col = tex[tex_col, tex_y]
+          framebuffer[x, iy] = col[0] * light_level, col[1] * light_level, col[2] * light_level
+          pixels += 1
+    return pixels
@@ -0,0 +1,62 @@
+import time
+import threading
+from contextlib import contextmanager
+
+# StartupProfiler class, breaks the time from process start to the first presented frame into phases.
+# The loaders record their phases on the module level instance, so the report covers the work done
+# before an engine exists (imports, WAD loading) as well as the engine start itself. Only the thread
+# that imported this module is profiled: maps preloaded on a background thread are not part of startup.
+class StartupProfiler:
+  # Phases in the order they run, reported even when they took no time
+  PHASES = ('imports', 'wad_directory', 'map_lumps', 'asset_decoding', 'subsystems', 'jit_compile')
+
+  def __init__(self):
+    self.start = time.perf_counter()  # Reference time, the import of this module
+    self.thread = threading.current_thread()  # Thread whose phases are recorded
+    self.phase_times = dict.fromkeys(self.PHASES, 0.0)  # Seconds spent per phase
+    self.first_frame_time = None  # Seconds from the reference time to the first presented frame
+    self.deferred = {}  # Number of assets decoded on first use instead of at startup, by kind
+
+  @contextmanager
+  def phase(self, name):
+    # Time a block of work and add it to the phase
+    start = time.perf_counter()
+    try:
+      yield
+    finally:
+      self.add(name, time.perf_counter() - start)
+
+  def add(self, name, seconds):
+    if threading.current_thread() is not self.thread:
+      return None
+    self.phase_times[name] = self.phase_times.get(name, 0.0) + seconds
+
+  def count_deferred(self, kind, count):
+    self.deferred[kind] = self.deferred.get(kind, 0) + count
+
+  def mark_first_frame(self):
+    # Record the first presented frame; later calls are ignored
+    if self.first_frame_time is None:
+      self.first_frame_time = time.perf_counter() - self.start
+
+  def get_report(self):
+    # Phase times and the time to first frame in milliseconds
+    phases_ms = {name: t * 1000 for name, t in self.phase_times.items()}
+    return {
+      'phases_ms': phases_ms,
+      'total_ms': sum(phases_ms.values()),
+      'first_frame_ms': None if self.first_frame_time is None else self.first_frame_time * 1000,
+      'deferred': dict(self.deferred),
+    }
+
+  def format_report(self):
+    report = self.get_report()
+    lines = [f'{name:<15}{t:9.1f} ms' for name, t in report['phases_ms'].items()]
+    lines.append(f"{'total':<15}{report['total_ms']:9.1f} ms")
+    if report['first_frame_ms'] is not None:
+      lines.append(f"{'first frame':<15}{report['first_frame_ms']:9.1f} ms")
+    lines += [f'deferred {kind}: {count}' for kind, count in report['deferred'].items()]
+    return '\n'.join(lines)
+
+# Startup profile of this process
+startup_profiler = StartupProfiler()
@@ -0,0 +1,344 @@
+import os
+import sys
+import json
+import math
+import struct
+import random
+import argparse
+import tempfile
+import subprocess
+
+# Procedural WAD files for tests and benchmarks that do not need the DOOM1.WAD.
+# A map is a grid of square rooms, each its own sector and sub sector, with random floor and ceiling
+# heights, flats, sky ceilings and a barrel in every room but the player start. The BSP splits the
+# grid along the cell boundaries, so no seg ever straddles a partition line.
+
+CELL_SIZE = 256  # Side of a room in map units
+WALL_TEXTURES = ('WALL0', 'WALL1', 'WALL2', 'WALL3')
+FLATS = ('FLOOR0', 'FLOOR1', 'FLOOR2', 'FLOOR3')
+SKY_FLAT = 'F_SKY1'
+SKY_TEXTURE = 'SKY1'
+
+# Map format limits: vertex and seg ids are signed 16 bit, sub sector ids are flagged with 0x8000
+MAX_MAP_UNITS = 32767
+MAX_SEGS = 32767
+
+# Linedef flags and thing types used by the generated maps
+LINEDEF_BLOCKING = 1
+LINEDEF_TWO_SIDED = 4
+THING_PLAYER_START = 1
+THING_BARREL = 2035
+THING_ALL_SKILLS = 7
+
+# WADWriter class, collects lumps and writes them as a WAD file (the layout WADReader reads):
+# a 12 byte header, the lump data and a directory of 16 byte entries
+class WADWriter:
+  def __init__(self, wad_type='IWAD'):
+    self.wad_type = wad_type
+    self.lumps = []  # (name, data) in directory order
+
+  @staticmethod
+  def pack_name(name):
+    # Lump and texture names are 8 bytes, zero padded
+    return name.encode('ascii')[:8].ljust(8, b'\0')
+
+  def add_lump(self, name, data=b''):
+    self.lumps.append((name, bytes(data)))
+
+  def add_marker(self, name):
+    self.add_lump(name)
+
+  def write(self, path):
+    data = bytearray()
+    directory = bytearray()
+    offset = 12
+    for name, lump_data in self.lumps:
+      directory += struct.pack('<ii', offset, len(lump_data)) + self.pack_name(name)
+      data += lump_data
+      offset += len(lump_data)
+
+    with open(path, 'wb') as f:
+      f.write(self.wad_type.encode('ascii') + struct.pack('<ii', len(self.lumps), offset))
+      f.write(data)
+      f.write(directory)
+
+# Generate the 14 palettes of PLAYPAL. The colors are spread over the RGB cube so neighbouring
+# indices stay distinguishable in the rendered images
+def make_palettes():
+  palette = bytearray()
+  for i in range(256):
+    palette += bytes(((i * 37) % 256, (i * 91) % 256, (i * 53) % 256))
+  return bytes(palette) * 14
+
+# Generate a checkered patch in DOOM's column format. Transparent patches leave a triangle of each
+# column empty, like the sprites
+def make_patch(width, height, seed, transparent=False):
+  base = random.Random(seed).randrange(1, 240)
+  columns = []
+  for x in range(width):
+    top = abs(width // 2 - x) if transparent else 0
+    column = bytearray()
+
+    # Posts hold at most 128 texels here, well below the 255 of the format
+    y = top
+    while y < height:
+      length = min(height - y, 128)
+      texels = bytes((base + ((x // 8 + v // 8) % 2) * 8 + v % 4) % 256 for v in range(y, y + length))
+      column += bytes((min(y, 254), length, 0)) + texels + b'\0'
+      y += length
+    column += b'\xff'
+    columns.append(bytes(column))
+
+  header = struct.pack('<HHhh', width, height, width // 2, height - 4)
+  column_offsets = []
+  offset = len(header) + 4 * width
+  for column in columns:
+    column_offsets.append(struct.pack('<I', offset))
+    offset += len(column)
+  return header + b''.join(column_offsets) + b''.join(columns)
+
+# Generate a checkered 64 x 64 flat
+def make_flat(seed):
+  base = random.Random(seed).randrange(1, 240)
+  return bytes((base + ((x // 8 + y // 8) % 2) * 12) % 256 for y in range(64) for x in range(64))
+
+# Generate the TEXTURE1 lump, one single patch texture per patch name
+def make_texture_lump(patch_sizes):
+  definitions = []
+  for p_name_index, (name, (width, height)) in enumerate(patch_sizes.items()):
+    definitions.append(
+      WADWriter.pack_name(name) + struct.pack('<IHHIH', 0, width, height, 0, 1) +
+      struct.pack('<hhHHH', 0, 0, p_name_index, 1, 0)
+    )
+
+  lump = bytearray(struct.pack('<i', len(definitions)))
+  offset = 4 + 4 * len(definitions)
+  for definition in definitions:
+    lump += struct.pack('<i', offset)
+    offset += len(definition)
+  return bytes(lump) + b''.join(definitions)
+
+# SyntheticMap class, a grid of rooms with its linedefs, sidedefs, segs, sub sectors and BSP nodes
+class SyntheticMap:
+  def __init__(self, cols, rows, seed=1, sky_ratio=0.3):
+    if max(cols, rows) * CELL_SIZE > MAX_MAP_UNITS:
+      raise ValueError(f'map of {cols} x {rows} rooms exceeds {MAX_MAP_UNITS} map units')
+    if 4 * cols * rows > MAX_SEGS:
+      raise ValueError(f'map of {cols} x {rows} rooms exceeds {MAX_SEGS} segs')
+
+    self.cols, self.rows = cols, rows
+    self.rnd = random.Random(seed)
+    self.sky_ratio = sky_ratio  # Share of the rooms open to the sky
+
+    self.vertexes = [(i * CELL_SIZE, j * CELL_SIZE) for j in range(rows + 1) for i in range(cols + 1)]
+    self.sectors = [self.make_sector() for _ in range(cols * rows)]
+    self.linedefs, self.sidedefs = [], []
+    self.room_segs = [[] for _ in range(cols * rows)]  # (v1, v2, linedef id, direction) per room
+    self.add_walls()
+    self.segs, self.sub_sectors = self.get_segs()
+    self.nodes = []
+    self.split(0, cols, 0, rows)
+    self.things = self.get_things()
+
+  def get_vertex_id(self, i, j):
+    return j * (self.cols + 1) + i
+
+  def get_room_id(self, i, j):
+    return j * self.cols + i
+
+  def make_sector(self):
+    rnd = self.rnd
+    floor_height = rnd.randrange(0, 6) * 8
+    ceil_height = floor_height + 128 + rnd.randrange(0, 5) * 16
+    sky = rnd.random() < self.sky_ratio
+    floor_texture = rnd.choice(FLATS)
+    ceil_texture = SKY_FLAT if sky else rnd.choice(FLATS)
+    light_level = rnd.randrange(128, 256)
+    return floor_height, ceil_height, floor_texture, ceil_texture, light_level, 0, 0
+
+  # Add a wall between v1 and v2 with the front room on its right. Walls between two rooms are two
+  # sided and get a seg in both rooms
+  def add_line(self, v1, v2, front, back):
+    texture = self.rnd.choice(WALL_TEXTURES)
+    if back is None:
+      self.sidedefs.append((0, 0, '-', '-', texture, front))
+      front_sidedef, back_sidedef, flags = len(self.sidedefs) - 1, 0xFFFF, LINEDEF_BLOCKING
+    else:
+      self.sidedefs.append((0, 0, texture, texture, '-', front))
+      self.sidedefs.append((0, 0, texture, texture, '-', back))
+      front_sidedef, back_sidedef, flags = len(self.sidedefs) - 2, len(self.sidedefs) - 1, LINEDEF_TWO_SIDED
+
+    self.linedefs.append((v1, v2, flags, 0, 0, front_sidedef, back_sidedef))
+    linedef_id = len(self.linedefs) - 1
+    self.room_segs[front].append((v1, v2, linedef_id, 0))
+    if back is not None:
+      self.room_segs[back].append((v2, v1, linedef_id, 1))
+
+  def add_walls(self):
+    vertex, room = self.get_vertex_id, self.get_room_id
+    cols, rows = self.cols, self.rows
+
+    # Vertical walls point up (+y), their front room is on the +x side
+    for j in range(rows):
+      for i in range(cols + 1):
+        if i == cols:
+          self.add_line(vertex(i, j + 1), vertex(i, j), room(i - 1, j), None)
+        else:
+          self.add_line(vertex(i, j), vertex(i, j + 1), room(i, j), room(i - 1, j) if i else None)
+
+    # Horizontal walls point left (-x), their front room is on the +y side
+    for j in range(rows + 1):
+      for i in range(cols):
+        if j == rows:
+          self.add_line(vertex(i, j), vertex(i + 1, j), room(i, j - 1), None)
+        else:
+          self.add_line(vertex(i + 1, j), vertex(i, j), room(i, j), room(i, j - 1) if j else None)
+
+  # One sub sector per room holding the segs of its walls
+  def get_segs(self):
+    segs, sub_sectors = [], []
+    for room_segs in self.room_segs:
+      first_seg_id = len(segs)
+      for v1, v2, linedef_id, direction in room_segs:
+        (x1, y1), (x2, y2) = self.vertexes[v1], self.vertexes[v2]
+        angle = round(math.degrees(math.atan2(y2 - y1, x2 - x1)) / 360 * 65536)
+        angle = (angle + 32768) % 65536 - 32768  # Binary angle as a signed 16 bit value
+        segs.append((v1, v2, angle, linedef_id, direction, 0))
+      sub_sectors.append((len(segs) - first_seg_id, first_seg_id))
+    return segs, sub_sectors
+
+  @staticmethod
+  def get_bbox(i0, i1, j0, j1):
+    # Node bounding box: top, bottom, left, right
+    return j1 * CELL_SIZE, j0 * CELL_SIZE, i0 * CELL_SIZE, i1 * CELL_SIZE
+
+  # Build the BSP of the rooms i0..i1 x j0..j1 by halving the longer side; returns the child id
+  def split(self, i0, i1, j0, j1):
+    if i1 - i0 == 1 and j1 - j0 == 1:
+      return 0x8000 | self.get_room_id(i0, j0)
+
+    if i1 - i0 >= j1 - j0:
+      im = (i0 + i1) // 2
+      front, back = self.split(im, i1, j0, j1), self.split(i0, im, j0, j1)
+      partition = im * CELL_SIZE, j0 * CELL_SIZE, 0, (j1 - j0) * CELL_SIZE
+      bboxes = self.get_bbox(im, i1, j0, j1) + self.get_bbox(i0, im, j0, j1)
+    else:
+      jm = (j0 + j1) // 2
+      front, back = self.split(i0, i1, jm, j1), self.split(i0, i1, j0, jm)
+      partition = i1 * CELL_SIZE, jm * CELL_SIZE, -(i1 - i0) * CELL_SIZE, 0
+      bboxes = self.get_bbox(i0, i1, jm, j1) + self.get_bbox(i0, i1, j0, jm)
+
+    self.nodes.append(partition + bboxes + (front, back))
+    return len(self.nodes) - 1
+
+  # The player starts in the first room, every other room holds a barrel
+  def get_things(self):
+    half = CELL_SIZE // 2
+    things = [(half, half, 0, THING_PLAYER_START, THING_ALL_SKILLS)]
+    for room_id in range(1, self.cols * self.rows):
+      i, j = room_id % self.cols, room_id // self.cols
+      things.append((i * CELL_SIZE + half, j * CELL_SIZE + half, 0, THING_BARREL, THING_ALL_SKILLS))
+    return things
+
+  # Add the map marker and lumps in the order WADData expects them
+  def add_lumps(self, writer, map_name):
+    name = writer.pack_name
+    writer.add_marker(map_name)
+    writer.add_lump('THINGS', b''.join(struct.pack('<hhHHH', *thing) for thing in self.things))
+    writer.add_lump('LINEDEFS', b''.join(struct.pack('<HHHHHHH', *linedef) for linedef in self.linedefs))
+    writer.add_lump('SIDEDEFS', b''.join(
+      struct.pack('<hh', x, y) + name(upper) + name(lower) + name(middle) + struct.pack('<H', sector_id)
+      for x, y, upper, lower, middle, sector_id in self.sidedefs
+    ))
+    writer.add_lump('VERTEXES', b''.join(struct.pack('<hh', *vertex) for vertex in self.vertexes))
+    writer.add_lump('SEGS', b''.join(struct.pack('<hhhhhh', *seg) for seg in self.segs))
+    writer.add_lump('SSECTORS', b''.join(struct.pack('<hh', *sub_sector) for sub_sector in self.sub_sectors))
+    writer.add_lump('NODES', b''.join(struct.pack('<12h2H', *node) for node in self.nodes))
+    writer.add_lump('SECTORS', b''.join(
+      struct.pack('<hh', floor, ceil) + name(floor_tex) + name(ceil_tex) + struct.pack('<HHH', light, kind, tag)
+      for floor, ceil, floor_tex, ceil_tex, light, kind, tag in self.sectors
+    ))
+    writer.add_lump('REJECT')
+    writer.add_lump('BLOCKMAP')
+
+# Write a WAD file with `maps` grid maps (E1M1, E1M2, ...) of cols x rows rooms and the placeholder
+# palettes, patches, textures, sprites and flats they use
+def write_synthetic_wad(path, cols=4, rows=4, seed=1, maps=1):
+  writer = WADWriter()
+  writer.add_lump('PLAYPAL', make_palettes())
+  for map_number in range(1, maps + 1):
+    SyntheticMap(cols, rows, seed=seed + map_number - 1).add_lumps(writer, f'E1M{map_number}')
+
+  patch_sizes = {name: (64, 128) for name in WALL_TEXTURES}
+  patch_sizes[SKY_TEXTURE] = 256, 128
+  writer.add_lump('TEXTURE1', make_texture_lump(patch_sizes))
+  writer.add_lump('PNAMES', struct.pack('<i', len(patch_sizes)) +
+                  b''.join(writer.pack_name(name) for name in patch_sizes))
+  writer.add_marker('P_START')
+  for i, (name, (width, height)) in enumerate(patch_sizes.items()):
+    writer.add_lump(name, make_patch(width, height, seed + i))
+  writer.add_marker('P_END')
+
+  # The weapon sprite drawn by the view renderer and the barrel sprite
+  writer.add_marker('S_START')
+  writer.add_lump('SHTGA0', make_patch(40, 30, seed + 100, transparent=True))
+  writer.add_lump('BAR1A0', make_patch(24, 32, seed + 101, transparent=True))
+  writer.add_marker('S_END')
+
+  writer.add_marker('F_START')
+  for i, name in enumerate(FLATS + (SKY_FLAT,)):
+    writer.add_lump(name, make_flat(seed + 200 + i))
+  writer.add_marker('F_END')
+
+  writer.write(path)
+  return path
+
+# Run the headless benchmark on generated maps of growing size, each in a fresh process so the
+# startup times include a cold load. Returns one report per size
+def benchmark_sizes(sizes, frames, seed=1):
+  benchmark_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmark.py')
+  env = {**os.environ, 'SDL_VIDEODRIVER': 'dummy', 'PYGAME_HIDE_SUPPORT_PROMPT': '1'}
+  reports = []
+  with tempfile.TemporaryDirectory() as tmp_dir:
+    for size in sizes:
+      wad_path = write_synthetic_wad(os.path.join(tmp_dir, f'grid{size}.wad'), size, size, seed=seed)
+      result = subprocess.run(
+        [sys.executable, benchmark_path, '--wad', wad_path, '--frames', str(frames), '--no-present'],
+        env=env, capture_output=True, text=True, check=True
+      )
+      report = json.loads(result.stdout)
+      reports.append({
+        'rooms': size * size,
+        'segs': 4 * size * size,
+        'startup_ms': report['startup']['phases_ms'],
+        'first_frame_ms': report['startup']['first_frame_ms'],
+        'frame_ms': report['frame_ms'],
+      })
+  return reports
+
+def main(argv=None):
+  parser = argparse.ArgumentParser(description='Generate procedural WAD files for tests and benchmarks.')
+  subparsers = parser.add_subparsers(dest='command', required=True)
+
+  write_parser = subparsers.add_parser('write', help='write a WAD file')
+  write_parser.add_argument('path', help='output WAD file')
+  write_parser.add_argument('--cols', type=int, default=4, help='rooms along x')
+  write_parser.add_argument('--rows', type=int, default=4, help='rooms along y')
+  write_parser.add_argument('--maps', type=int, default=1, help='number of maps (E1M1, E1M2, ...)')
+  write_parser.add_argument('--seed', type=int, default=1, help='random seed')
+
+  bench_parser = subparsers.add_parser('bench', help='benchmark load and frame time against map size')
+  bench_parser.add_argument('--sizes', type=int, nargs='+', default=[4, 8, 16, 32],
+                            help='rooms per side of the generated maps')
+  bench_parser.add_argument('--frames', type=int, default=50, help='measured frames per map')
+  bench_parser.add_argument('--seed', type=int, default=1, help='random seed')
+  args = parser.parse_args(argv)
+
+  if args.command == 'write':
+    write_synthetic_wad(args.path, args.cols, args.rows, seed=args.seed, maps=args.maps)
+  else:
+    json.dump(benchmark_sizes(args.sizes, args.frames, seed=args.seed), sys.stdout, indent=2)
+    print()
+
+if __name__ == '__main__':
+  main()
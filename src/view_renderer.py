@@ -1,9 +1,11 @@
+import numpy as np
 import pygame as pg
 import pygame.gfxdraw as gfx
 import random
 from settings import *
 from random import randrange as rnd
 from numba import njit
+from asset_data import NO_TEXTURE
 
 class ViewRenderer:
   def __init__(self, engine):
@@ -14,16 +16,22 @@ class ViewRenderer:
     self.palette = engine.wad_data.asset_data.palette
     self.sprites = self.asset_data.sprites
     self.textures = self.asset_data.textures
-    self.player = engine.player
+    self.atlas = self.asset_data.atlas
     self.screen = engine.screen
-    self.framebuffer = engine.framebuffer
-    self.x_to_angle = self.engine.seg_handler.x_to_angle
+    self.light_tables = engine.light_tables
     self.colors = {}
 
     self.sky_id = self.asset_data.sky_id
     self.sky_tex = self.asset_data.sky_tex
-    self.sky_inv_scale = 160 / HEIGHT
     self.sky_tex_alt = 100
+    self.sky_renderers = {}  # Sky column caches keyed by the height of the views they are drawn in
+
+  def get_sky_renderer(self, height):
+    # The sky is scaled to the height of the view it is drawn in (160 texture rows over the view)
+    if not (sky_renderer := self.sky_renderers.get(height)):
+      sky_renderer = SkyRenderer(self.sky_tex, self.sky_tex_alt, 160 / height, height)
+      self.sky_renderers[height] = sky_renderer
+    return sky_renderer
 
   def draw_sprite(self):
     # This method draws a specific sprite image ('SHTGA0') onto the screen at a specific location.
@@ -32,6 +40,17 @@ class ViewRenderer:
     pos = (H_WIDTH - img.get_width() // 2, HEIGHT - img.get_height())
     self.screen.blit(img, pos)
 
+  @staticmethod
+  def expand_columns(view):
+    # With column decimation only every col_step-th column of a view has been drawn. Copy each drawn
+    # column over the col_step - 1 columns to its right.
+
+    framebuffer, col_step = view.framebuffer, view.column_step
+    drawn = framebuffer[::col_step]
+    for i in range(1, col_step):
+      skipped = framebuffer[i::col_step]
+      skipped[:] = drawn[:len(skipped)]
+
   def draw_palette(self):
     # This method draws the color palette onto the screen. The palette consists of 16x16 colors,
     # each color box of size 'size'. It's useful for debugging.
@@ -56,54 +75,60 @@ class ViewRenderer:
       self.colors[tex + str_light] = color
     return self.colors[tex + str_light]
 
-  def draw_vline(self, x, y1, y2, tex, light):
-    # This method draws a vertical line (column) from (x, y1) to (x, y2) with a color associated with
-    # the texture 'tex' and light level 'light'.
+  def draw_vline(self, view, x, y1, y2, tex, light):
+    # This method draws a vertical line (column) of a view from (x, y1) to (x, y2) with a color associated
+    # with the texture 'tex' and light level 'light'.
 
     if y1 < y2:
       color = self.get_color(tex, light)
-      self.draw_column(self.framebuffer, x, y1, y2, color)
+      self.draw_column(view.framebuffer, x, y1, y2, color)
 
   @staticmethod
-  @njit
+  @njit(nogil=True, cache=True)
   def draw_column(framebuffer, x, y1, y2, color):
     # This method draws a column on the framebuffer from (x, y1) to (x, y2) with a given color.
     # The '@staticmethod' and '@njit' decorators mean that the method does not depend on any instance
     # variables and can be compiled just-in-time (JIT) by Numba for faster execution, respectively.
+    # 'nogil' lets the frame presenter thread run while the kernels are drawing, and 'cache' stores
+    # the compiled code on disk so later runs skip the compilation.
 
     for iy in range(y1, y2 + 1):
       framebuffer[x, iy] = color
 
-  def draw_flat(self, tex_id, light_level, x, y1, y2, world_z):
+  def draw_flat(self, view, tex_id, light_level, x, y1, y2, world_z):
     # This method draws a flat surface (floor or ceiling) between two y-coordinates (y1 and y2) at
-    # a given x-coordinate. The surface is textured with a texture 'tex_id' and lit with a light level.
+    # a given x-coordinate of a view. The surface is textured with the atlas texture 'tex_id', or is the sky,
+    # and lit with a light level. A flat missing from the WAD (NO_TEXTURE) is not drawn, like a missing wall
+    # texture.
 
-    if y1 < y2:
+    if y1 < y2 and tex_id != NO_TEXTURE:
+        camera = view.camera
         if tex_id == self.sky_id:
-          tex_column = 2.2 * (self.player.angle + self.engine.seg_handler.x_to_angle[x])
-
-          self.draw_wall_col(self.framebuffer, self.sky_tex, tex_column, x, y1, y2,
-                                 self.sky_tex_alt, self.sky_inv_scale, light_level=1.0)
+          tex_column = 2.2 * (camera.angle + view.x_to_angle[x])
+          self.get_sky_renderer(view.height).draw_col(view.framebuffer, tex_column, x, y1, y2)
         else:
-          flat_tex = self.textures[tex_id]
+          z_light = self.light_tables.get_z_light(light_level)
 
-          self.draw_flat_col(self.framebuffer, flat_tex,
-                          x, y1, y2, light_level, world_z,
-                          self.player.angle, self.player.pos.x, self.player.pos.y)
+          self.draw_flat_col(view.framebuffer, self.atlas.texels, self.atlas.info, tex_id,
+                          x, y1, y2, z_light, world_z,
+                          camera.angle, camera.pos.x, camera.pos.y, view.width, view.h_height)
 
   @staticmethod
-  @njit(fastmath=True)
-  def draw_flat_col(screen, flat_tex, x, y1, y2, light_level, world_z,
-                    player_angle, player_x, player_y):
-    # This method draws a column of a flat surface on the screen from (x, y1) to (x, y2) with a
-    # given light level. The surface has a texture 'flat_tex', and is at a world z-coordinate 'world_z'.
-    # The player's position and angle are used for texture mapping.
-
+  @njit(fastmath=True, nogil=True, cache=True)
+  def draw_flat_col(screen, texels, tex_info, flat_id, x, y1, y2, z_light, world_z,
+                    player_angle, player_x, player_y, width, h_height):
+    # This method draws a column of a flat surface on the screen from (x, y1) to (x, y2). The surface
+    # has the atlas texture 'flat_id', and is at a world z-coordinate 'world_z'. Each row is lit from the
+    # sector's light table 'z_light', indexed by the row's distance.
+    # The player's (camera's) position and angle and the size of the view are used for texture mapping.
+
+      h_width = width // 2
       player_dir_x = math.cos(math.radians(player_angle))
       player_dir_y = math.sin(math.radians(player_angle))
+      offset, tex_h = tex_info[flat_id, 0], tex_info[flat_id, 2]
 
       for iy in range(y1, y2 + 1):
-          z = H_WIDTH * world_z / (H_HEIGHT - iy)
+          z = h_width * world_z / (h_height - iy)
 
           px = player_dir_x * z + player_x
           py = player_dir_y * z + player_y
@@ -113,30 +138,55 @@ class ViewRenderer:
           right_x = player_dir_y * z + px
           right_y = -player_dir_x * z + py
 
-          dx = (right_x - left_x) / WIDTH
-          dy = (right_y - left_y) / WIDTH
+          dx = (right_x - left_x) / width
+          dy = (right_y - left_y) / width
 
           tx = int(left_x + dx * x) & 63
           ty = int(left_y + dy * x) & 63
 
-          col = flat_tex[tx, ty]
+          light_level = z_light[min(max(int(z) >> LIGHT_Z_SHIFT, 0), MAX_LIGHT_Z - 1)]
+          col = texels[offset + tx * tex_h + ty]
           col = col[0] * light_level, col[1] * light_level, col[2] * light_level
           screen[x, iy] = col
 
   @staticmethod
-  @njit(fastmath=True)
-  def draw_wall_col(framebuffer, tex, tex_col, x, y1, y2, tex_alt, inv_scale, light_level):
+  @njit(fastmath=True, nogil=True, cache=True)
+  def draw_wall_col(framebuffer, texels, tex_info, tex_id, tex_col, x, y1, y2, tex_alt, inv_scale,
+                    light_level, h_height):
     # This method draws a column of a wall on the framebuffer from (x, y1) to (x, y2) with a
-    # given light level. The wall has a texture 'tex' and is at a texture column 'tex_col'.
-    # The texture altitude 'tex_alt' and inverse scale 'inv_scale' are used for texture mapping.
+    # given light level. The wall has the atlas texture 'tex_id' and is at a texture column 'tex_col'.
+    # The texture altitude 'tex_alt', inverse scale 'inv_scale' and the view's half height 'h_height'
+    # are used for texture mapping.
 
       if y1 < y2:
-          tex_w, tex_h = len(tex), len(tex[0])
-          tex_col = int(tex_col) % tex_w
-          tex_y = tex_alt + (float(y1) - H_HEIGHT) * inv_scale
+          offset, tex_w, tex_h = tex_info[tex_id, 0], tex_info[tex_id, 1], tex_info[tex_id, 2]
+          column = offset + (int(tex_col) % tex_w) * tex_h
+          tex_y = tex_alt + (float(y1) - h_height) * inv_scale
 
           for iy in range(y1, y2 + 1):
-              col = tex[tex_col, int(tex_y) % tex_h]
+              col = texels[column + int(tex_y) % tex_h]
               col = col[0] * light_level, col[1] * light_level, col[2] * light_level
               framebuffer[x, iy] = col
               tex_y += inv_scale
+
+
+class SkyRenderer:
+  def __init__(self, sky_tex, sky_tex_alt, sky_inv_scale, height=HEIGHT):
+    # The sky is drawn at a constant altitude and scale, so every screen row always samples the same
+    # texture row. The texture is resampled once to the view height and a sky span becomes a slice copy.
+
+    self.columns = self.get_sky_columns(sky_tex, sky_tex_alt, sky_inv_scale, height)
+    self.width = len(self.columns)
+
+  @staticmethod
+  def get_sky_columns(sky_tex, sky_tex_alt, sky_inv_scale, height):
+    # This method builds the sky texture columns scaled to the view height, one row per view row.
+
+    tex_h = sky_tex.shape[1]
+    tex_rows = (sky_tex_alt + (np.arange(height) - height // 2) * sky_inv_scale).astype(int) % tex_h
+    return np.ascontiguousarray(sky_tex[:, tex_rows])
+
+  def draw_col(self, framebuffer, tex_column, x, y1, y2):
+    # This method copies the rows y1..y2 of the sky column 'tex_column' to the framebuffer column x.
+
+    framebuffer[x, y1: y2 + 1] = self.columns[int(tex_column) % self.width, y1: y2 + 1]
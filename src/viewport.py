@@ -0,0 +1,66 @@
+import numpy as np
+import pygame as pg
+from settings import *
+
+# Camera class, a viewpoint the renderers can draw from in place of the player: a position, a view
+# angle and an eye height
+class Camera:
+  __slots__ = ['pos', 'angle', 'height']
+
+  def __init__(self, x, y, angle, height):
+    self.pos = vec2(x, y)
+    self.angle = float(angle)
+    self.height = float(height)
+
+  # Camera at (x, y); without an explicit eye height it stands at eye height on the floor below it
+  @classmethod
+  def at(cls, bsp, x, y, angle, height=None):
+    if height is None:
+      height = bsp.get_floor_height(vec2(x, y)) + PLAYER_HEIGHT
+    return cls(x, y, angle, height)
+
+# Viewport class, the state of one rendered view: its camera, the framebuffer it is rendered into, its
+# column step, the screen rectangle it is presented in and the projection of that rectangle. The level,
+# the assets and the renderers are shared by all views; the renderers are given the viewport to draw
+# (see DoomEngine.render_view) and keep the clipping state of a frame in it, so every view is rendered
+# on its own. Views are rendered at the size of their rectangle.
+class Viewport:
+  def __init__(self, camera, rect=(0, 0, WIDTH, HEIGHT), column_step=COLUMN_STEP, framebuffer=None):
+    self.camera = camera  # Camera, or any object with pos, angle and height (e.g. the player)
+    self.rect = pg.Rect(rect)  # Screen rectangle the view is presented in
+    self.column_step = column_step  # Column step the view is rendered with
+    self.width, self.height = self.rect.size  # Size the view is rendered at
+    if framebuffer is None:
+      framebuffer = np.zeros((self.width, self.height, 3), dtype=np.uint8)
+    self.framebuffer = framebuffer
+    self.surface = None  # Last rendered view, presented in the rectangle
+    self.view_key = None  # What the last rendered view shows (see DoomEngine.get_view_key)
+
+    # Projection of the view: a horizontal field of view of FOV degrees over the width of the view
+    self.h_width, self.h_height = self.width // 2, self.height // 2
+    self.screen_dist = self.h_width / math.tan(math.radians(H_FOV))
+    self.x_to_angle = self.get_x_to_angle_table()
+    self.light_scale_unit = 16 * (DOOM_W / 2) / self.screen_dist  # Projection scale of a light scale entry
+
+    # Clipping state of the frame being rendered, reset by the renderers at the start of every frame
+    self.upper_clip, self.lower_clip = [], []  # Clip heights of the floor and ceiling per column
+    self.screen_range: set = None  # Columns not yet covered by a solid wall
+    self.draw_segs = []  # Wall ranges drawn, to clip the sprites against
+    self.vis_sprites = []  # Things projected
+    self.sin_a, self.cos_a = 0.0, 1.0  # View direction
+    self.is_traverse_bsp = True  # The BSP traversal goes on until the screen range is covered
+    self.seg = None  # Seg being drawn and the angle of its first vertex
+    self.rw_angle1 = None
+
+  def get_x_to_angle_table(self):
+    # View angle of every column from the center of the view
+    return [math.degrees(math.atan((self.h_width - i) / self.screen_dist)) for i in range(self.width + 1)]
+
+  # Turn the last rendered view into the surface that is presented. A new surface is made every time,
+  # so a frame still being presented is not affected
+  def update_surface(self):
+    self.surface = pg.surfarray.make_surface(self.framebuffer)
+
+  def present(self, screen):
+    if self.surface is not None:
+      screen.blit(self.surface, self.rect)
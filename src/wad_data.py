@@ -1,5 +1,10 @@
+from pygame.math import Vector2 as vec2
+from data_types import Thing, SubSector, Node
 from wad_reader import WADReader
 from asset_data import AssetData
+from geometry_store import GeometryStore, LazyRecords
+from settings import LAZY_ASSETS
+from startup_profiler import startup_profiler
 
 class WADData:
   # This class is responsible for loading and managing data from the WAD file.
@@ -15,46 +20,45 @@ class WADData:
     'DONT_PEG_BOTTOM': 16, 'SECRET': 32, 'SOUND_BLOCK': 64, 'DONT_DRAW': 128, 'MAPPED': 256
   }
 
-  def __init__(self, engine, map_name):
+  def __init__(self, engine, map_name, reader=None, asset_data=None):
     # This method initializes the WADData object, loading all relevant data from the WAD file.
+    # Maps loaded by the level manager share its reader and the asset data of its first map.
+
+    self.map_name = map_name
+    self.prepared = {}  # Data the subsystems derive from the map, by name (see get_prepared)
+    with startup_profiler.phase('wad_directory'):
+      self.reader = reader or WADReader(engine.wad_path)
+
+    with startup_profiler.phase('map_lumps'):
+      self.load_map(map_name)
+
+    with startup_profiler.phase('asset_decoding'):
+      self.asset_data = asset_data or AssetData(self)
+
+    # Lazily loaded assets are decoded from the reader on first use, and a shared reader is still
+    # needed for the other maps
+    if not (LAZY_ASSETS or reader):
+      self.reader.close()
+
+  def load_map(self, map_name):
+    # This method reads the lumps of the map and links them together.
 
-    self.reader = WADReader(engine.wad_path)
     self.map_index = self.get_lump_index(lump_name=map_name)
-    self.vertexes = self.get_lump_data(
-      reader_func=self.reader.read_vertex,
-      lump_index =self.map_index + self.LUMP_INDICES['VERTEXES'],
-      num_bytes=4
-    )
+    self.geometry = GeometryStore.from_lumps(self.reader, self.map_index, self.LUMP_INDICES)
+    self.link_geometry()
+
     self.linedefs = self.get_lump_data(
       reader_func=self.reader.read_linedef,
       lump_index=self.map_index + self.LUMP_INDICES['LINEDEFS'],
       num_bytes=14
     )
 
-    self.nodes = self.get_lump_data(
-      reader_func=self.reader.read_node,
-      lump_index=self.map_index + self.LUMP_INDICES['NODES'],
-      num_bytes=28
-    )
-
-    self.sub_sectors = self.get_lump_data(
-      reader_func=self.reader.read_sub_sector,
-      lump_index=self.map_index + self.LUMP_INDICES['SSECTORS'],
-      num_bytes=4
-    )
-
     self.segments = self.get_lump_data(
       reader_func=self.reader.read_segment,
       lump_index=self.map_index + self.LUMP_INDICES['SEGS'],
       num_bytes=12
     )
 
-    self.things = self.get_lump_data(
-      reader_func=self.reader.read_thing,
-      lump_index=self.map_index + self.LUMP_INDICES['THINGS'],
-      num_bytes=10
-    )
-
     self.sidedefs = self.get_lump_data(
       reader_func=self.reader.read_sidedef,
       lump_index=self.map_index + self.LUMP_INDICES['SIDEDEFS'],
@@ -74,9 +78,75 @@ class WADData:
 
     self.update_data()
 
-    self.asset_data = AssetData(self)
+  def link_geometry(self):
+    # This method sets up the vertexes, sub sectors, nodes and things as views of the geometry store.
+    # Their record objects are only built for the code that looks them up.
+
+    geometry = self.geometry
+    self.vertexes = LazyRecords(geometry.vertexes, vec2)
+    self.sub_sectors = LazyRecords(geometry.sub_sectors, self.make_sub_sector)
+    self.nodes = LazyRecords(geometry.nodes, self.make_node)
+    self.things = LazyRecords(geometry.things, self.make_thing)
+
+  @staticmethod
+  def make_sub_sector(row):
+    sub_sector = SubSector()
+    sub_sector.seg_count, sub_sector.first_seg_id = row
+    return sub_sector
+
+  @staticmethod
+  def make_node(row):
+    node = Node()
+    node.x_partition, node.y_partition, node.dx_partition, node.dy_partition = row[:4]
+    for side, bbox_row in (('front', row[4:8]), ('back', row[8:12])):
+      bbox = node.bbox[side]
+      bbox.top, bbox.bottom, bbox.left, bbox.right = bbox_row
+    node.front_child_id, node.back_child_id = row[12:]
+    return node
+
+  @staticmethod
+  def make_thing(row):
+    thing = Thing()
+    x, y, thing.angle, thing.type, thing.flags = row
+    thing.pos = vec2(x, y)
+    return thing
+
+  def get_tables(self):
+    # This method returns the records of the map as tables with integer links, in the layout of baked levels.
+    # They are built on first use.
+
+    if not hasattr(self, 'record_tables'):
+      from baked_level import get_level_tables
+      self.record_tables = get_level_tables(self)
+    return self.record_tables
+
+  def get_prepared(self, name, build):
+    # This method returns data a subsystem derives from the map, built by build(self) on first use. The level
+    # manager builds the data of a preloaded map on its thread, so the subsystems of a map change only look it up.
+
+    if name not in self.prepared:
+      self.prepared[name] = build(self)
+    return self.prepared[name]
+
+  def get_texture_names(self):
+    # This method returns the names of the wall textures and flats referenced by the map, in order of first use.
+    # They are collected once.
+
+    return list(self.get_prepared('texture_names', WADData.find_texture_names))
+
+  @staticmethod
+  def find_texture_names(wad_data):
+    names = dict.fromkeys(name for sidedef in wad_data.sidedefs
+                          for name in (sidedef.upper_texture, sidedef.lower_texture, sidedef.middle_texture))
+    names.update(dict.fromkeys(name for sector in wad_data.sectors for name in (sector.floor_texture, sector.ceil_texture)))
+    return list(names)
+
+  def get_map_bounds(self):
+    # This method returns the smallest and largest x and y coordinates of the vertexes.
 
-    self.reader.close()
+    vertexes = self.geometry.vertexes
+    return (float(vertexes['x'].min()), float(vertexes['x'].max()),
+            float(vertexes['y'].min()), float(vertexes['y'].max()))
 
   def update_data(self):
     # This method updates all the loaded data, applying changes to the linedefs, sidedefs, and segments.
@@ -106,8 +176,6 @@ class WADData:
     # This method updates the segments, adjusting their properties based on their corresponding linedefs.
 
     for seg in self.segments:
-      seg.start_vertex = self.vertexes[seg.start_vertex_id]
-      seg.end_vertex = self.vertexes[seg.end_vertex_id]
       seg.linedef = self.linedefs[seg.linedef_id]
 
       if seg.direction:
@@ -156,7 +224,4 @@ class WADData:
   def get_lump_index(self, lump_name):
     # This method returns the index of a specified lump in the WAD file.
 
-    for index, lump_info in enumerate(self.reader.directory):
-      if lump_name in lump_info.values():
-        return index
-    return False
+    return self.reader.lump_indices.get(lump_name, False)
@@ -4,10 +4,15 @@ from data_types import *
 
 class WADReader:
   def __init__(self, wad_path):
-    # Initialization function, opens the specified WAD file and reads its header and directory information
-    self.wad_file = open(wad_path, 'rb')
+    # Initialization function, loads the specified WAD file and reads its header and directory information.
+    # The file is read into memory in one go: loading does thousands of small reads, and assets decoded
+    # on first use can still be read after the file handle is gone. Reads unpack at an offset without a
+    # file position, so maps can be loaded on a background thread while assets are decoded.
+    with open(wad_path, 'rb') as f:
+      self.wad_bytes = f.read()
     self.header = self.read_header()
     self.directory = self.read_directory()
+    self.lump_indices = self.get_lump_indices()
 
   def read_texture_map(self, offset):
     # Reads the texture map from the WAD file at a given offset
@@ -242,6 +247,14 @@ class WADReader:
       directory.append(lump_info)
     return directory
 
+  def get_lump_indices(self):
+    # Maps each lump name to the index of its first directory entry
+
+    lump_indices = {}
+    for index, lump_info in enumerate(self.directory):
+      lump_indices.setdefault(lump_info['lump_name'], index)
+    return lump_indices
+
   def read_header(self):
     # Reads the header of the WAD file
 
@@ -274,12 +287,10 @@ class WADReader:
                    if ord(b) != 0).upper()
 
   def read_bytes(self, offset, num_bytes, byte_format):
-    # Seek to the correct offset in the file, read the bytes, and unpack them according to the provided format
+    # Unpack the bytes at the offset in the file according to the provided format
 
-    self.wad_file.seek(offset)
-    buffer = self.wad_file.read(num_bytes)
-    return struct.unpack(byte_format, buffer)
+    return struct.unpack_from(byte_format, self.wad_bytes, offset)
 
   def close(self):
-    # Closes the WAD file
-    self.wad_file.close()
+    # Releases the WAD data
+    self.wad_bytes = None
@@ -0,0 +1,25 @@
+import os
+import sys
+
+# Render without a window: SDL's dummy video driver must be selected before pygame initializes the display
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src')
+sys.path.insert(0, SRC_DIR)
+
+import pygame as pg
+import pytest
+from synthetic_wad import write_synthetic_wad
+
+@pytest.fixture
+def wad_path(tmp_path):
+  # A 4 x 4 room synthetic WAD with the map E1M1
+  return write_synthetic_wad(str(tmp_path / 'test.wad'), cols=4, rows=4, seed=1)
+
+@pytest.fixture(autouse=True)
+def close_display():
+  # An engine sets the display mode; the dummy driver only allows one scaled display at a time
+  yield
+  pg.display.quit()
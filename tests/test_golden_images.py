@@ -0,0 +1,20 @@
+import os
+import pytest
+import golden_images
+
+# Two views of the map written by the wad_path fixture, recorded with the compiled kernels
+GOLDEN_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'golden', 'synthetic_e1m1.npz')
+
+def test_check_passes(wad_path, capsys):
+  golden_images.main(['check', GOLDEN_PATH, '--wad', wad_path])
+  output = capsys.readouterr()
+  assert output.out.count(': ok') == 2
+  assert 'warning' not in output.err
+
+def test_check_fails_on_another_map(tmp_path, capsys):
+  from synthetic_wad import write_synthetic_wad
+
+  other_wad = write_synthetic_wad(str(tmp_path / 'test.wad'), cols=4, rows=4, seed=2)
+  with pytest.raises(SystemExit):
+    golden_images.main(['check', GOLDEN_PATH, '--wad', other_wad])
+  assert 'FAIL' in capsys.readouterr().out
@@ -0,0 +1,16 @@
+import numpy as np
+import pytest
+from main import DoomEngine
+
+def test_aot_kernels_match_jit(wad_path, tmp_path, monkeypatch):
+  pytest.importorskip('numba.pycc')
+  from jit_warmup import build_aot_kernels, install_aot_kernels
+
+  monkeypatch.syspath_prepend(build_aot_kernels(str(tmp_path)))
+  engine = DoomEngine(wad_path=wad_path, pipelined=False, preload=False)
+  engine.render()
+  jit_frame = engine.framebuffer.copy()
+
+  assert install_aot_kernels(engine)
+  engine.render()
+  assert np.array_equal(engine.framebuffer, jit_frame)
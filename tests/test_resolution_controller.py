@@ -0,0 +1,31 @@
+from settings import *
+from main import DoomEngine
+from resolution_controller import ResolutionController
+
+def test_reused_frames_keep_column_step(wad_path):
+  engine = DoomEngine(wad_path=wad_path, pipelined=False, preload=False)
+  engine.reuse_frames = True
+  engine.view.column_step = 3
+  while not engine.frame_reused:
+    engine.update()  # The view settles at the player's height
+
+  # Any frame time fits a budget this large, so every measured window would lower the step
+  engine.resolution_controller = ResolutionController(engine, target_fps=1, min_step=1)
+  frames_reused = engine.frames_reused
+  for _ in range(RESOLUTION_WINDOW + 5):
+    engine.update()
+
+  assert engine.frames_reused == frames_reused + RESOLUTION_WINDOW + 5
+  assert engine.view.column_step == 3
+  assert not engine.resolution_controller.frame_times
+
+def test_rendered_frames_change_column_step(wad_path):
+  engine = DoomEngine(wad_path=wad_path, pipelined=False, preload=False)
+  engine.reuse_frames = False
+  engine.view.column_step = 3
+  engine.resolution_controller = ResolutionController(engine, target_fps=1, min_step=1)
+
+  for _ in range(RESOLUTION_WINDOW):
+    engine.update()
+
+  assert engine.view.column_step == 2
@@ -0,0 +1,30 @@
+import numpy as np
+from main import DoomEngine
+from viewport import Camera
+
+def test_viewport_renders_at_its_size(wad_path):
+  engine = DoomEngine(wad_path=wad_path, pipelined=False, preload=False)
+  x, y = engine.player.pos
+  viewport = engine.add_viewport(Camera.at(engine.bsp, x, y, engine.player.angle + 90), (0, 0, 400, 250))
+  engine.render_frame()
+
+  assert viewport.framebuffer.shape == (400, 250, 3)
+  assert viewport.surface.get_size() == (400, 250)
+  assert np.count_nonzero(viewport.framebuffer.any(axis=2)) > 0.9 * 400 * 250
+
+def test_views_keep_their_own_state(wad_path):
+  engine = DoomEngine(wad_path=wad_path, pipelined=False, preload=False)
+  engine.render()
+  frame = engine.framebuffer.copy()
+  draw_segs, upper_clip = engine.view.draw_segs, engine.view.upper_clip
+
+  # Another camera rendered in between leaves the player's view, its framebuffer and its clip state alone
+  x, y = engine.player.pos
+  viewport = engine.add_viewport(Camera.at(engine.bsp, x, y, engine.player.angle + 180), (0, 0, 800, 500), 2)
+  engine.render_view(viewport)
+  assert engine.view.draw_segs is draw_segs and engine.view.upper_clip is upper_clip
+  assert viewport.draw_segs is not draw_segs
+  assert np.array_equal(engine.framebuffer, frame)
+
+  engine.render()
+  assert np.array_equal(engine.framebuffer, frame)
@@ -0,0 +1,83 @@
+from types import SimpleNamespace
+import numpy as np
+from wad_reader import WADReader
+from wad_data import WADData
+from main import DoomEngine
+
+# Record counts of a 4 x 4 room synthetic map: one sector and sub sector per room, a wall on every cell
+# edge (two sided between rooms) and a barrel in every room but the player start
+ROOMS = 16
+VERTEXES = 5 * 5
+LINEDEFS = 2 * 4 * 5
+TWO_SIDED_LINEDEFS = 2 * 3 * 4
+SIDEDEFS = LINEDEFS + TWO_SIDED_LINEDEFS
+MAP_LUMPS = ('THINGS', 'LINEDEFS', 'SIDEDEFS', 'VERTEXES', 'SEGS', 'SSECTORS', 'NODES', 'SECTORS', 'REJECT', 'BLOCKMAP')
+
+def test_reader_directory(wad_path):
+  reader = WADReader(wad_path)
+  assert reader.header['wad_type'] == 'IWAD'
+  assert reader.header['lump_count'] == len(reader.directory)
+
+  # The map lumps follow the map marker in order
+  map_index = reader.lump_indices['E1M1']
+  assert [lump['lump_name'] for lump in reader.directory[map_index + 1:map_index + 11]] == list(MAP_LUMPS)
+  assert reader.directory[map_index + 1]['lump_size'] == ROOMS * 10  # THINGS records are 10 bytes
+
+  for name in ('PLAYPAL', 'TEXTURE1', 'PNAMES', 'SHTGA0', 'BAR1A0', 'F_SKY1'):
+    assert reader.directory[reader.lump_indices[name]]['lump_name'] == name
+  assert 'E1M2' not in reader.lump_indices
+
+def test_reader_lumps(wad_path):
+  reader = WADReader(wad_path)
+  map_index = reader.lump_indices['E1M1']
+
+  vertexes_offset = reader.directory[map_index + 4]['lump_offset']
+  assert reader.read_vertex(vertexes_offset) == (0, 0)
+  thing = reader.read_thing(reader.directory[map_index + 1]['lump_offset'])
+  assert (thing.pos.x, thing.pos.y, thing.type) == (128, 128, 1)  # Player start in the first room
+
+def test_wad_data_records(wad_path):
+  wad_data = WADData(SimpleNamespace(wad_path=wad_path), 'E1M1')
+  assert len(wad_data.vertexes) == VERTEXES
+  assert len(wad_data.sectors) == ROOMS
+  assert len(wad_data.sub_sectors) == ROOMS
+  assert len(wad_data.nodes) == ROOMS - 1
+  assert len(wad_data.things) == ROOMS
+  assert len(wad_data.linedefs) == LINEDEFS
+  assert len(wad_data.sidedefs) == SIDEDEFS
+  assert len(wad_data.segments) == SIDEDEFS  # One seg per sidedef
+  assert sum(sub_sector.seg_count for sub_sector in wad_data.sub_sectors) == len(wad_data.segments)
+
+def test_wad_data_links(wad_path):
+  wad_data = WADData(SimpleNamespace(wad_path=wad_path), 'E1M1')
+
+  for sidedef in wad_data.sidedefs:
+    assert sidedef.sector is wad_data.sectors[sidedef.sector_id]
+  for linedef in wad_data.linedefs:
+    assert linedef.front_sidedef is wad_data.sidedefs[linedef.front_sidedef_id]
+    if linedef.back_sidedef_id == 0xFFFF:
+      assert linedef.back_sidedef is None
+    else:
+      assert linedef.back_sidedef is wad_data.sidedefs[linedef.back_sidedef_id]
+
+  two_sided = 0
+  for seg in wad_data.segments:
+    assert seg.linedef is wad_data.linedefs[seg.linedef_id]
+    front_sidedef = seg.linedef.back_sidedef if seg.direction else seg.linedef.front_sidedef
+    assert seg.front_sector is front_sidedef.sector
+    two_sided += seg.back_sector is not None
+  assert two_sided == 2 * TWO_SIDED_LINEDEFS
+
+  # Every segment of a sub sector faces into the same room
+  for sub_sector in wad_data.sub_sectors:
+    segs = wad_data.segments[sub_sector.first_seg_id:sub_sector.first_seg_id + sub_sector.seg_count]
+    assert len({id(seg.front_sector) for seg in segs}) == 1
+
+def test_headless_render(wad_path):
+  engine = DoomEngine(wad_path=wad_path, pipelined=False, preload=False)
+  engine.render()
+  framebuffer = engine.framebuffer
+  assert framebuffer.shape[2] == 3
+  # Walls, flats and the sky all end up in the frame
+  assert len(np.unique(framebuffer.reshape(-1, 3), axis=0)) > 100
+  assert np.count_nonzero(framebuffer.any(axis=2)) > 0.9 * framebuffer.shape[0] * framebuffer.shape[1]